@@ -0,0 +1,99 @@
+"""
+Отчёт по политике хранения изображений: объём файлов до и после перекодирования в WebP или AVIF
+(AVIF - через пакет pillow-avif-plugin). Перекодируются изображения из каталога static/images (в режиме
+демонстрации он заполняется случайными изображениями) или из каталога --path, файлы не изменяются.
+Экономия передачи - разница объёма файлов, которые получают клиенты, экономия хранения учитывает,
+что при IMAGES_KEEP_ORIGINAL=true исходные файлы тоже хранятся.
+
+Запуск из директории twitter_clone:
+    python -m benchmarks.image_encoding [--path static/images] [--format webp] [--quality 80] [--max-edge 2048]
+"""
+
+import argparse
+import statistics
+import time
+from pathlib import Path
+
+from config import IMAGES_ENCODE_QUALITY, IMAGES_MAX_EDGE
+from storage import IMAGES_PATH
+from utility.image_encoding import encode_image, resolve_encode_format
+
+
+def format_size(size: int) -> str:
+    if abs(size) < 1024 * 1024:
+        return "{:.1f} КБ".format(size / 1024)
+    return "{:.1f} МБ".format(size / 1024 / 1024)
+
+
+def format_saving(before: int, after: int) -> str:
+    return "{} ({:.1%})".format(format_size(before - after), (before - after) / before)
+
+
+def main(args: argparse.Namespace) -> None:
+    encode_format = resolve_encode_format(args.format)
+
+    if encode_format is None:
+        print("Сборка Pillow не умеет сохранять {}".format(args.format))
+        return
+
+    original_size = encoded_size = 0
+    encoded_count = 0
+    skipped = []
+    timings = []
+
+    for image_path in sorted(path for path in args.path.rglob("*") if path.is_file()):
+        image = image_path.read_bytes()
+        started_at = time.perf_counter()
+        encoded = encode_image(image, encode_format, args.quality, args.max_edge)
+        timings.append(time.perf_counter() - started_at)
+
+        if encoded is None:
+            skipped.append(image_path)
+            continue
+
+        original_size += len(image)
+        encoded_size += len(encoded.data)
+        encoded_count += 1
+
+    if not encoded_count:
+        print("В каталоге {} нет изображений для перекодирования".format(args.path))
+        return
+
+    print(
+        "Формат {}, качество {}, длинная сторона до {} пикселей".format(
+            encode_format, args.quality, args.max_edge or "без ограничения"
+        )
+    )
+    print(
+        "Перекодировано изображений: {}, сохранено как есть: {}".format(
+            encoded_count, len(skipped)
+        )
+    )
+    print(
+        "Время перекодирования (мед.): {:.1f} мс".format(
+            statistics.median(timings) * 1000
+        )
+    )
+    print()
+    print("{:<38} {:>12}".format("исходные файлы", format_size(original_size)))
+    print("{:<38} {:>12}".format("перекодированные файлы", format_size(encoded_size)))
+    print(
+        "{:<38} {}".format(
+            "экономия передачи и хранения", format_saving(original_size, encoded_size)
+        )
+    )
+    print(
+        "{:<38} {}".format(
+            "экономия хранения с исходными файлами",
+            format_saving(original_size, original_size + encoded_size),
+        )
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Отчёт по перекодированию изображений")
+    parser.add_argument("--path", type=Path, default=IMAGES_PATH)
+    parser.add_argument("--format", default="webp", choices=("webp", "avif"))
+    parser.add_argument("--quality", type=int, default=IMAGES_ENCODE_QUALITY)
+    parser.add_argument("--max-edge", type=int, default=IMAGES_MAX_EDGE)
+    main(args=parser.parse_args())
@@ -0,0 +1,133 @@
+"""
+Бенчмарк запуска приложения: отчёт в стиле python -X importtime по самым тяжёлым модулям
+и время от старта интерпретатора до первого ответа.
+
+Запуск из директории twitter_clone:
+    python -m benchmarks.startup [--top 20] [--runs 5]
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from typing import List, Tuple
+
+# Модули, которые не должны загружаться при обычном запуске приложения
+LAZY_MODULES = ("PIL", "aiohttp", "faker")
+
+FIRST_REQUEST_CODE = """
+import sys
+import time
+
+import main
+from fastapi.testclient import TestClient
+
+imported_at = time.time()
+response = TestClient(main.app).get("/")
+assert response.status_code == 200, response.status_code
+print("timings:", imported_at, time.time())
+print("loaded:", ",".join(name for name in {lazy_modules} if name in sys.modules))
+"""
+
+
+def parse_importtime(stderr: str) -> List[Tuple[int, int, str]]:
+    """
+    Функция, разбирающая вывод python -X importtime
+
+    :param stderr: вывод интерпретатора в stderr
+    :return: список (собственное время, накопленное время, модуль) в микросекундах
+    """
+    rows = []
+
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+
+        self_us, cumulative_us, module = line.removeprefix("import time:").split("|")
+        rows.append((int(self_us), int(cumulative_us), module.rstrip()))
+
+    return rows
+
+
+def importtime_report(top: int) -> None:
+    """
+    Функция, печатающая модули с наибольшим накопленным временем импорта приложения
+
+    :param top: количество модулей в отчёте
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    rows = parse_importtime(completed.stderr)
+    total = next(
+        cumulative for _, cumulative, module in rows if module.strip() == "main"
+    )
+
+    print("Импорт main: {:.1f} мс".format(total / 1000))
+    print("{:>10} {:>10}  модуль".format("self, мс", "всего, мс"))
+
+    for self_us, cumulative_us, module in sorted(rows, key=lambda x: -x[1])[:top]:
+        print(
+            "{:>10.1f} {:>10.1f}  {}".format(
+                self_us / 1000, cumulative_us / 1000, module
+            )
+        )
+
+
+def first_request_report(runs: int) -> None:
+    """
+    Функция, печатающая время от запуска нового процесса интерпретатора до импорта приложения
+    и до первого ответа. Время старта самого интерпретатора входит в результат
+
+    :param runs: количество запусков
+    """
+    timings = []
+    loaded = ""
+
+    for _ in range(runs):
+        started_at = time.time()
+        completed = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                FIRST_REQUEST_CODE.format(lazy_modules=LAZY_MODULES),
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        lines = dict(
+            line.split(":", 1)
+            for line in completed.stdout.splitlines()
+            if line.startswith(("timings:", "loaded:"))
+        )
+        imported_at, responded_at = map(float, lines["timings"].split())
+        loaded = lines["loaded"].strip()
+        timings.append((imported_at - started_at, responded_at - started_at))
+
+    print(
+        "Импорт приложения: медиана {:.1f} мс".format(
+            statistics.median(imported for imported, _ in timings) * 1000
+        )
+    )
+    print(
+        "До первого ответа: медиана {:.1f} мс".format(
+            statistics.median(responded for _, responded in timings) * 1000
+        )
+    )
+    print("Загружены отложенные модули: {}".format(loaded or "нет"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарк запуска приложения")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    importtime_report(args.top)
+    print()
+    first_request_report(args.runs)
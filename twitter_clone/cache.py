@@ -0,0 +1,243 @@
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from config import (
+    CACHE_BACKEND,
+    CACHE_MAX_ENTRIES,
+    CACHE_PREFIX,
+    CACHE_URL,
+    WEB_CONCURRENCY,
+)
+from logger import logger
+
+
+class CacheBackend(ABC):
+    """
+    Интерфейс хранилища кэшей приложения. Все кэши и счётчики версий работают только через него,
+    поэтому при запуске нескольких воркеров достаточно выбрать общее хранилище, чтобы инвалидация
+    оставалась согласованной между процессами
+    """
+
+    # True, если хранилище общее для всех воркеров приложения
+    is_shared: bool = False
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[bytes]:
+        """
+        Функция, возвращающая значение по ключу или None, если ключа нет или его время жизни истекло
+        """
+
+    @abstractmethod
+    async def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        """
+        Функция, возвращающая значения нескольких ключей за одно обращение к хранилищу
+        """
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        """
+        Функция, сохраняющая значение по ключу. Ключи без времени жизни не вытесняются при переполнении
+        """
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """
+        Функция, удаляющая ключ
+        """
+
+    @abstractmethod
+    async def incr(self, key: str) -> int:
+        """
+        Функция, атомарно увеличивающая целочисленное значение ключа на 1 и возвращающая новое значение
+        """
+
+    @abstractmethod
+    async def publish(self, channel: str, message: bytes) -> None:
+        """
+        Функция, публикующая сообщение всем воркерам, подписанным на канал
+        """
+
+    @abstractmethod
+    def subscribe(self, channel: str) -> AsyncIterator[bytes]:
+        """
+        Функция, возвращающая асинхронный итератор сообщений канала
+        """
+
+    async def close(self) -> None:
+        """
+        Функция, закрывающая подключение к хранилищу
+        """
+
+
+class MemoryCacheBackend(CacheBackend):
+    """
+    Хранилище в памяти процесса для запуска с одним воркером. Ключи со временем жизни вытесняются
+    в порядке давности использования при превышении max_entries (аналог политики volatile-lru Redis),
+    ключи без времени жизни (счётчики версий) не вытесняются. Сообщения каналов доставляются
+    подписчикам того же процесса
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES) -> None:
+        self.__max_entries = max_entries
+        self.__persistent: Dict[str, bytes] = {}
+        self.__volatile: OrderedDict[str, Tuple[bytes, float]] = OrderedDict()
+        self.__channels: Dict[str, Set[asyncio.Queue]] = {}
+
+    def __get(self, key: str) -> Optional[bytes]:
+        if key in self.__persistent:
+            return self.__persistent[key]
+
+        entry = self.__volatile.get(key)
+        if entry is None:
+            return None
+
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self.__volatile[key]
+            return None
+
+        self.__volatile.move_to_end(key)
+        return value
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self.__get(key)
+
+    async def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        return [self.__get(key) for key in keys]
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        if ttl is None:
+            self.__volatile.pop(key, None)
+            self.__persistent[key] = value
+            return
+
+        self.__persistent.pop(key, None)
+        self.__volatile[key] = (value, time.monotonic() + ttl)
+        self.__volatile.move_to_end(key)
+
+        while len(self.__volatile) > self.__max_entries:
+            self.__volatile.popitem(last=False)
+
+    async def delete(self, key: str) -> None:
+        self.__persistent.pop(key, None)
+        self.__volatile.pop(key, None)
+
+    async def incr(self, key: str) -> int:
+        value = int(self.__get(key) or 0) + 1
+        self.__volatile.pop(key, None)
+        self.__persistent[key] = str(value).encode()
+        return value
+
+    async def publish(self, channel: str, message: bytes) -> None:
+        for queue in self.__channels.get(channel, ()):
+            queue.put_nowait(message)
+
+    async def subscribe(self, channel: str) -> AsyncIterator[bytes]:
+        queue: asyncio.Queue = asyncio.Queue()
+        self.__channels.setdefault(channel, set()).add(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            subscribers = self.__channels[channel]
+            subscribers.discard(queue)
+            if not subscribers:
+                del self.__channels[channel]
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Общее хранилище для нескольких воркеров на любом сервере с протоколом Redis
+    (Redis, Valkey, KeyDB, Dragonfly). Для корректного вытеснения на сервере должна быть
+    установлена политика maxmemory-policy volatile-lru
+    """
+
+    is_shared = True
+
+    def __init__(self, url: str = CACHE_URL, prefix: str = CACHE_PREFIX) -> None:
+        from redis.asyncio import Redis
+
+        self.__prefix = prefix
+        self.__client = Redis.from_url(url)
+
+    @property
+    def client(self):
+        return self.__client
+
+    def key(self, key: str) -> str:
+        return self.__prefix + key
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.__client.get(self.key(key))
+
+    async def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        if not keys:
+            return []
+        return await self.__client.mget([self.key(key) for key in keys])
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        await self.__client.set(
+            self.key(key), value, px=int(ttl * 1000) if ttl is not None else None
+        )
+
+    async def delete(self, key: str) -> None:
+        await self.__client.delete(self.key(key))
+
+    async def incr(self, key: str) -> int:
+        return await self.__client.incr(self.key(key))
+
+    async def publish(self, channel: str, message: bytes) -> None:
+        await self.__client.publish(self.key(channel), message)
+
+    async def subscribe(self, channel: str) -> AsyncIterator[bytes]:
+        pubsub = self.__client.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(self.key(channel))
+        try:
+            while True:
+                message = await pubsub.get_message(timeout=1.0)
+                if message is not None:
+                    yield message["data"]
+        finally:
+            await pubsub.unsubscribe(self.key(channel))
+            await pubsub.aclose()
+
+    async def close(self) -> None:
+        await self.__client.aclose()
+
+
+def create_cache_backend(
+    backend: str = CACHE_BACKEND, workers: int = WEB_CONCURRENCY
+) -> CacheBackend:
+    """
+    Функция, создающая хранилище кэшей по названию из настроек. Хранилище в памяти процесса не создаётся
+    для нескольких воркеров: версии данных, ход удаления аккаунтов и лимиты запросов в разных воркерах
+    расходились бы между собой
+
+    :param backend: memory - в памяти процесса, redis - общее хранилище по адресу CACHE_URL
+    :param workers: количество воркеров приложения
+    :return: экземпляр хранилища
+    """
+    logger.debug("Создание хранилища кэшей: backend = {}".format(backend))
+
+    if backend == "memory":
+        if workers > 1:
+            logger.error(
+                "CACHE_BACKEND=memory нельзя использовать с WEB_CONCURRENCY={}".format(
+                    workers
+                )
+            )
+            raise ValueError(
+                "Хранилище кэшей в памяти процесса поддерживает только один воркер, "
+                "задайте CACHE_BACKEND=redis"
+            )
+        return MemoryCacheBackend()
+    if backend == "redis":
+        return RedisCacheBackend()
+
+    raise ValueError("Неизвестное хранилище кэшей: {}".format(backend))
+
+
+cache_backend = create_cache_backend()
@@ -10,6 +10,111 @@ POSTGRES_PORT = os.getenv("POSTGRES_PORT", "5432")
 POSTGRES_DB = os.getenv("POSTGRES_DB", "twitter_db")
 DEMO_MODE = os.getenv("DEMO_MODE", "false").lower() == "true"
 
+# Количество воркеров uvicorn и общий лимит соединений с БД, который делится между ними
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "20"))
+DB_POOL_SIZE = max(1, DB_MAX_CONNECTIONS // WEB_CONCURRENCY)
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()
+CACHE_URL = os.getenv("CACHE_URL", "redis://twitter_cache:6379/0")
+CACHE_PREFIX = os.getenv("CACHE_PREFIX", "twitter:")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+CACHE_FOLLOWINGS_TTL_SECONDS = float(os.getenv("CACHE_FOLLOWINGS_TTL_SECONDS", "3600"))
+
+# Ограничение частоты запросов: правила "МЕТОД путь=запросов/секунд" через запятую,
+# путь с * на конце задаёт общий лимит для всех путей с этим префиксом
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_RULES = os.getenv(
+    "RATE_LIMIT_RULES",
+    "POST /api/tweets=30/60,POST /api/medias=30/60,GET /api/tweets=120/60,"
+    "GET /media/*=300/60",
+)
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+# Кэш проверки api-key: время жизни известных и неизвестных ключей (в секундах) и максимальный размер
+AUTH_POSITIVE_TTL_SECONDS = float(os.getenv("AUTH_POSITIVE_TTL_SECONDS", "300"))
+AUTH_NEGATIVE_TTL_SECONDS = float(os.getenv("AUTH_NEGATIVE_TTL_SECONDS", "10"))
+AUTH_CACHE_MAX_KEYS = int(os.getenv("AUTH_CACHE_MAX_KEYS", "100000"))
+
+# Время, в течение которого результат чтения ленты и профиля отдаётся одинаковым запросам
+SINGLE_FLIGHT_WINDOW_SECONDS = float(os.getenv("SINGLE_FLIGHT_WINDOW_SECONDS", "0.1"))
+
+# Кэш готовых страниц ленты. В режиме stale-while-revalidate устаревшая страница отдаётся сразу,
+# если занято не меньше FEED_CACHE_STALE_POOL_USAGE соединений пула БД, и пересчитывается в фоне
+FEED_CACHE_ENABLED = os.getenv("FEED_CACHE_ENABLED", "true").lower() == "true"
+FEED_CACHE_TTL_SECONDS = float(os.getenv("FEED_CACHE_TTL_SECONDS", "300"))
+FEED_CACHE_STALE_WHILE_REVALIDATE = (
+    os.getenv("FEED_CACHE_STALE_WHILE_REVALIDATE", "true").lower() == "true"
+)
+FEED_CACHE_STALE_POOL_USAGE = float(os.getenv("FEED_CACHE_STALE_POOL_USAGE", "0.8"))
+
+# Количество лайкнувших пользователей в сводке лайков твита компактной ленты
+FEED_SAMPLE_LIKERS = int(os.getenv("FEED_SAMPLE_LIKERS", "3"))
+
+# Твиты авторов, у которых меньше FEED_FANOUT_THRESHOLD подписчиков, записываются в ленты подписчиков
+# при публикации, твиты остальных авторов читаются при чтении ленты (0 - лента всегда собирается при чтении)
+FEED_FANOUT_THRESHOLD = int(os.getenv("FEED_FANOUT_THRESHOLD", "1000"))
+# При подписке в ленту подписчика записываются не более FEED_FOLLOW_BACKFILL последних твитов каждого автора
+FEED_FOLLOW_BACKFILL = int(os.getenv("FEED_FOLLOW_BACKFILL", "100"))
+
+# Политика хранения изображений: original - файл сохраняется как есть, webp или avif - изображение
+# перекодируется с качеством IMAGES_ENCODE_QUALITY без метаданных EXIF, длинная сторона ограничивается
+# IMAGES_MAX_EDGE пикселями (0 - без ограничения). Исходный файл сохраняется, если IMAGES_KEEP_ORIGINAL=true
+IMAGES_ENCODE_FORMAT = os.getenv("IMAGES_ENCODE_FORMAT", "original").lower()
+IMAGES_ENCODE_QUALITY = int(os.getenv("IMAGES_ENCODE_QUALITY", "80"))
+IMAGES_MAX_EDGE = int(os.getenv("IMAGES_MAX_EDGE", "2048"))
+IMAGES_KEEP_ORIGINAL = os.getenv("IMAGES_KEEP_ORIGINAL", "false").lower() == "true"
+
+# Хранилище файлов изображений: local - каталоги на диске сервера, s3 - бакет S3-совместимого хранилища.
+# Файлы больше S3_PART_SIZE_MB мегабайт (не меньше 5) загружаются в бакет частями
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local").lower()
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None
+S3_REGION = os.getenv("S3_REGION", "us-east-1")
+S3_BUCKET = os.getenv("S3_BUCKET", "twitter-media")
+S3_ACCESS_KEY_ID = os.getenv("S3_ACCESS_KEY_ID") or None
+S3_SECRET_ACCESS_KEY = os.getenv("S3_SECRET_ACCESS_KEY") or None
+S3_PUBLIC_URL = os.getenv("S3_PUBLIC_URL") or None
+S3_PART_SIZE_MB = max(5.0, float(os.getenv("S3_PART_SIZE_MB", "8")))
+
+# Изображения произвольной ширины GET /media/{image_id} кэшируются на диске, при превышении
+# MEDIA_CACHE_MAX_MB мегабайт удаляются давно не запрошенные. Объём делится между воркерами
+MEDIA_CACHE_MAX_MB = float(os.getenv("MEDIA_CACHE_MAX_MB", "512"))
+MEDIA_MAX_WIDTH = int(os.getenv("MEDIA_MAX_WIDTH", "4096"))
+
+BATCH_MAX_OPERATIONS = int(os.getenv("BATCH_MAX_OPERATIONS", "500"))
+
+# Твиты старше TWEETS_ARCHIVE_AFTER_DAYS дней переносятся в архив (0 - архивирование выключено)
+TWEETS_ARCHIVE_AFTER_DAYS = float(os.getenv("TWEETS_ARCHIVE_AFTER_DAYS", "0"))
+TWEETS_ARCHIVE_INTERVAL_SECONDS = float(
+    os.getenv("TWEETS_ARCHIVE_INTERVAL_SECONDS", "3600")
+)
+TWEETS_ARCHIVE_BATCH_SIZE = int(os.getenv("TWEETS_ARCHIVE_BATCH_SIZE", "1000"))
+
+ACCOUNT_DELETION_BATCH_SIZE = int(os.getenv("ACCOUNT_DELETION_BATCH_SIZE", "500"))
+ACCOUNT_DELETION_PAUSE_SECONDS = float(
+    os.getenv("ACCOUNT_DELETION_PAUSE_SECONDS", "0.05")
+)
+ACCOUNT_DELETION_PROGRESS_TTL_SECONDS = float(
+    os.getenv("ACCOUNT_DELETION_PROGRESS_TTL_SECONDS", "86400")
+)
+# Удаление, ход которого не обновлялся ACCOUNT_DELETION_STALE_SECONDS секунд, считается прерванным
+ACCOUNT_DELETION_STALE_SECONDS = float(
+    os.getenv("ACCOUNT_DELETION_STALE_SECONDS", "300")
+)
+
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "100"))
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+
+SEARCH_TS_CONFIG = os.getenv("SEARCH_TS_CONFIG", "russian")
+SEARCH_HEADLINE_OPTIONS = "MaxFragments=2, MaxWords=20, MinWords=5"
+
+TRENDING_HALF_LIFE_HOURS = float(os.getenv("TRENDING_HALF_LIFE_HOURS", "6"))
+TRENDING_REFRESH_SECONDS = float(os.getenv("TRENDING_REFRESH_SECONDS", "30"))
+TRENDING_SIZE = int(os.getenv("TRENDING_SIZE", "50"))
+TRENDING_CAPACITY = int(os.getenv("TRENDING_CAPACITY", "10000"))
+TRENDING_SEED_TWEETS = int(os.getenv("TRENDING_SEED_TWEETS", "1000"))
+
 
 MEDIA_FILE_NAME = "{image_id}.jpg"
 GET_FOX_URL = "https://randomfox.ca/images/{image_id}.jpg"
@@ -18,12 +123,23 @@ GET_TEXT_URL = "https://fish-text.ru/get"
 GET_TEXT_PARAMS = {"number": 1}
 
 RESPONSES = {
+    status.HTTP_304_NOT_MODIFIED: {
+        304: {
+            "description": "Данные не изменились с момента получения ETag, указанного в заголовке If-None-Match",
+        }
+    },
     status.HTTP_400_BAD_REQUEST: {
         400: {
             "model": ErrorResult,
             "description": "Необработанное исключение, которое может возникнуть на стороне сервера",
         }
     },
+    status.HTTP_401_UNAUTHORIZED: {
+        401: {
+            "model": ErrorResult,
+            "description": "Ошибка, возникающая при передаче в заголовке api-key id несуществующего пользователя",
+        }
+    },
     status.HTTP_404_NOT_FOUND: {
         404: {
             "model": ErrorResult,
@@ -42,4 +158,11 @@ RESPONSES = {
             "description": "Ошибка валидации входных данных",
         },
     },
+    status.HTTP_429_TOO_MANY_REQUESTS: {
+        429: {
+            "model": ErrorResult,
+            "description": "Превышен лимит запросов пользователя, повторить запрос можно через время "
+            "из заголовка Retry-After",
+        },
+    },
 }
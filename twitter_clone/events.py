@@ -0,0 +1,153 @@
+import asyncio
+import inspect
+import json
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from uuid import uuid4
+
+from cache import CacheBackend
+from config import EVENTS_QUEUE_SIZE
+from logger import logger
+
+EVENTS_CHANNEL = "events"
+
+
+@dataclass
+class Event:
+    type: str
+    data: Dict[str, Any] = field(default_factory=dict)
+
+    def to_sse(self) -> str:
+        """
+        Функция, возвращающая представление события в формате Server-Sent Events
+
+        :return: строка сообщения SSE
+        """
+        return "event: {}\ndata: {}\n\n".format(
+            self.type, json.dumps(self.data, ensure_ascii=False)
+        )
+
+
+class EventBroker:
+    """
+    Брокер событий. Модели публикуют в нём события изменения твитов, лайков и подписок,
+    а SSE-потоки и обработчики получают их без повторных запросов к БД.
+    При общем хранилище кэшей события пересылаются между воркерами через его канал
+    """
+
+    def __init__(self, queue_size: int = EVENTS_QUEUE_SIZE) -> None:
+        self.__queue_size = queue_size
+        self.__origin = uuid4().hex
+        self.__backend: Optional[CacheBackend] = None
+        self.__queues: Set[asyncio.Queue] = set()
+        self.__listeners: List[Tuple[Callable[[Event], Any], bool]] = []
+
+    @property
+    def has_subscribers(self) -> bool:
+        return bool(self.__queues or self.__listeners or self.__backend)
+
+    def subscribe(self) -> asyncio.Queue:
+        """
+        Функция, создающая очередь событий для нового подписчика
+
+        :return: очередь, в которую будут поступать события
+        """
+        queue = asyncio.Queue(maxsize=self.__queue_size)
+        self.__queues.add(queue)
+        logger.debug("Новый подписчик событий: всего = {}".format(len(self.__queues)))
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        """
+        Функция, удаляющая очередь подписчика
+
+        :param queue: очередь, полученная при подписке
+        """
+        self.__queues.discard(queue)
+        logger.debug("Отписка от событий: всего = {}".format(len(self.__queues)))
+
+    def add_listener(
+        self, listener: Callable[[Event], Any], remote: bool = False
+    ) -> None:
+        """
+        Функция, регистрирующая обработчик, который вызывается при каждой публикации.
+        Обработчик может быть как обычной функцией, так и корутиной
+
+        :param listener: функция-обработчик события
+        :param remote: если True, обработчик получает и события других воркеров. Обработчикам,
+                       которые изменяют общее хранилище, события других воркеров не нужны
+        """
+        self.__listeners.append((listener, remote))
+
+    async def __dispatch(self, event: Event, remote: bool) -> None:
+        for listener, accepts_remote in self.__listeners:
+            if remote and not accepts_remote:
+                continue
+            try:
+                result = listener(event)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as exc:
+                logger.exception(
+                    "Ошибка обработчика события {}: {}".format(event.type, exc)
+                )
+
+        for queue in self.__queues:
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                logger.warning(
+                    "Очередь подписчика переполнена, событие {} пропущено".format(
+                        event.type
+                    )
+                )
+
+    async def publish(self, event_type: str, **data: Any) -> None:
+        """
+        Функция, публикующая событие всем обработчикам и подписчикам, а при общем хранилище -
+        и остальным воркерам. Если очередь подписчика переполнена, событие для него пропускается
+
+        :param event_type: тип события
+        :param data: данные события
+        """
+        if not self.has_subscribers:
+            return
+
+        event = Event(type=event_type, data=data)
+        await self.__dispatch(event, remote=False)
+
+        if self.__backend is not None:
+            try:
+                await self.__backend.publish(
+                    EVENTS_CHANNEL,
+                    json.dumps(
+                        {"origin": self.__origin, "type": event_type, "data": data}
+                    ).encode(),
+                )
+            except Exception as exc:
+                logger.exception(
+                    "Ошибка пересылки события {}: {}".format(event_type, exc)
+                )
+
+    async def relay(self, backend: CacheBackend) -> None:
+        """
+        Фоновая задача, которая получает события остальных воркеров из канала общего хранилища
+
+        :param backend: общее хранилище кэшей
+        """
+        self.__backend = backend
+        logger.debug("Запуск пересылки событий между воркерами")
+
+        try:
+            async for message in backend.subscribe(EVENTS_CHANNEL):
+                payload = json.loads(message)
+
+                if payload["origin"] != self.__origin:
+                    await self.__dispatch(
+                        Event(type=payload["type"], data=payload["data"]), remote=True
+                    )
+        finally:
+            self.__backend = None
+
+
+broker = EventBroker()
@@ -1,29 +1,80 @@
+import asyncio
 from contextlib import asynccontextmanager
-from typing import Annotated
+from datetime import datetime
+from functools import partial
+from typing import Annotated, Any, Awaitable, Callable, List, Literal, Optional
 
-from fastapi import Depends, FastAPI, File, Header, Path, Request, UploadFile, status
+from fastapi import (
+    Depends,
+    FastAPI,
+    File,
+    Header,
+    HTTPException,
+    Path,
+    Query,
+    Request,
+    UploadFile,
+    status,
+)
 from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
-from config import DEMO_MODE, RESPONSES
-from database import AsyncSessionLocal, Base, engine
+from cache import cache_backend
+from config import (
+    DEMO_MODE,
+    FEED_SAMPLE_LIKERS,
+    IMAGES_ENCODE_QUALITY,
+    MEDIA_MAX_WIDTH,
+    RESPONSES,
+    SSE_KEEPALIVE_SECONDS,
+    TRENDING_SIZE,
+    TWEETS_ARCHIVE_AFTER_DAYS,
+)
+from database import AsyncSessionLocal, engine
+from events import broker
 from logger import logger
-from models.image import Image
+from migrations import run_migrations
+from models.archive import ArchivedLike, ArchivedTweet
+from models.image import FORMAT_EXTENSIONS, Image
 from models.like import Like
 from models.tweet import Tweet
 from models.user import User
+from rate_limit import RateLimitMiddleware
+from schemas.batch import BatchResult, NewBatch
 from schemas.error import ErrorResult
 from schemas.image import ImageResult
 from schemas.result import Result
-from schemas.tweet import NewTweet, TweetListResult, TweetResult
-from schemas.user import NewUserResult
+from schemas.tweet import (
+    LikeListResult,
+    NewTweet,
+    SearchResult,
+    TrendingResult,
+    TweetCompactListResult,
+    TweetCompactView,
+    TweetListPageResult,
+    TweetListResult,
+    TweetPageResult,
+    TweetResult,
+)
+from schemas.user import AccountDeletionResult, NewUserResult
 from schemas.user import User as UserSchema
 from schemas.user import UserInfoResult
-from utility.create_data import create_data
+from storage import image_storage, original_storage
+from utility.account_deletion import account_deletion
+from utility.archive import archive_tweets_periodically
+from utility.auth import auth_cache
+from utility.batch import run_batch
+from utility.cursor import decode_cursor, encode_cursor
+from utility.feed_cache import feed_cache
+from utility.image_encoding import resize_image, resolve_encode_format
+from utility.media_cache import OpenedFileResponse, media_cache
+from utility.single_flight import single_flight
+from utility.trending import refresh_trending_periodically, trending_ranking
+from utility.versions import etag_matches, version_registry
 
 front_app = FastAPI()
 front_app.mount("/", StaticFiles(directory="static", html=True), name="static")
@@ -33,11 +84,12 @@ front_app.mount("/", StaticFiles(directory="static", html=True), name="static")
 async def lifespan(app_: FastAPI):
     logger.info("Запуск приложения")
 
-    if DEMO_MODE:
-        async with engine.begin() as conn:
-            logger.debug("Создание таблиц БД")
-            await conn.run_sync(Base.metadata.drop_all)
-            await conn.run_sync(Base.metadata.create_all)
+    created = await run_migrations(engine)
+
+    if DEMO_MODE and created:
+        # Стек генерации демо-данных (aiohttp, Faker) загружается только в режиме демонстрации
+        from utility.create_data import create_data
+
         await create_data(
             async_session_local=AsyncSessionLocal,
             users_count=100,
@@ -46,13 +98,31 @@ async def lifespan(app_: FastAPI):
             subscribe_count=300,
             likes_count=200,
         )
-    else:
-        async with engine.begin() as conn:
-            logger.debug("Создание таблиц БД")
-            await conn.run_sync(Base.metadata.create_all)
+
+    broker.add_listener(auth_cache.on_event, remote=True)
+    broker.add_listener(version_registry.on_event)
+    broker.add_listener(trending_ranking.on_event, remote=True)
+    background_tasks = [
+        asyncio.create_task(
+            refresh_trending_periodically(trending_ranking, AsyncSessionLocal)
+        )
+    ]
+    if cache_backend.is_shared:
+        background_tasks.append(asyncio.create_task(broker.relay(cache_backend)))
+    if TWEETS_ARCHIVE_AFTER_DAYS > 0:
+        background_tasks.append(
+            asyncio.create_task(archive_tweets_periodically(AsyncSessionLocal))
+        )
 
     yield
     logger.warning("Закрытие приложения")
+    for task in background_tasks:
+        task.cancel()
+    await account_deletion.shutdown()
+    await feed_cache.shutdown()
+    await image_storage.close()
+    await original_storage.close()
+    await cache_backend.close()
     await engine.dispose()
     await logger.complete()
 
@@ -72,6 +142,182 @@ app = FastAPI(
         "email": "israpal@bk.ru",
     },
 )
+app.add_middleware(RateLimitMiddleware)
+
+
+def not_modified(etag: str) -> Response:
+    """
+    Функция, возвращающая ответ 304 Not Modified с текущим ETag
+
+    """
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED,
+        headers={"ETag": etag, "Cache-Control": "private, no-cache"},
+    )
+
+
+def json_with_etag(payload: bytes, etag: str) -> Response:
+    """
+    Функция, возвращающая готовое JSON-представление ответа с текущим ETag
+
+    """
+    return Response(
+        content=payload,
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": "private, no-cache"},
+    )
+
+
+async def get_compact_views(
+    db_async_session: AsyncSession,
+    user_id: str,
+    tweets: List[Tweet],
+    archived: List[ArchivedTweet],
+) -> List[TweetCompactView]:
+    """
+    Функция, возвращающая компактные представления свежих и архивных твитов: вместо списков лайкнувших
+    каждый твит содержит количество лайков, признак лайка текущего пользователя и несколько лайкнувших
+
+    """
+    previews = await Like.get_likes_preview(
+        db_async_session, [tweet.id for tweet in tweets], user_id, FEED_SAMPLE_LIKERS
+    )
+    if archived:
+        previews.update(
+            await Like.get_likes_preview(
+                db_async_session,
+                [tweet.id for tweet in archived],
+                user_id,
+                FEED_SAMPLE_LIKERS,
+                like_model=ArchivedLike,
+            )
+        )
+
+    return [
+        TweetCompactView(
+            id=tweet.id,
+            content=tweet.content,
+            attachments=tweet.attachments,
+            media=tweet.media,
+            author=tweet.author,
+            **previews.get(tweet.id, {}),
+        )
+        for tweet in [*tweets, *archived]
+    ]
+
+
+async def get_compact_feed_payload(
+    db_async_session: AsyncSession, user_id: str, archive: bool = False
+) -> bytes:
+    """
+    Функция, возвращающая JSON-представление компактной ленты пользователя
+
+    """
+    tweets = await Tweet.get_tweet_from_followers(
+        db_async_session, user_id=user_id, with_likes=False
+    )
+    archived = []
+
+    if archive:
+        archived = await ArchivedTweet.get_tweets_from_followers(
+            db_async_session, user_id, with_likes=False
+        )
+
+    views = await get_compact_views(db_async_session, user_id, tweets, archived)
+    views.sort(key=lambda x: x.likes_count, reverse=True)
+    return TweetCompactListResult(tweets=views).model_dump_json().encode()
+
+
+async def get_feed_payload(
+    db_async_session: AsyncSession, user_id: str, archive: bool = False
+) -> bytes:
+    """
+    Функция, возвращающая JSON-представление ленты пользователя, при archive=True - вместе с архивными твитами
+
+    """
+    tweets = await Tweet.get_tweet_from_followers(db_async_session, user_id=user_id)
+
+    if archive:
+        tweets.extend(
+            await ArchivedTweet.get_tweets_from_followers(db_async_session, user_id)
+        )
+        tweets.sort(key=lambda x: len(x.likes), reverse=True)
+    return TweetListResult(tweets=tweets).model_dump_json().encode()
+
+
+async def get_recent_feed_payload(
+    db_async_session: AsyncSession,
+    user_id: str,
+    archive: bool,
+    compact: bool,
+    limit: int,
+    cursor: str | None,
+) -> bytes:
+    """
+    Функция, возвращающая JSON-представление страницы ленты пользователя по убыванию времени создания.
+    Курсор содержит признак архива и ключ (created_at, id) последнего твита страницы
+
+    """
+    # Архивные твиты старше свежих, поэтому навигация по архиву продолжается тем же ключом
+    in_archive, created_at, before_id = decode_cursor(
+        cursor, bool, datetime.fromisoformat, int
+    ) or (False, None, None)
+    before = (created_at, before_id) if before_id is not None else None
+    tweets, archived = [], []
+
+    if not in_archive:
+        tweets = await Tweet.get_recent_feed(
+            db_async_session, user_id, limit, before, with_likes=not compact
+        )
+        if tweets:
+            before = (tweets[-1].created_at, tweets[-1].id)
+
+    if archive and len(tweets) < limit:
+        in_archive = True
+        archived = await Tweet.get_recent_feed(
+            db_async_session,
+            user_id,
+            limit - len(tweets),
+            before,
+            archive=True,
+            with_likes=not compact,
+        )
+
+    page = [*tweets, *archived]
+    next_cursor = None
+
+    if len(page) == limit:
+        next_cursor = encode_cursor(
+            in_archive, page[-1].created_at.isoformat(), page[-1].id
+        )
+
+    if compact:
+        views = await get_compact_views(db_async_session, user_id, tweets, archived)
+        result = TweetPageResult(tweets=views, next_cursor=next_cursor)
+    else:
+        result = TweetListPageResult(tweets=page, next_cursor=next_cursor)
+    return result.model_dump_json().encode()
+
+
+async def get_user_payload(db_async_session: AsyncSession, user_id: str) -> bytes:
+    """
+    Функция, возвращающая JSON-представление профиля пользователя
+
+    """
+    user_data = await User.get_user_data(db_async_session, user_id)
+    return UserInfoResult(user=user_data).model_dump_json().encode()
+
+
+async def run_in_own_session(func: Callable[[AsyncSession], Awaitable[Any]]) -> Any:
+    """
+    Функция, выполняющая объединённое вычисление в собственной сессии БД. Сессия запроса, запустившего
+    вычисление, закрывается по его завершении или отмене, а результат ожидают и другие запросы
+
+    :param func: функция вычисления результата в переданной сессии
+    :return: результат вычисления
+    """
+    async with AsyncSessionLocal() as db_async_session:
+        return await func(db_async_session)
 
 
 # Database dependency
@@ -84,28 +330,196 @@ async def get_db_async_session():
         await db_async_session.aclose()
 
 
+# Authentication dependency
+async def get_current_user_id(
+    api_key: Annotated[str | None, Header(title="id пользователя", max_length=32)],
+    db_async_session: AsyncSession = Depends(get_db_async_session),
+) -> str:
+    """
+    Зависимость, возвращающая id текущего пользователя из заголовка api-key.
+    Неизвестные ключи отклоняются с ошибкой 401 до выполнения обработчика
+
+    """
+    if not api_key or not await auth_cache.is_known(db_async_session, api_key):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Пользователя с id {} не существует".format(api_key),
+        )
+    return api_key
+
+
 @app.get(
     "/api/tweets",
     summary="получить твиты",
     response_description="Успешное получение списка твитов",
     status_code=status.HTTP_200_OK,
     tags=["Твиты"],
-    responses=RESPONSES[status.HTTP_404_NOT_FOUND],
+    responses={
+        **RESPONSES[status.HTTP_401_UNAUTHORIZED],
+        **RESPONSES[status.HTTP_304_NOT_MODIFIED],
+        **RESPONSES[status.HTTP_404_NOT_FOUND],
+        **RESPONSES[status.HTTP_429_TOO_MANY_REQUESTS],
+    },
 )
 async def get_tweets(
-    api_key: Annotated[str | None, Header(title="id пользователя", max_length=32)],
+    request: Request,
+    api_key: Annotated[str, Depends(get_current_user_id)],
+    archive: Annotated[bool, Query(title="Включить в ленту архивные твиты")] = False,
+    compact: Annotated[
+        bool, Query(title="Сводка лайков вместо полных списков лайкнувших")
+    ] = False,
+    order: Annotated[
+        Literal["likes", "recent"],
+        Query(title="Порядок твитов: по количеству лайков или по времени создания"),
+    ] = "likes",
+    limit: Annotated[
+        int, Query(title="количество твитов на странице при order=recent", ge=1, le=100)
+    ] = 20,
+    cursor: Annotated[
+        str | None, Query(title="курсор следующей страницы", max_length=128)
+    ] = None,
     db_async_session: AsyncSession = Depends(get_db_async_session),
-) -> TweetListResult:
+) -> TweetListResult | TweetCompactListResult | TweetListPageResult | TweetPageResult:
     """
-    Получение всех твитов текущего пользователия и твитов пользователей на которых он подписан
+    Получение всех твитов текущего пользователия и твитов пользователей на которых он подписан.
+    По умолчанию лента содержит только свежие твиты, архивные твиты добавляются параметром archive=true.
+    С параметром compact=true вместо полных списков лайкнувших возвращается сводка лайков,
+    полный список доступен по GET /api/tweets/{tweet_id}/likes.
+    По умолчанию твиты упорядочены по количеству лайков. С параметром order=recent лента возвращается
+    страницами по limit твитов по убыванию времени создания с навигацией по курсору.
+    Если лента не изменилась с момента получения ETag из заголовка If-None-Match, возвращается 304.
+    Одинаковые одновременные запросы ленты выполняются одним запросом к БД, готовые страницы ленты
+    кэшируются до изменения её ETag. При нехватке соединений с БД может быть отдана предыдущая версия
+    страницы с её ETag, пока актуальная пересчитывается в фоне
 
     """
     logger.debug(
         "Запрос на получение твитов для пользователя с id = {}".format(api_key)
     )
-    tweets = await Tweet.get_tweet_from_followers(db_async_session, user_id=api_key)
+    etag = await version_registry.get_feed_etag(db_async_session, api_key)
+
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    if order == "recent":
+        get_payload = partial(
+            get_recent_feed_payload,
+            user_id=api_key,
+            archive=archive,
+            compact=compact,
+            limit=limit,
+            cursor=cursor,
+        )
+    else:
+        get_payload = partial(
+            get_compact_feed_payload if compact else get_feed_payload,
+            user_id=api_key,
+            archive=archive,
+        )
+
+    payload, etag = await single_flight.do(
+        ("feed", api_key, request.url.query, etag),
+        partial(
+            run_in_own_session,
+            partial(
+                feed_cache.get,
+                api_key,
+                request.url.query,
+                etag,
+                get_payload=get_payload,
+            ),
+        ),
+    )
+    await logger.complete()
+    return json_with_etag(payload, etag)
+
+
+@app.get(
+    "/api/tweets/stream",
+    summary="поток событий ленты",
+    response_description="Поток Server-Sent Events с новыми твитами и изменениями лайков",
+    status_code=status.HTTP_200_OK,
+    tags=["Твиты"],
+    response_class=StreamingResponse,
+    responses={
+        **RESPONSES[status.HTTP_401_UNAUTHORIZED],
+        **RESPONSES[status.HTTP_404_NOT_FOUND],
+    },
+)
+async def tweets_stream(
+    request: Request,
+    api_key: Annotated[str, Depends(get_current_user_id)],
+    db_async_session: AsyncSession = Depends(get_db_async_session),
+) -> StreamingResponse:
+    """
+    Поток событий (text/event-stream) о новых и удалённых твитах, а также об изменении количества лайков
+    твитов текущего пользователя и пользователей, на которых он подписан
+
+    """
+    logger.debug("Подключение к потоку событий: api_key = {}".format(api_key))
+
+    author_ids = set(await User.get_following_ids(db_async_session, api_key))
+    author_ids.add(api_key)
+    queue = broker.subscribe()
+
+    async def event_stream():
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(
+                        queue.get(), timeout=SSE_KEEPALIVE_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+
+                if event.type in ("follow", "unfollow"):
+                    if event.data["follower_user_id"] == api_key:
+                        if event.type == "follow":
+                            author_ids.add(event.data["following_user_id"])
+                        else:
+                            author_ids.discard(event.data["following_user_id"])
+                elif event.data.get("author_id") in author_ids:
+                    yield event.to_sse()
+        finally:
+            broker.unsubscribe(queue)
+            logger.debug("Отключение от потока событий: api_key = {}".format(api_key))
+
+    await logger.complete()
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get(
+    "/api/tweets/trending",
+    summary="популярные твиты",
+    response_description="Список популярных твитов по убыванию счёта с затуханием по времени",
+    status_code=status.HTTP_200_OK,
+    tags=["Твиты"],
+    responses=RESPONSES[status.HTTP_401_UNAUTHORIZED],
+)
+async def get_trending_tweets(
+    api_key: Annotated[str, Depends(get_current_user_id)],
+    limit: Annotated[
+        int, Query(title="количество твитов", ge=1, le=TRENDING_SIZE)
+    ] = 20,
+) -> TrendingResult:
+    """
+    Получение популярных твитов всей компании. Счёт твита - сумма лайков с экспоненциальным затуханием
+    по времени их добавления. Список отдаётся из заранее рассчитанного снимка без запросов к БД
+
+    """
+    logger.debug(
+        "Запрос популярных твитов: api_key = {}, limit = {}".format(api_key, limit)
+    )
+    tweets = trending_ranking.get_top(limit)
     await logger.complete()
-    return TweetListResult(tweets=tweets)
+    return TrendingResult(tweets=tweets)
 
 
 @app.post(
@@ -114,11 +528,16 @@ async def get_tweets(
     response_description="Успешное добавление нового твита",
     status_code=status.HTTP_201_CREATED,
     tags=["Твиты"],
-    responses=RESPONSES[status.HTTP_404_NOT_FOUND],
+    responses={
+        **RESPONSES[status.HTTP_401_UNAUTHORIZED],
+        **RESPONSES[status.HTTP_404_NOT_FOUND],
+        **RESPONSES[status.HTTP_409_CONFLICT],
+        **RESPONSES[status.HTTP_429_TOO_MANY_REQUESTS],
+    },
 )
 async def add_tweet(
     tweet: NewTweet,
-    api_key: Annotated[str | None, Header(title="id пользователя", max_length=32)],
+    api_key: Annotated[str, Depends(get_current_user_id)],
     db_async_session: AsyncSession = Depends(get_db_async_session),
 ) -> TweetResult:
     """
@@ -142,11 +561,14 @@ async def add_tweet(
     response_description="Успешное удаление твита",
     status_code=status.HTTP_200_OK,
     tags=["Твиты"],
-    responses=RESPONSES[status.HTTP_404_NOT_FOUND],
+    responses={
+        **RESPONSES[status.HTTP_401_UNAUTHORIZED],
+        **RESPONSES[status.HTTP_404_NOT_FOUND],
+    },
 )
 async def delete_tweet(
     tweet_id: int,
-    api_key: Annotated[str | None, Header(title="id пользователя", max_length=32)],
+    api_key: Annotated[str, Depends(get_current_user_id)],
     db_async_session: AsyncSession = Depends(get_db_async_session),
 ) -> Result:
     """
@@ -165,6 +587,52 @@ async def delete_tweet(
     return Result()
 
 
+@app.get(
+    "/api/tweets/{tweet_id}/likes",
+    summary="лайкнувшие твит",
+    response_description="Страница пользователей, лайкнувших твит",
+    status_code=status.HTTP_200_OK,
+    tags=["Лайки"],
+    responses={
+        **RESPONSES[status.HTTP_401_UNAUTHORIZED],
+        **RESPONSES[status.HTTP_404_NOT_FOUND],
+    },
+)
+async def get_likes(
+    tweet_id: int,
+    api_key: Annotated[str, Depends(get_current_user_id)],
+    limit: Annotated[
+        int, Query(title="количество пользователей на странице", ge=1, le=100)
+    ] = 50,
+    cursor: Annotated[
+        str | None, Query(title="курсор следующей страницы", max_length=128)
+    ] = None,
+    db_async_session: AsyncSession = Depends(get_db_async_session),
+) -> LikeListResult:
+    """
+    Получение списка пользователей, лайкнувших твит, с постраничной навигацией по курсору
+
+    """
+    logger.debug(
+        "Запрос списка лайкнувших: api_key = {}, tweet_id = {}".format(
+            api_key, tweet_id
+        )
+    )
+    likes = await Like.get_likers(
+        db_async_session,
+        tweet_id=tweet_id,
+        limit=limit,
+        cursor=(decode_cursor(cursor, int) or (None,))[0],
+    )
+    next_cursor = None
+
+    if len(likes) == limit:
+        next_cursor = encode_cursor(likes[-1]["pk"])
+
+    await logger.complete()
+    return LikeListResult(likes=likes, next_cursor=next_cursor)
+
+
 @app.post(
     "/api/tweets/{tweet_id}/likes",
     summary="поставить лайк",
@@ -172,13 +640,14 @@ async def delete_tweet(
     status_code=status.HTTP_201_CREATED,
     tags=["Лайки"],
     responses={
+        **RESPONSES[status.HTTP_401_UNAUTHORIZED],
         **RESPONSES[status.HTTP_404_NOT_FOUND],
         **RESPONSES[status.HTTP_409_CONFLICT],
     },
 )
 async def add_like(
     tweet_id: int,
-    api_key: Annotated[str | None, Header(title="id пользователя", max_length=32)],
+    api_key: Annotated[str, Depends(get_current_user_id)],
     db_async_session: AsyncSession = Depends(get_db_async_session),
 ) -> Result:
     """
@@ -203,11 +672,14 @@ async def add_like(
     response_description="Успешное удаление лайка",
     status_code=status.HTTP_200_OK,
     tags=["Лайки"],
-    responses=RESPONSES[status.HTTP_404_NOT_FOUND],
+    responses={
+        **RESPONSES[status.HTTP_401_UNAUTHORIZED],
+        **RESPONSES[status.HTTP_404_NOT_FOUND],
+    },
 )
 async def delete_like(
     tweet_id: int,
-    api_key: Annotated[str | None, Header(title="id пользователя", max_length=32)],
+    api_key: Annotated[str, Depends(get_current_user_id)],
     db_async_session: AsyncSession = Depends(get_db_async_session),
 ) -> Result:
     """
@@ -226,12 +698,57 @@ async def delete_like(
     return Result()
 
 
+@app.get(
+    "/api/search",
+    summary="поиск твитов",
+    response_description="Страница найденных твитов, отсортированных по релевантности",
+    status_code=status.HTTP_200_OK,
+    tags=["Твиты"],
+    responses={
+        **RESPONSES[status.HTTP_401_UNAUTHORIZED],
+        **RESPONSES[status.HTTP_404_NOT_FOUND],
+    },
+)
+async def search_tweets(
+    api_key: Annotated[str, Depends(get_current_user_id)],
+    q: Annotated[str, Query(title="поисковый запрос", min_length=1, max_length=256)],
+    limit: Annotated[
+        int, Query(title="количество твитов на странице", ge=1, le=100)
+    ] = 20,
+    cursor: Annotated[
+        str | None, Query(title="курсор следующей страницы", max_length=128)
+    ] = None,
+    db_async_session: AsyncSession = Depends(get_db_async_session),
+) -> SearchResult:
+    """
+    Полнотекстовый поиск твитов с ранжированием по релевантности, фрагментами текста с подсветкой
+    найденных слов и постраничной навигацией по курсору
+
+    """
+    logger.debug("Запрос на поиск твитов: api_key = {}, q = {}".format(api_key, q))
+
+    tweets = await Tweet.search(
+        db_async_session,
+        query=q,
+        limit=limit,
+        cursor=decode_cursor(cursor, float, int),
+    )
+    next_cursor = None
+
+    if len(tweets) == limit:
+        next_cursor = encode_cursor(tweets[-1]["rank"], tweets[-1]["id"])
+
+    await logger.complete()
+    return SearchResult(tweets=tweets, next_cursor=next_cursor)
+
+
 @app.post(
     "/api/medias",
     summary="добавить изображение",
     response_description="Успешное добавление изображения",
     status_code=status.HTTP_201_CREATED,
     tags=["Медиа"],
+    responses=RESPONSES[status.HTTP_429_TOO_MANY_REQUESTS],
 )
 async def post_image(
     file: Annotated[UploadFile, File],
@@ -247,17 +764,88 @@ async def post_image(
     return ImageResult(media_id=image_id)
 
 
+@app.get(
+    "/media/{image_id}",
+    summary="изображение нужной ширины",
+    response_description="Файл изображения",
+    status_code=status.HTTP_200_OK,
+    tags=["Медиа"],
+    response_class=FileResponse,
+    responses=RESPONSES[status.HTTP_404_NOT_FOUND],
+)
+async def get_media(
+    image_id: Annotated[str, Path(title="id изображения", pattern="^[0-9a-f]{32}$")],
+    w: Annotated[
+        Optional[int],
+        Query(
+            title="ширина в пикселях (по умолчанию ширина исходного изображения)",
+            ge=1,
+            le=MEDIA_MAX_WIDTH,
+        ),
+    ] = None,
+    fmt: Annotated[
+        Literal["webp", "avif", "jpeg", "png"], Query(title="формат изображения")
+    ] = "webp",
+    db_async_session: AsyncSession = Depends(get_db_async_session),
+) -> FileResponse:
+    """
+    Изображение указанной ширины и формата. При первом запросе оно создаётся из исходного файла
+    (изображение не увеличивается) и сохраняется в дисковом кэше, повторные запросы отдают файл из кэша.
+    Ширина больше ширины изображения заменяется ею, поэтому такие запросы отдают один файл
+
+    """
+    image_format = resolve_encode_format(fmt)
+
+    if image_format is None:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Формат {} не поддерживается".format(fmt),
+        )
+
+    width = await Image.get_width(db_async_session, image_id)
+
+    if w is not None and width is not None:
+        w = min(w, width)
+
+    async def render() -> bytes:
+        logger.debug(
+            "Создание изображения: id = {}, ширина = {}, формат = {}".format(
+                image_id, w, image_format
+            )
+        )
+        source = await Image.load_source(db_async_session, image_id)
+        return await asyncio.to_thread(
+            resize_image, source, w, image_format, IMAGES_ENCODE_QUALITY
+        )
+
+    extension = FORMAT_EXTENSIONS[image_format]
+    # Файл открывается до отправки ответа: вытеснение из кэша после открытия не прерывает ответ
+    file = await media_cache.open(
+        "{}/{}.{}".format(image_id, w or "original", extension), render
+    )
+    await logger.complete()
+    return OpenedFileResponse(
+        file,
+        media_type="image/{}".format(image_format.lower()),
+        headers={"Cache-Control": "public, max-age=31536000, immutable"},
+    )
+
+
 @app.get(
     "/api/users/me",
     summary="инфо моего профиля",
     status_code=status.HTTP_200_OK,
     response_description="Инфо о текущем пользователе",
     tags=["Пользователи"],
-    responses=RESPONSES[status.HTTP_404_NOT_FOUND],
+    responses={
+        **RESPONSES[status.HTTP_401_UNAUTHORIZED],
+        **RESPONSES[status.HTTP_304_NOT_MODIFIED],
+        **RESPONSES[status.HTTP_404_NOT_FOUND],
+    },
 )
 async def my_profile_info(
-    api_key: Annotated[str | None, Header(title="id пользователя", max_length=32)],
-    db_async_session: AsyncSession = Depends(get_db_async_session),
+    request: Request,
+    api_key: Annotated[str, Depends(get_current_user_id)],
 ) -> UserInfoResult:
     """
     Получение информации о профиле текущего пользователя по id, указанном в ключе заголовка api-key
@@ -266,9 +854,73 @@ async def my_profile_info(
     logger.debug(
         "Запрос информации о профиле пользователя: api-key = {}".format(api_key)
     )
-    user_data = await User.get_user_data(db_async_session, api_key)
+    etag = await version_registry.get_profile_etag(api_key)
+
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    payload = await single_flight.do(
+        ("user", api_key, etag),
+        partial(run_in_own_session, partial(get_user_payload, user_id=api_key)),
+    )
     await logger.complete()
-    return UserInfoResult(user=user_data)
+    return json_with_etag(payload, etag)
+
+
+@app.delete(
+    "/api/users/me",
+    summary="удалить мой аккаунт",
+    status_code=status.HTTP_202_ACCEPTED,
+    response_description="Удаление аккаунта запущено",
+    tags=["Пользователи"],
+    responses=RESPONSES[status.HTTP_401_UNAUTHORIZED],
+)
+async def delete_my_account(
+    api_key: Annotated[str, Depends(get_current_user_id)],
+) -> AccountDeletionResult:
+    """
+    Запуск фонового удаления аккаунта текущего пользователя вместе с его твитами, изображениями,
+    лайками и подписками. Ход удаления доступен по GET /api/users/me/deletion с ключом token из ответа
+
+    """
+    logger.debug("Запрос на удаление аккаунта: api-key = {}".format(api_key))
+    progress = await account_deletion.start(api_key, AsyncSessionLocal)
+    await logger.complete()
+    return AccountDeletionResult(deletion=progress)
+
+
+@app.get(
+    "/api/users/me/deletion",
+    summary="ход удаления моего аккаунта",
+    status_code=status.HTTP_200_OK,
+    response_description="Ход удаления аккаунта",
+    tags=["Пользователи"],
+    responses=RESPONSES[status.HTTP_404_NOT_FOUND],
+)
+async def my_account_deletion(
+    api_key: Annotated[str, Header(title="id пользователя", max_length=32)],
+    deletion_token: Annotated[
+        str, Header(title="ключ, полученный при запуске удаления", max_length=64)
+    ],
+) -> AccountDeletionResult:
+    """
+    Получение хода удаления аккаунта по id, указанному в ключе заголовка api-key, и ключу из заголовка
+    deletion-token, который вернул запрос на удаление. api-key не проверяется по БД, так как после удаления
+    пользователя его уже нет, поэтому без ключа удаления ход не выдаётся
+
+    """
+    logger.debug("Запрос хода удаления аккаунта: api-key = {}".format(api_key))
+    progress = await account_deletion.get_progress(api_key, deletion_token)
+
+    if progress is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Удаление аккаунта {} не запускалось или ключ удаления неверен".format(
+                api_key
+            ),
+        )
+    await logger.complete()
+    return AccountDeletionResult(deletion=progress)
 
 
 @app.get(
@@ -277,11 +929,14 @@ async def my_profile_info(
     status_code=status.HTTP_200_OK,
     response_description="Инфо об указанном пользователе",
     tags=["Пользователи"],
-    responses=RESPONSES[status.HTTP_404_NOT_FOUND],
+    responses={
+        **RESPONSES[status.HTTP_304_NOT_MODIFIED],
+        **RESPONSES[status.HTTP_404_NOT_FOUND],
+    },
 )
 async def users_profile_info(
+    request: Request,
     user_id: Annotated[str, Path(title="id пользователя", max_length=32)],
-    db_async_session: AsyncSession = Depends(get_db_async_session),
 ) -> UserInfoResult:
     """
     Получение информации о профиле пользователя по указанном в строке url id
@@ -290,9 +945,87 @@ async def users_profile_info(
     logger.debug(
         "Запрос информации о профиле пользователя: user_id = {}".format(user_id)
     )
-    user_data = await User.get_user_data(db_async_session, user_id)
+    etag = await version_registry.get_profile_etag(user_id)
+
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    payload = await single_flight.do(
+        ("user", user_id, etag),
+        partial(run_in_own_session, partial(get_user_payload, user_id=user_id)),
+    )
     await logger.complete()
-    return UserInfoResult(user=user_data)
+    return json_with_etag(payload, etag)
+
+
+@app.get(
+    "/api/users/{user_id}/tweets",
+    summary="твиты пользователя",
+    status_code=status.HTTP_200_OK,
+    response_description="Страница твитов пользователя по убыванию id",
+    tags=["Пользователи"],
+    responses={
+        **RESPONSES[status.HTTP_401_UNAUTHORIZED],
+        **RESPONSES[status.HTTP_404_NOT_FOUND],
+    },
+)
+async def user_tweets(
+    user_id: Annotated[str, Path(title="id пользователя", max_length=32)],
+    api_key: Annotated[str, Depends(get_current_user_id)],
+    limit: Annotated[
+        int, Query(title="количество твитов на странице", ge=1, le=100)
+    ] = 20,
+    cursor: Annotated[
+        str | None, Query(title="курсор следующей страницы", max_length=128)
+    ] = None,
+    archive: Annotated[
+        bool, Query(title="Продолжить историю архивными твитами")
+    ] = False,
+    db_async_session: AsyncSession = Depends(get_db_async_session),
+) -> TweetPageResult:
+    """
+    Получение твитов пользователя по убыванию id с постраничной навигацией по курсору.
+    Твиты возвращаются в компактном виде, как в ленте с параметром compact=true.
+    С параметром archive=true после свежих твитов история продолжается архивными
+
+    """
+    logger.debug(
+        "Запрос твитов пользователя: api_key = {}, user_id = {}".format(
+            api_key, user_id
+        )
+    )
+    # Архивные твиты старше свежих, поэтому их id меньше и навигация продолжается тем же курсором
+    in_archive, before_id = decode_cursor(cursor, bool, int) or (False, None)
+    tweets, archived = [], []
+
+    if not in_archive:
+        tweets = await Tweet.get_author_tweets(
+            db_async_session, user_id, limit, before_id
+        )
+        if tweets:
+            before_id = tweets[-1].id
+
+    if archive and len(tweets) < limit:
+        in_archive = True
+        archived = await Tweet.get_author_tweets(
+            db_async_session, user_id, limit - len(tweets), before_id, archive=True
+        )
+
+    if cursor is None and not tweets and not archived:
+        if not await User.is_user_exist(db_async_session, user_id):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Пользователя с id {} не существует".format(user_id),
+            )
+
+    views = await get_compact_views(db_async_session, api_key, tweets, archived)
+    next_cursor = None
+
+    if len(views) == limit:
+        next_cursor = encode_cursor(in_archive, views[-1].id)
+
+    await logger.complete()
+    return TweetPageResult(tweets=views, next_cursor=next_cursor)
 
 
 @app.post(
@@ -302,13 +1035,14 @@ async def users_profile_info(
     status_code=status.HTTP_201_CREATED,
     tags=["Подписки"],
     responses={
+        **RESPONSES[status.HTTP_401_UNAUTHORIZED],
         **RESPONSES[status.HTTP_404_NOT_FOUND],
         **RESPONSES[status.HTTP_409_CONFLICT],
     },
 )
 async def follow_to_user(
     user_id: Annotated[str, Path(title="id пользователя", max_length=32)],
-    api_key: Annotated[str | None, Header(title="id подписчика", max_length=32)],
+    api_key: Annotated[str, Depends(get_current_user_id)],
     db_async_session: AsyncSession = Depends(get_db_async_session),
 ) -> Result:
     """
@@ -335,11 +1069,14 @@ async def follow_to_user(
     response_description="Успешная отписка от пользователя",
     status_code=status.HTTP_200_OK,
     tags=["Подписки"],
-    responses=RESPONSES[status.HTTP_404_NOT_FOUND],
+    responses={
+        **RESPONSES[status.HTTP_401_UNAUTHORIZED],
+        **RESPONSES[status.HTTP_404_NOT_FOUND],
+    },
 )
 async def unfollow_to_user(
     user_id: Annotated[str, Path(title="id пользователя", max_length=32)],
-    api_key: Annotated[str | None, Header(title="id подписчика", max_length=32)],
+    api_key: Annotated[str, Depends(get_current_user_id)],
     db_async_session: AsyncSession = Depends(get_db_async_session),
 ) -> Result:
     """
@@ -385,6 +1122,34 @@ async def add_user(
     return NewUserResult(user=new_user)
 
 
+@app.post(
+    "/api/batch",
+    summary="пакет операций",
+    response_description="Результаты выполнения каждой операции пакета",
+    status_code=status.HTTP_200_OK,
+    tags=["Пакетные операции"],
+    responses=RESPONSES[status.HTTP_401_UNAUTHORIZED],
+)
+async def batch_operations(
+    batch: NewBatch,
+    api_key: Annotated[str, Depends(get_current_user_id)],
+    db_async_session: AsyncSession = Depends(get_db_async_session),
+) -> BatchResult:
+    """
+    Выполнение списка операций follow, unfollow, like, unlike и delete текущего пользователя
+    в одной транзакции. Результат возвращается для каждой операции отдельно
+
+    """
+    logger.debug(
+        "Запрос на выполнение пакета операций: api_key = {}, количество = {}".format(
+            api_key, len(batch.operations)
+        )
+    )
+    results = await run_batch(db_async_session, api_key, batch.operations)
+    await logger.complete()
+    return BatchResult(results=results)
+
+
 @app.exception_handler(Exception)
 async def unicorn_exception_handler(request: Request, exc: Exception) -> JSONResponse:
     """
@@ -0,0 +1,471 @@
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from config import SEARCH_TS_CONFIG
+from database import Base
+from logger import logger
+
+# Импорт моделей регистрирует все таблицы в Base.metadata
+from models.archive import ArchivedLike, ArchivedTweet  # noqa: F401
+from models.image import Image  # noqa: F401
+from models.like import Like  # noqa: F401
+from models.timeline import Timeline  # noqa: F401
+from models.tweet import Tweet  # noqa: F401
+from models.user import User  # noqa: F401
+
+# Ключ рекомендательной блокировки Postgres, под которой миграции выполняет только один воркер
+MIGRATIONS_LOCK_KEY = 5_318_008_001
+
+
+@dataclass
+class Migration:
+    """
+    Миграция схемы БД. Нетранзакционные миграции (например, CREATE INDEX CONCURRENTLY) выполняются
+    в режиме autocommit, поэтому должны быть идемпотентными на случай прерывания
+    """
+
+    version: int
+    name: str
+    upgrade: Callable[[AsyncConnection], Awaitable[None]]
+    transactional: bool = True
+
+
+async def create_index_concurrently(
+    connection: AsyncConnection, index_name: str, definition: str
+) -> None:
+    """
+    Функция, создающая индекс без блокировки записи в таблицу. Невалидный индекс,
+    оставшийся после прерванного построения, удаляется и строится заново
+
+    :param connection: подключение к БД в режиме autocommit
+    :param index_name: название индекса
+    :param definition: определение индекса после CREATE INDEX CONCURRENTLY <название>
+    """
+    invalid = await connection.scalar(
+        text(
+            "SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:index_name)"
+        ),
+        {"index_name": index_name},
+    )
+    if invalid:
+        logger.warning("Удаление невалидного индекса {}".format(index_name))
+        await connection.execute(text("DROP INDEX CONCURRENTLY {}".format(index_name)))
+
+    await connection.execute(
+        text(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS {} {}".format(
+                index_name, definition
+            )
+        )
+    )
+
+
+# Схема до введения миграций. Определения таблиц зафиксированы: последующие изменения моделей
+# попадают в БД только через свои миграции, поэтому базовая схема от моделей не зависит
+BASELINE_STATEMENTS = [
+    "CREATE TABLE IF NOT EXISTS users ("
+    "id CHAR(32) NOT NULL, "
+    "name VARCHAR(20) NOT NULL, "
+    "CONSTRAINT users_pkey PRIMARY KEY (id), "
+    "CONSTRAINT users_name_key UNIQUE (name))",
+    "CREATE TABLE IF NOT EXISTS followers ("
+    "follower_user_id CHAR(32) NOT NULL, "
+    "following_user_id CHAR(32) NOT NULL, "
+    "CONSTRAINT followers_pkey PRIMARY KEY (follower_user_id, following_user_id), "
+    "CONSTRAINT followers_follower_user_id_fkey FOREIGN KEY (follower_user_id) "
+    "REFERENCES users (id) ON DELETE CASCADE ON UPDATE CASCADE, "
+    "CONSTRAINT followers_following_user_id_fkey FOREIGN KEY (following_user_id) "
+    "REFERENCES users (id) ON DELETE CASCADE ON UPDATE CASCADE)",
+    "CREATE TABLE IF NOT EXISTS tweets ("
+    "id SERIAL NOT NULL, "
+    "content VARCHAR(6553) NOT NULL, "
+    "author_id CHAR(32) NOT NULL, "
+    "CONSTRAINT tweets_pkey PRIMARY KEY (id), "
+    "CONSTRAINT tweets_author_id_fkey FOREIGN KEY (author_id) "
+    "REFERENCES users (id) ON DELETE CASCADE ON UPDATE CASCADE)",
+    "CREATE TABLE IF NOT EXISTS images ("
+    "id CHAR(32) NOT NULL, "
+    "folder CHAR(10) NOT NULL, "
+    "extension CHAR(3) NOT NULL, "
+    "tweet_id INTEGER, "
+    "CONSTRAINT images_pkey PRIMARY KEY (id), "
+    "CONSTRAINT images_tweet_id_fkey FOREIGN KEY (tweet_id) "
+    "REFERENCES tweets (id) ON DELETE CASCADE ON UPDATE CASCADE)",
+    "CREATE TABLE IF NOT EXISTS likes ("
+    "user_id CHAR(32) NOT NULL, "
+    "tweet_id INTEGER NOT NULL, "
+    "CONSTRAINT likes_pkey PRIMARY KEY (user_id, tweet_id), "
+    "CONSTRAINT likes_user_id_fkey FOREIGN KEY (user_id) "
+    "REFERENCES users (id) ON DELETE CASCADE ON UPDATE CASCADE, "
+    "CONSTRAINT likes_tweet_id_fkey FOREIGN KEY (tweet_id) "
+    "REFERENCES tweets (id) ON DELETE CASCADE ON UPDATE CASCADE)",
+]
+
+
+async def create_baseline_tables(connection: AsyncConnection) -> None:
+    for statement in BASELINE_STATEMENTS:
+        await connection.execute(text(statement))
+
+
+async def add_tweets_content_tsv(connection: AsyncConnection) -> None:
+    await connection.execute(
+        text("ALTER TABLE tweets ADD COLUMN IF NOT EXISTS content_tsv tsvector")
+    )
+    await connection.execute(
+        text(
+            "UPDATE tweets SET content_tsv = to_tsvector(CAST(:config AS regconfig), content) "
+            "WHERE content_tsv IS NULL"
+        ),
+        {"config": SEARCH_TS_CONFIG},
+    )
+
+
+async def create_ix_tweets_content_tsv(connection: AsyncConnection) -> None:
+    await create_index_concurrently(
+        connection, "ix_tweets_content_tsv", "ON tweets USING gin (content_tsv)"
+    )
+
+
+# Переход с внешних ключей CHAR(32) на внутренний ключ пользователя BIGINT. Удаление старых столбцов
+# удаляет и построенные на них первичные и внешние ключи, после чего ограничения создаются заново
+# с теми же именами, что и при создании схемы из моделей
+USERS_PK_STATEMENTS = [
+    "ALTER TABLE users ADD COLUMN pk BIGINT GENERATED BY DEFAULT AS IDENTITY",
+    "ALTER TABLE followers ADD COLUMN follower_user_pk BIGINT, ADD COLUMN following_user_pk BIGINT",
+    "UPDATE followers SET "
+    "follower_user_pk = (SELECT pk FROM users WHERE users.id = followers.follower_user_id), "
+    "following_user_pk = (SELECT pk FROM users WHERE users.id = followers.following_user_id)",
+    "ALTER TABLE likes ADD COLUMN user_pk BIGINT",
+    "UPDATE likes SET user_pk = users.pk FROM users WHERE users.id = likes.user_id",
+    "ALTER TABLE tweets ADD COLUMN author_pk BIGINT",
+    "UPDATE tweets SET author_pk = users.pk FROM users WHERE users.id = tweets.author_id",
+    "ALTER TABLE followers DROP COLUMN follower_user_id, DROP COLUMN following_user_id",
+    "ALTER TABLE likes DROP COLUMN user_id",
+    "ALTER TABLE tweets DROP COLUMN author_id",
+    "ALTER TABLE users DROP CONSTRAINT users_pkey, "
+    "ADD CONSTRAINT users_pkey PRIMARY KEY (pk), "
+    "ADD CONSTRAINT users_id_key UNIQUE (id)",
+    "ALTER TABLE followers "
+    "ADD CONSTRAINT followers_pkey PRIMARY KEY (follower_user_pk, following_user_pk), "
+    "ADD CONSTRAINT followers_follower_user_pk_fkey FOREIGN KEY (follower_user_pk) "
+    "REFERENCES users (pk) ON DELETE CASCADE ON UPDATE CASCADE, "
+    "ADD CONSTRAINT followers_following_user_pk_fkey FOREIGN KEY (following_user_pk) "
+    "REFERENCES users (pk) ON DELETE CASCADE ON UPDATE CASCADE",
+    "ALTER TABLE likes "
+    "ADD CONSTRAINT likes_pkey PRIMARY KEY (user_pk, tweet_id), "
+    "ADD CONSTRAINT likes_user_pk_fkey FOREIGN KEY (user_pk) "
+    "REFERENCES users (pk) ON DELETE CASCADE ON UPDATE CASCADE",
+    "ALTER TABLE tweets ALTER COLUMN author_pk SET NOT NULL, "
+    "ADD CONSTRAINT tweets_author_pk_fkey FOREIGN KEY (author_pk) "
+    "REFERENCES users (pk) ON DELETE CASCADE ON UPDATE CASCADE",
+]
+
+
+async def add_users_pk(connection: AsyncConnection) -> None:
+    pk_exists = await connection.scalar(
+        text(
+            "SELECT 1 FROM information_schema.columns "
+            "WHERE table_name = 'users' AND column_name = 'pk'"
+        )
+    )
+    if pk_exists:
+        return
+
+    for statement in USERS_PK_STATEMENTS:
+        await connection.execute(text(statement))
+
+
+# Значение по умолчанию now() не пересобирает таблицу: существующие твиты получают время миграции
+# и попадают в архив не раньше, чем через TWEETS_ARCHIVE_AFTER_DAYS дней после неё
+TWEETS_ARCHIVE_STATEMENTS = [
+    "ALTER TABLE tweets ADD COLUMN IF NOT EXISTS created_at TIMESTAMPTZ NOT NULL DEFAULT now()",
+    "CREATE TABLE IF NOT EXISTS tweets_archive ("
+    "id BIGINT NOT NULL, "
+    "content VARCHAR(6553) NOT NULL, "
+    "author_pk BIGINT NOT NULL, "
+    "created_at TIMESTAMPTZ NOT NULL, "
+    "archived_at TIMESTAMPTZ NOT NULL DEFAULT now(), "
+    "attachments VARCHAR[] NOT NULL, "
+    "CONSTRAINT tweets_archive_pkey PRIMARY KEY (id), "
+    "CONSTRAINT tweets_archive_author_pk_fkey FOREIGN KEY (author_pk) "
+    "REFERENCES users (pk) ON DELETE CASCADE ON UPDATE CASCADE)",
+    "CREATE INDEX IF NOT EXISTS ix_tweets_archive_author_pk ON tweets_archive (author_pk)",
+    "CREATE TABLE IF NOT EXISTS likes_archive ("
+    "user_pk BIGINT NOT NULL, "
+    "tweet_id BIGINT NOT NULL, "
+    "CONSTRAINT likes_archive_pkey PRIMARY KEY (user_pk, tweet_id), "
+    "CONSTRAINT likes_archive_user_pk_fkey FOREIGN KEY (user_pk) "
+    "REFERENCES users (pk) ON DELETE CASCADE ON UPDATE CASCADE, "
+    "CONSTRAINT likes_archive_tweet_id_fkey FOREIGN KEY (tweet_id) "
+    "REFERENCES tweets_archive (id) ON DELETE CASCADE ON UPDATE CASCADE)",
+    "CREATE INDEX IF NOT EXISTS ix_likes_archive_tweet_id ON likes_archive (tweet_id)",
+]
+
+
+async def add_tweets_archive(connection: AsyncConnection) -> None:
+    for statement in TWEETS_ARCHIVE_STATEMENTS:
+        await connection.execute(text(statement))
+
+
+async def create_ix_tweets_created_at(connection: AsyncConnection) -> None:
+    await create_index_concurrently(
+        connection, "ix_tweets_created_at", "ON tweets (created_at)"
+    )
+
+
+async def create_ix_tweets_author_pk_id(connection: AsyncConnection) -> None:
+    await create_index_concurrently(
+        connection, "ix_tweets_author_pk_id", "ON tweets (author_pk, id)"
+    )
+
+
+async def create_ix_tweets_author_pk_created_at(connection: AsyncConnection) -> None:
+    await create_index_concurrently(
+        connection,
+        "ix_tweets_author_pk_created_at",
+        "ON tweets (author_pk, created_at DESC, id DESC)",
+    )
+
+
+# Существующие твиты не записаны в ленты и читаются из таблицы твитов
+TIMELINES_STATEMENTS = [
+    "ALTER TABLE tweets ADD COLUMN IF NOT EXISTS fanned_out BOOLEAN NOT NULL DEFAULT false",
+    "CREATE TABLE IF NOT EXISTS timelines ("
+    "user_pk BIGINT NOT NULL, "
+    "created_at TIMESTAMPTZ NOT NULL, "
+    "tweet_id INTEGER NOT NULL, "
+    "author_pk BIGINT NOT NULL, "
+    "CONSTRAINT timelines_pkey PRIMARY KEY (user_pk, created_at, tweet_id), "
+    "CONSTRAINT timelines_user_pk_fkey FOREIGN KEY (user_pk) "
+    "REFERENCES users (pk) ON DELETE CASCADE ON UPDATE CASCADE, "
+    "CONSTRAINT timelines_tweet_id_fkey FOREIGN KEY (tweet_id) "
+    "REFERENCES tweets (id) ON DELETE CASCADE ON UPDATE CASCADE)",
+    "CREATE INDEX IF NOT EXISTS ix_timelines_tweet_id ON timelines (tweet_id)",
+]
+
+
+async def add_timelines(connection: AsyncConnection) -> None:
+    for statement in TIMELINES_STATEMENTS:
+        await connection.execute(text(statement))
+
+
+async def create_ix_tweets_author_pk_created_at_pulled(
+    connection: AsyncConnection,
+) -> None:
+    # Полный индекс заменяется частичным: твиты, записанные в ленты, при чтении ленты не сканируются
+    await create_index_concurrently(
+        connection,
+        "ix_tweets_author_pk_created_at_pulled",
+        "ON tweets (author_pk, created_at DESC, id DESC) WHERE NOT fanned_out",
+    )
+    await connection.execute(
+        text("DROP INDEX CONCURRENTLY IF EXISTS ix_tweets_author_pk_created_at")
+    )
+
+
+IMAGES_METADATA_STATEMENTS = [
+    "ALTER TABLE images ALTER COLUMN extension TYPE VARCHAR(4), "
+    "ADD COLUMN IF NOT EXISTS format VARCHAR(10), "
+    "ADD COLUMN IF NOT EXISTS width INTEGER, "
+    "ADD COLUMN IF NOT EXISTS height INTEGER, "
+    "ADD COLUMN IF NOT EXISTS size_bytes INTEGER",
+    "ALTER TABLE tweets_archive ADD COLUMN IF NOT EXISTS media JSONB NOT NULL DEFAULT '[]'::jsonb",
+]
+
+
+async def add_images_metadata(connection: AsyncConnection) -> None:
+    # Формат и размеры уже загруженных изображений неизвестны и остаются NULL
+    for statement in IMAGES_METADATA_STATEMENTS:
+        await connection.execute(text(statement))
+
+
+async def create_ix_likes_tweet_id(connection: AsyncConnection) -> None:
+    await create_index_concurrently(
+        connection, "ix_likes_tweet_id", "ON likes (tweet_id, user_pk)"
+    )
+
+
+async def create_ix_followers_following_user_pk(connection: AsyncConnection) -> None:
+    await create_index_concurrently(
+        connection,
+        "ix_followers_following_user_pk",
+        "ON followers (following_user_pk, follower_user_pk)",
+    )
+
+
+async def create_ix_tweets_archive_author_pk_created_at(
+    connection: AsyncConnection,
+) -> None:
+    # Индекс по автору заменяется составным индексом с тем же первым столбцом
+    await create_index_concurrently(
+        connection,
+        "ix_tweets_archive_author_pk_created_at",
+        "ON tweets_archive (author_pk, created_at DESC, id DESC)",
+    )
+    await connection.execute(
+        text("DROP INDEX CONCURRENTLY IF EXISTS ix_tweets_archive_author_pk")
+    )
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "baseline", create_baseline_tables),
+    Migration(2, "tweets_content_tsv", add_tweets_content_tsv),
+    Migration(
+        3,
+        "ix_tweets_content_tsv",
+        create_ix_tweets_content_tsv,
+        transactional=False,
+    ),
+    Migration(4, "users_pk", add_users_pk),
+    Migration(5, "tweets_archive", add_tweets_archive),
+    Migration(
+        6,
+        "ix_tweets_created_at",
+        create_ix_tweets_created_at,
+        transactional=False,
+    ),
+    Migration(
+        7,
+        "ix_tweets_author_pk_id",
+        create_ix_tweets_author_pk_id,
+        transactional=False,
+    ),
+    Migration(
+        8,
+        "ix_tweets_author_pk_created_at",
+        create_ix_tweets_author_pk_created_at,
+        transactional=False,
+    ),
+    Migration(9, "timelines", add_timelines),
+    Migration(
+        10,
+        "ix_tweets_author_pk_created_at_pulled",
+        create_ix_tweets_author_pk_created_at_pulled,
+        transactional=False,
+    ),
+    Migration(11, "images_metadata", add_images_metadata),
+    Migration(
+        12,
+        "ix_likes_tweet_id",
+        create_ix_likes_tweet_id,
+        transactional=False,
+    ),
+    Migration(
+        13,
+        "ix_followers_following_user_pk",
+        create_ix_followers_following_user_pk,
+        transactional=False,
+    ),
+    Migration(
+        14,
+        "ix_tweets_archive_author_pk_created_at",
+        create_ix_tweets_archive_author_pk_created_at,
+        transactional=False,
+    ),
+]
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+async def get_schema_version(connection: AsyncConnection) -> int:
+    """
+    Функция, возвращающая версию схемы БД
+
+    :param connection: подключение к БД
+    :return: номер последней применённой миграции или 0, если миграции не применялись
+    """
+    if await connection.scalar(text("SELECT to_regclass('schema_migrations')")) is None:
+        return 0
+    return await connection.scalar(
+        text("SELECT coalesce(max(version), 0) FROM schema_migrations")
+    )
+
+
+async def stamp_migrations(
+    connection: AsyncConnection, migrations: List[Migration]
+) -> None:
+    await connection.execute(
+        text(
+            "INSERT INTO schema_migrations (version, name) VALUES (:version, :name) "
+            "ON CONFLICT DO NOTHING"
+        ),
+        [
+            {"version": migration.version, "name": migration.name}
+            for migration in migrations
+        ],
+    )
+
+
+async def run_migrations(engine: AsyncEngine) -> bool:
+    """
+    Функция, приводящая схему БД к последней версии. Если схема актуальна, выполняется только проверка
+    версии. Иначе миграции применяются одним воркером под рекомендательной блокировкой, остальные воркеры
+    ждут её освобождения. Пустая БД создаётся сразу в последней версии
+
+    :param engine: движок подключения к БД
+    :return: True, если схема была создана в пустой БД
+    """
+    async with engine.connect() as connection:
+        if await get_schema_version(connection) == LATEST_VERSION:
+            logger.debug("Схема БД актуальна: версия = {}".format(LATEST_VERSION))
+            return False
+
+    # Соединение блокировки работает в autocommit: открытая транзакция с ним помешала бы
+    # построению индексов CONCURRENTLY, которое ждёт завершения всех транзакций
+    async with engine.connect() as lock_connection:
+        lock_connection = await lock_connection.execution_options(
+            isolation_level="AUTOCOMMIT"
+        )
+        await lock_connection.execute(
+            text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATIONS_LOCK_KEY}
+        )
+        try:
+            return await apply_migrations(engine, lock_connection)
+        finally:
+            await lock_connection.execute(
+                text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATIONS_LOCK_KEY}
+            )
+
+
+async def apply_migrations(
+    engine: AsyncEngine, autocommit_connection: AsyncConnection
+) -> bool:
+    async with engine.begin() as connection:
+        current_version = await get_schema_version(connection)
+
+        if current_version == LATEST_VERSION:
+            return False
+
+        await connection.execute(
+            text(
+                "CREATE TABLE IF NOT EXISTS schema_migrations ("
+                "version INTEGER PRIMARY KEY, "
+                "name VARCHAR(100) NOT NULL, "
+                "applied_at TIMESTAMPTZ NOT NULL DEFAULT now())"
+            )
+        )
+
+        if await connection.scalar(text("SELECT to_regclass('users')")) is None:
+            logger.info("Создание схемы БД: версия = {}".format(LATEST_VERSION))
+            await connection.run_sync(Base.metadata.create_all)
+            await stamp_migrations(connection, MIGRATIONS)
+            return True
+
+    for migration in MIGRATIONS:
+        if migration.version <= current_version:
+            continue
+
+        logger.info(
+            "Применение миграции {}: {}".format(migration.version, migration.name)
+        )
+        if migration.transactional:
+            async with engine.begin() as connection:
+                await migration.upgrade(connection)
+                await stamp_migrations(connection, [migration])
+        else:
+            await migration.upgrade(autocommit_connection)
+            await stamp_migrations(autocommit_connection, [migration])
+
+    return False
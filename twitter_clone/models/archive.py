@@ -0,0 +1,330 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import (
+    BigInteger,
+    DateTime,
+    ForeignKey,
+    Index,
+    String,
+    delete,
+    func,
+    insert,
+    select,
+    text,
+    tuple_,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import Mapped, aliased, mapped_column, relationship, selectinload
+
+from database import Base
+from logger import logger
+from models.follower import follower
+from models.image import Image
+from models.like import Like
+from models.tweet import Tweet
+from models.user import User
+from storage import image_storage
+
+
+class ArchivedLike(Base):
+    __tablename__ = "likes_archive"
+
+    user_pk: Mapped[int] = mapped_column(
+        ForeignKey("users.pk", onupdate="CASCADE", ondelete="CASCADE"), primary_key=True
+    )
+    tweet_id: Mapped[int] = mapped_column(
+        ForeignKey("tweets_archive.id", onupdate="CASCADE", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    user: Mapped[User] = relationship(User)
+
+    __table_args__ = (Index("ix_likes_archive_tweet_id", "tweet_id"),)
+
+    @hybrid_property
+    def user_id(self) -> str:
+        return self.user.id
+
+    @hybrid_property
+    def name(self) -> str:
+        return self.user.name
+
+    @classmethod
+    async def delete_user_likes_batch(
+        cls, db_async_session: AsyncSession, user_id: str, limit: int
+    ) -> List[int]:
+        """
+        Удаляет не более limit лайков пользователя к архивным твитам.
+        Выполняется в рамках уже открытой транзакции сессии
+
+        :param db_async_session: асинхронная сессия подключения к БД с открытой транзакцией
+        :param user_id: id пользователя
+        :param limit: максимальное количество удаляемых лайков
+        :return: список id архивных твитов, лайк которых удалён
+        """
+        batch = aliased(ArchivedLike)
+        result = await db_async_session.execute(
+            delete(ArchivedLike)
+            .where(ArchivedLike.user_pk == User.pk_of(user_id))
+            .where(
+                ArchivedLike.tweet_id.in_(
+                    select(batch.tweet_id)
+                    .where(batch.user_pk == User.pk_of(user_id))
+                    .limit(limit)
+                )
+            )
+            .returning(ArchivedLike.tweet_id)
+        )
+        return result.scalars().all()
+
+    @classmethod
+    async def delete_tweets_likes_batch(
+        cls, db_async_session: AsyncSession, tweet_ids: List[int], limit: int
+    ) -> int:
+        """
+        Удаляет не более limit лайков указанных архивных твитов.
+        Выполняется в рамках уже открытой транзакции сессии
+
+        :param db_async_session: асинхронная сессия подключения к БД с открытой транзакцией
+        :param tweet_ids: список id архивных твитов
+        :param limit: максимальное количество удаляемых лайков
+        :return: количество удалённых лайков
+        """
+        batch = aliased(ArchivedLike)
+        result = await db_async_session.execute(
+            delete(ArchivedLike).where(
+                tuple_(ArchivedLike.user_pk, ArchivedLike.tweet_id).in_(
+                    select(batch.user_pk, batch.tweet_id)
+                    .where(batch.tweet_id.in_(tweet_ids))
+                    .limit(limit)
+                )
+            )
+        )
+        return result.rowcount
+
+
+class ArchivedTweet(Base):
+    """
+    Архивный твит. Твиты старше заданного возраста переносятся сюда вместе с лайками, чтобы таблицы
+    и индексы ленты содержали только свежие твиты. Пути изображений сохраняются в самом твите,
+    файлы изображений остаются на диске. Архивные твиты не участвуют в поиске и не принимают лайки
+    """
+
+    __tablename__ = "tweets_archive"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=False)
+    content: Mapped[str] = mapped_column(String(6553))
+    author_pk: Mapped[int] = mapped_column(
+        ForeignKey("users.pk", onupdate="CASCADE", ondelete="CASCADE")
+    )
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    archived_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+    attachments: Mapped[List[str]] = mapped_column(ARRAY(String), default=list)
+    # media: формат, размеры и объём изображений на момент переноса в архив
+    media: Mapped[List[Dict[str, Any]]] = mapped_column(
+        JSONB, server_default=text("'[]'::jsonb")
+    )
+
+    __table_args__ = (
+        Index(
+            "ix_tweets_archive_author_pk_created_at",
+            "author_pk",
+            text("created_at DESC"),
+            text("id DESC"),
+        ),
+    )
+
+    author: Mapped[User] = relationship(User)
+    likes: Mapped[Optional[List[ArchivedLike]]] = relationship(ArchivedLike)
+
+    @classmethod
+    async def archive_tweets(
+        cls, db_async_session: AsyncSession, created_before: datetime, limit: int
+    ) -> List[Tuple[int, str]]:
+        """
+        Функция, переносящая в архив не более limit твитов, созданных раньше created_before, вместе с их лайками.
+        Твиты, которые переносит другой воркер, пропускаются. Выполняется в рамках уже открытой транзакции сессии
+
+        :param db_async_session: асинхронная сессия подключения к БД с открытой транзакцией
+        :param created_before: граница возраста твитов
+        :param limit: максимальное количество твитов
+        :return: список пар (id твита, id автора) перенесённых твитов
+        """
+        result = await db_async_session.execute(
+            select(Tweet.id)
+            .where(Tweet.created_at < created_before)
+            .order_by(Tweet.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        tweet_ids = result.scalars().all()
+
+        if not tweet_ids:
+            return []
+
+        logger.debug("Перенос твитов в архив: количество = {}".format(len(tweet_ids)))
+        image_path = func.concat(
+            image_storage.base_url, Image.folder, "/", Image.id, ".", Image.extension
+        )
+        attachments = func.array(
+            select(image_path).where(Image.tweet_id == Tweet.id).scalar_subquery()
+        )
+        media = func.coalesce(
+            select(
+                func.jsonb_agg(
+                    func.jsonb_build_object(
+                        "url",
+                        image_path,
+                        "format",
+                        Image.format,
+                        "width",
+                        Image.width,
+                        "height",
+                        Image.height,
+                        "bytes",
+                        Image.size_bytes,
+                    )
+                )
+            )
+            .where(Image.tweet_id == Tweet.id)
+            .scalar_subquery(),
+            text("'[]'::jsonb"),
+        )
+        await db_async_session.execute(
+            insert(ArchivedTweet).from_select(
+                ["id", "content", "author_pk", "created_at", "attachments", "media"],
+                select(
+                    Tweet.id,
+                    Tweet.content,
+                    Tweet.author_pk,
+                    Tweet.created_at,
+                    attachments,
+                    media,
+                ).where(Tweet.id.in_(tweet_ids)),
+            )
+        )
+        await db_async_session.execute(
+            insert(ArchivedLike).from_select(
+                ["user_pk", "tweet_id"],
+                select(Like.user_pk, Like.tweet_id).where(Like.tweet_id.in_(tweet_ids)),
+            )
+        )
+
+        # Лайки и строки изображений удаляются каскадно вместе с твитами
+        deleted = (
+            delete(Tweet)
+            .where(Tweet.id.in_(tweet_ids))
+            .returning(Tweet.id, Tweet.author_pk)
+            .cte("deleted")
+        )
+        result = await db_async_session.execute(
+            select(deleted.c.id, User.id).join(User, User.pk == deleted.c.author_pk)
+        )
+        return [(tweet_id, author_id.rstrip()) for tweet_id, author_id in result.all()]
+
+    @staticmethod
+    def attachment_key(attachment: str) -> str:
+        """
+        Функция, возвращающая ключ файла изображения по ссылке, сохранённой в архивном твите.
+        Строки изображений удаляются при переносе в архив, поэтому ключ восстанавливается по ссылке.
+        Ключ - две последние части ссылки, поэтому он не зависит от хранилища, в котором ссылка сформирована
+
+        :param attachment: ссылка на изображение
+        :return: ключ файла вида {папка}/{id}.{расширение}
+        """
+        return "/".join(attachment.rsplit("/", 2)[-2:])
+
+    @classmethod
+    async def get_author_tweet_ids(
+        cls, db_async_session: AsyncSession, author_id: str, limit: int
+    ) -> List[int]:
+        """
+        Функция, возвращающая id не более limit архивных твитов автора.
+        Выполняется в рамках уже открытой транзакции сессии
+
+        :param db_async_session: асинхронная сессия подключения к БД с открытой транзакцией
+        :param author_id: id автора
+        :param limit: максимальное количество твитов
+        :return: список id архивных твитов
+        """
+        result = await db_async_session.execute(
+            select(ArchivedTweet.id)
+            .where(ArchivedTweet.author_pk == User.pk_of(author_id))
+            .order_by(ArchivedTweet.id)
+            .limit(limit)
+        )
+        return result.scalars().all()
+
+    @classmethod
+    async def delete_many(
+        cls, db_async_session: AsyncSession, author_id: str, tweet_ids: List[int]
+    ) -> Tuple[Set[int], List[str]]:
+        """
+        Удаление нескольких архивных твитов автора одним запросом, лайки твитов удаляются каскадно.
+        Выполняется в рамках уже открытой транзакции сессии, файлы изображений удалённых твитов
+        необходимо удалить из хранилища после фиксации транзакции
+
+        :param db_async_session: асинхронная сессия подключения к БД с открытой транзакцией
+        :param author_id: id пользователя, к которому принадлежат твиты
+        :param tweet_ids: список id удаляемых архивных твитов
+        :return: множество id удалённых твитов и список ключей их изображений в хранилище
+        """
+        logger.debug(
+            "Пакетное удаление архивных твитов: id автора = {}, количество = {}".format(
+                author_id, len(tweet_ids)
+            )
+        )
+        result = await db_async_session.execute(
+            delete(ArchivedTweet)
+            .where(ArchivedTweet.author_pk == User.pk_of(author_id))
+            .where(ArchivedTweet.id.in_(tweet_ids))
+            .returning(ArchivedTweet.id, ArchivedTweet.attachments)
+        )
+        deleted_ids, image_keys = set(), []
+        for tweet_id, attachments in result.all():
+            deleted_ids.add(tweet_id)
+            image_keys.extend(cls.attachment_key(path) for path in attachments)
+        return deleted_ids, image_keys
+
+    @classmethod
+    async def get_tweets_from_followers(
+        cls, db_async_session: AsyncSession, user_id: str, with_likes: bool = True
+    ) -> List["ArchivedTweet"]:
+        """
+        Функция, которая возвращает архивные твиты пользователей, на которых подписан текущий пользователь,
+        и архивные твиты самого пользователя
+
+        :param db_async_session: асинхронная сессия подключения к БД
+        :param user_id: id текущего пользователя
+        :param with_likes: если False, лайки не загружаются
+        :return: список архивных твитов
+        """
+        logger.debug(
+            "Получение архивных твитов пользователя: id пользователя = {}".format(
+                user_id
+            )
+        )
+        options = [selectinload(ArchivedTweet.author)]
+        if with_likes:
+            options.append(
+                selectinload(ArchivedTweet.likes).selectinload(ArchivedLike.user)
+            )
+
+        async with db_async_session.begin():
+            user_pk = User.pk_of(user_id)
+            followings = select(follower.c.following_user_pk).where(
+                follower.c.follower_user_pk == user_pk
+            )
+            result = await db_async_session.execute(
+                select(ArchivedTweet)
+                .options(*options)
+                .where(
+                    ArchivedTweet.author_pk.in_(followings)
+                    | (ArchivedTweet.author_pk == user_pk)
+                )
+            )
+            return result.scalars().all()
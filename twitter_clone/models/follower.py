@@ -1,22 +1,25 @@
-from sqlalchemy import CHAR, Column, ForeignKey, Table
+from sqlalchemy import BigInteger, Column, ForeignKey, Index, Table
 
 from database import Base
 
-# follower_user_id: id пользователя, который подписался на пользователя c id following_user_id
-# following_user_id: id пользователя, на который подписался пользователь с id follower_user_id
+# follower_user_pk: внутренний ключ пользователя, который подписался на пользователя c ключом following_user_pk
+# following_user_pk: внутренний ключ пользователя, на которого подписался пользователь с ключом follower_user_pk
 follower = Table(
     "followers",
     Base.metadata,
     Column(
-        "follower_user_id",
-        CHAR(32),
-        ForeignKey("users.id", onupdate="CASCADE", ondelete="CASCADE"),
+        "follower_user_pk",
+        BigInteger,
+        ForeignKey("users.pk", onupdate="CASCADE", ondelete="CASCADE"),
         primary_key=True,
     ),
     Column(
-        "following_user_id",
-        CHAR(32),
-        ForeignKey("users.id", onupdate="CASCADE", ondelete="CASCADE"),
+        "following_user_pk",
+        BigInteger,
+        ForeignKey("users.pk", onupdate="CASCADE", ondelete="CASCADE"),
         primary_key=True,
     ),
+    # Первичный ключ начинается с follower_user_pk, поэтому подписчики автора (проверка порога
+    # и запись твита в ленты подписчиков) ищутся по отдельному индексу
+    Index("ix_followers_following_user_pk", "following_user_pk", "follower_user_pk"),
 )
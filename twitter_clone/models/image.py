@@ -1,25 +1,43 @@
+import asyncio
 from datetime import date
 from io import BytesIO
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 from uuid import uuid4
 
-import aiofiles
-from aiofiles.os import remove as aio_remove
-from aiofiles.os import rmdir as aio_rmdir
 from fastapi import HTTPException, status
-from PIL import Image as PillowImage
-from PIL import UnidentifiedImageError
-from sqlalchemy import CHAR, ForeignKey, delete, select
+from sqlalchemy import CHAR, ForeignKey, Integer, String, delete, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Mapped, mapped_column
 
+from config import (
+    IMAGES_ENCODE_FORMAT,
+    IMAGES_ENCODE_QUALITY,
+    IMAGES_KEEP_ORIGINAL,
+    IMAGES_MAX_EDGE,
+)
 from database import Base
 from logger import logger
+from storage import image_storage, original_storage
+from utility.image_encoding import encode_image, load_pillow
+from utility.media_cache import media_cache
 
-ABS_PATH = Path(__file__).parent.parent
-IMAGES_PATH = Path(ABS_PATH, "static", "images")
-IMAGES_PATH.mkdir(exist_ok=True)
+# Форматы Pillow, которые принимаются к загрузке, и расширения их файлов. Многие камеры телефонов сохраняют
+# JPEG с дополнительными кадрами, который Pillow определяет как MPO, такие файлы сохраняются как JPEG
+FORMAT_EXTENSIONS = {
+    "JPEG": "jpg",
+    "MPO": "jpg",
+    "PNG": "png",
+    "GIF": "gif",
+    "WEBP": "webp",
+    "AVIF": "avif",
+    "BMP": "bmp",
+    "TIFF": "tif",
+    "JPEG2000": "jp2",
+}
+# Значения тега EXIF Orientation, при которых изображение отображается повёрнутым на 90 градусов
+ROTATED_ORIENTATIONS = (5, 6, 7, 8)
+EXIF_ORIENTATION_TAG = 0x0112
 
 
 class Image(Base):
@@ -27,86 +45,156 @@ class Image(Base):
 
     id: Mapped[str] = mapped_column(CHAR(32), primary_key=True)
     folder: Mapped[str] = mapped_column(CHAR(10), default=date.today().__str__())
-    extension: Mapped[str] = mapped_column(CHAR(3))
+    extension: Mapped[str] = mapped_column(String(4))
     tweet_id: Mapped[Optional[int]] = mapped_column(
         ForeignKey("tweets.id", onupdate="CASCADE", ondelete="CASCADE")
     )
+    # format, width, height, size_bytes: формат по данным Pillow, размеры с учётом поворота EXIF
+    # и объём файла. Для изображений, загруженных до появления столбцов, равны NULL
+    format: Mapped[Optional[str]] = mapped_column(String(10))
+    width: Mapped[Optional[int]] = mapped_column(Integer)
+    height: Mapped[Optional[int]] = mapped_column(Integer)
+    size_bytes: Mapped[Optional[int]] = mapped_column(Integer)
 
-    @classmethod
-    async def __get_extension_and_folder(cls, file_name: str) -> Tuple[str, str]:
+    @staticmethod
+    def storage_key(image_id: str, folder: str, extension: str) -> str:
         """
-        Функция, возвращает расширение изображения и папку сохранения на основе текущаей даты
+        Функция, возвращающая ключ файла изображения в хранилище
 
-        :param file_name: название файла изображения
-        :return: расширение и название папки
+        :param image_id: id изображения
+        :param folder: папка изображения
+        :param extension: расширение изображения
+        :return: ключ файла вида {папка}/{id}.{расширение}
         """
-        logger.debug(
-            "Генерация расширения и названия папки: file_name = {}".format(file_name)
+        return "{}/{}.{}".format(folder.rstrip(), image_id.rstrip(), extension)
+
+    @staticmethod
+    def original_key(image_key: str) -> str:
+        """
+        Функция, возвращающая ключ исходного файла перекодированного изображения. Исходный файл хранится
+        без расширения, его формат определяется по содержимому
+
+        :param image_key: ключ файла изображения
+        :return: ключ исходного файла
+        """
+        return image_key.rsplit(".", 1)[0]
+
+    @staticmethod
+    def attachment_path(image_id: str, folder: str, extension: str) -> str:
+        """
+        Функция, возвращающая ссылку на изображение, которую формирует хранилище файлов
+
+        :param image_id: id изображения
+        :param folder: папка изображения
+        :param extension: расширение изображения
+        :return: ссылка на изображение
+        """
+        return image_storage.url(Image.storage_key(image_id, folder, extension))
+
+    @staticmethod
+    def media_view(
+        image_id: str,
+        folder: str,
+        extension: str,
+        image_format: Optional[str],
+        width: Optional[int],
+        height: Optional[int],
+        size_bytes: Optional[int],
+    ) -> Dict[str, Any]:
+        """
+        Функция, возвращающая описание вложения твита: путь, формат, размеры и объём изображения
+
+        :return: словарь описания изображения
+        """
+        return {
+            "url": Image.attachment_path(image_id, folder, extension),
+            "format": image_format,
+            "width": width,
+            "height": height,
+            "bytes": size_bytes,
+        }
+
+    @property
+    def media(self) -> Dict[str, Any]:
+        return self.media_view(
+            self.id,
+            self.folder,
+            self.extension,
+            self.format,
+            self.width,
+            self.height,
+            self.size_bytes,
         )
-        return file_name.split(".")[-1], date.today().__str__()
 
-    @classmethod
-    async def __save_image_to_disk(cls, image: bytes, image_path: str):
+    @staticmethod
+    def read_metadata(image: bytes) -> Tuple[str, int, int]:
         """
-        Функция, сохраняющая изображение в указанный каталог
+        Функция, определяющая формат и размеры изображения по его содержимому. Pillow читает
+        только заголовок файла, изображение не декодируется
 
         :param image: байтовое представление изображения
-        :param image_path: относителный путь для сохранения нового изображения
+        :return: формат Pillow, ширина и высота изображения с учётом поворота EXIF
         """
-        logger.debug(
-            "Сохранение изображения на диск: relative_path = {}".format(image_path)
-        )
-        image_abs_path = Path(IMAGES_PATH, image_path)
-        async with aiofiles.open(image_abs_path.__str__(), mode="wb") as new_file:
-            await new_file.write(image)
+        # Pillow загружается только при первой загрузке изображения, а не при запуске приложения
+        from PIL import UnidentifiedImageError
+
+        PillowImage = load_pillow()
+
+        try:
+            with PillowImage.open(BytesIO(image)) as pillow_image:
+                width, height = pillow_image.size
+                orientation = pillow_image.getexif().get(EXIF_ORIENTATION_TAG)
+                image_format = pillow_image.format
+        except UnidentifiedImageError:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="В запросе отсутствует файл изображения",
+            )
+
+        if image_format not in FORMAT_EXTENSIONS:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Формат изображения {} не поддерживается".format(image_format),
+            )
+
+        if orientation in ROTATED_ORIENTATIONS:
+            width, height = height, width
+        return image_format, width, height
 
     @classmethod
-    async def __generate_image_path(
-        cls, image_id: str, image_folder: str, image_extension: str
-    ) -> str:
+    async def __get_extension_and_folder(cls, image_format: str) -> Tuple[str, str]:
         """
-        Функция, которая на основании даты и названия файла создаёт путь файла
+        Функция, возвращает расширение изображения по его формату и папку сохранения на основе текущаей даты
 
-        :param image_id: id нового изображения
-        :param image_folder: название папки изображения
-        :param image_extension: расширение изображения
-        :return: путь нового изображения
+        :param image_format: формат изображения по данным Pillow
+        :return: расширение и название папки
         """
         logger.debug(
-            "Генерация относительного пути избражения: image_id = {}".format(image_id)
+            "Генерация расширения и названия папки: format = {}".format(image_format)
         )
-        image_name = f"{image_id}.{image_extension}"
-
-        current_image_path = Path(IMAGES_PATH, image_folder)
-        current_image_path.mkdir(exist_ok=True)
-        return Path(image_folder, image_name).__str__()
+        return FORMAT_EXTENSIONS[image_format], date.today().__str__()
 
     @classmethod
-    async def delete_image_from_disk(cls, image_relative_path: str) -> bool:
+    async def delete_image_files(cls, image_key: str) -> None:
         """
-        Функция для отладки, удаляет файл из указанной директории
+        Функция, удаляющая из хранилища файл изображения, его исходный файл и изображения другой ширины
 
-        :param image_relative_path: относительный путь имеющегося на диске файла
+        :param image_key: ключ файла изображения в хранилище
         """
-        logger.debug(
-            "Удаление существующегося файла с диска: путь к файлу = {}".format(
-                image_relative_path
-            )
-        )
-        image_path = Path(IMAGES_PATH, image_relative_path)
-        await aio_remove(image_path)
-        try:
-            await aio_rmdir(image_path.parent)
-            return True
-        except OSError:
-            return False
+        logger.debug("Удаление файлов изображения: ключ = {}".format(image_key))
+        await image_storage.delete(image_key)
+        await original_storage.delete(cls.original_key(image_key))
+        await media_cache.discard(Path(image_key).stem)
 
     @classmethod
     async def add_image(
         cls, db_async_session: AsyncSession, image: bytes, filename: str
     ) -> str | None:
         """
-        Функция, которая сохраняет изображение в каталог images, и добавляет путь изображения в БД
+        Функция, которая сохраняет изображение в хранилище файлов, и добавляет путь изображения в БД.
+        Расширение файла определяется по настоящему формату изображения, а не по названию файла,
+        вместе с форматом сохраняются размеры и объём изображения. Если задана политика IMAGES_ENCODE_FORMAT,
+        изображение перекодируется в отдельном потоке, и сохраняются данные перекодированного файла
 
         :param db_async_session: асинхронная сессия подключения к БД
         :param image: байтовое представление изображения
@@ -114,28 +202,46 @@ class Image(Base):
         :return: id сохраненного изображения
         """
         logger.debug("Добаление нового изображения: filename = {}".format(filename))
+        image_format, width, height = cls.read_metadata(image)
+        original = None
 
-        try:
-            PillowImage.open(BytesIO(image))
-        except UnidentifiedImageError:
-            raise HTTPException(
-                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                detail="В запросе отсутствует файл изображения",
+        if IMAGES_ENCODE_FORMAT != "original":
+            encoded = await asyncio.to_thread(
+                encode_image,
+                image,
+                IMAGES_ENCODE_FORMAT,
+                IMAGES_ENCODE_QUALITY,
+                IMAGES_MAX_EDGE,
             )
+            if encoded is not None:
+                logger.debug(
+                    "Изображение перекодировано: {} -> {}, {} -> {} байт".format(
+                        image_format, encoded.format, len(image), len(encoded.data)
+                    )
+                )
+                original = image
+                image, image_format, width, height = encoded
 
         async with db_async_session.begin():
             image_id = uuid4().hex
             image_extension, image_folder = await cls.__get_extension_and_folder(
-                filename
+                image_format
             )
             new_image = Image(
-                id=image_id, folder=image_folder, extension=image_extension
+                id=image_id,
+                folder=image_folder,
+                extension=image_extension,
+                format=image_format,
+                width=width,
+                height=height,
+                size_bytes=len(image),
             )
             db_async_session.add(new_image)
-            image_relative_path = await cls.__generate_image_path(
-                image_id, image_folder, image_extension
-            )
-            await cls.__save_image_to_disk(image, image_relative_path)
+            image_key = cls.storage_key(image_id, image_folder, image_extension)
+            await image_storage.save(image_key, image)
+
+            if original is not None and IMAGES_KEEP_ORIGINAL:
+                await original_storage.save(cls.original_key(image_key), original)
         return new_image.id
 
     @classmethod
@@ -144,11 +250,11 @@ class Image(Base):
     ) -> List[str]:
         """
         Функция, которая извлекает из БД данные изображений по id твита, к которому они привязаны и
-        возвращает список относительных путей файлов изображениq на диске
+        возвращает список ключей файлов изображений в хранилище
 
         :param db_async_session: асинхронная сессия подключения к БД
         :param tweet_id: id твита
-        :return: список относительных путей изображений на диске
+        :return: список ключей файлов изображений
         """
         logger.debug(
             "Получение информации из БД об файлах изображений: id твита = {}".format(
@@ -162,10 +268,66 @@ class Image(Base):
             )
             images: List[Optional[Image]] = result.scalars().all()
             return [
-                await cls.__generate_image_path(image.id, image.folder, image.extension)
+                cls.storage_key(image.id, image.folder, image.extension)
                 for image in images
             ]
 
+    @classmethod
+    async def get_width(
+        cls, db_async_session: AsyncSession, image_id: str
+    ) -> Optional[int]:
+        """
+        Функция, возвращающая ширину сохранённого изображения
+
+        :param db_async_session: асинхронная сессия подключения к БД
+        :param image_id: id изображения
+        :return: ширина в пикселях или None, если изображение загружено до сохранения размеров
+        """
+        async with db_async_session.begin():
+            result = await db_async_session.execute(
+                select(Image.width).where(Image.id == image_id)
+            )
+            image = result.one_or_none()
+
+        if image is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Изображение с id {} не существует".format(image_id),
+            )
+        return image.width
+
+    @classmethod
+    async def load_source(cls, db_async_session: AsyncSession, image_id: str) -> bytes:
+        """
+        Функция, возвращающая файл, из которого создаются изображения другой ширины и формата:
+        исходный файл, если он сохранён, иначе файл изображения
+
+        :param db_async_session: асинхронная сессия подключения к БД
+        :param image_id: id изображения
+        :return: байтовое представление изображения
+        """
+        logger.debug("Загрузка файла изображения: id = {}".format(image_id))
+
+        async with db_async_session.begin():
+            result = await db_async_session.execute(
+                select(Image.folder, Image.extension).where(Image.id == image_id)
+            )
+            image = result.one_or_none()
+
+        if image is not None:
+            image_key = cls.storage_key(image_id, image.folder, image.extension)
+            source = await original_storage.load(cls.original_key(image_key))
+
+            if source is None:
+                source = await image_storage.load(image_key)
+            if source is not None:
+                return source
+
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Изображение с id {} не существует".format(image_id),
+        )
+
     @classmethod
     async def get_all_image_ids(cls, db_async_session: AsyncSession) -> List[str]:
         """
@@ -183,10 +345,10 @@ class Image(Base):
     @classmethod
     async def delete_image(cls, db_async_session: AsyncSession, image_id: str) -> bool:
         """
-        Функция, которая по id удаляет изображение из БД и с диска
+        Функция, которая по id удаляет изображение из БД и из хранилища файлов
         :param db_async_session:
         :param image_id:
-        :return:
+        :return: True, если изображение существовало
         """
         logger.debug("Удаление изображения: id = {}".format(image_id))
 
@@ -201,9 +363,9 @@ class Image(Base):
                     delete(Image).where(Image.id == image_id)
                 )
 
-                image_path = await cls.__generate_image_path(
-                    image.id, image.folder, image.extension
+                await cls.delete_image_files(
+                    cls.storage_key(image.id, image.folder, image.extension)
                 )
-                return await cls.delete_image_from_disk(image_path)
+                return True
 
             return False
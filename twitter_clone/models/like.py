@@ -1,11 +1,15 @@
+from typing import Any, Dict, List, Optional, Set, Tuple
+
 from fastapi import HTTPException, status
-from sqlalchemy import ForeignKey, delete, func, select
+from sqlalchemy import ForeignKey, Index, delete, func, insert, select, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.ext.hybrid import hybrid_property
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.orm import Mapped, aliased, mapped_column, relationship
 
 from database import Base
+from events import broker
 from logger import logger
 from models.user import User
 
@@ -13,8 +17,8 @@ from models.user import User
 class Like(Base):
     __tablename__ = "likes"
 
-    user_id: Mapped[str] = mapped_column(
-        ForeignKey("users.id", onupdate="CASCADE", ondelete="CASCADE"), primary_key=True
+    user_pk: Mapped[int] = mapped_column(
+        ForeignKey("users.pk", onupdate="CASCADE", ondelete="CASCADE"), primary_key=True
     )
     tweet_id: Mapped[int] = mapped_column(
         ForeignKey("tweets.id", onupdate="CASCADE", ondelete="CASCADE"),
@@ -22,6 +26,14 @@ class Like(Base):
     )
     user: Mapped[User] = relationship(User)
 
+    # Первичный ключ начинается с user_pk, поэтому лайки твита (списки лайкнувших, сводки лайков ленты
+    # и каскадное удаление вместе с твитом) ищутся по отдельному индексу
+    __table_args__ = (Index("ix_likes_tweet_id", "tweet_id", "user_pk"),)
+
+    @hybrid_property
+    def user_id(self) -> str:
+        return self.user.id
+
     @hybrid_property
     def name(self) -> str:
         return self.user.name
@@ -40,18 +52,25 @@ class Like(Base):
         logger.debug(
             "Добавление лайка: user_id = {}, tweet_id = {}".format(user_id, tweet_id)
         )
+        summary = {}
+
         try:
             async with db_async_session.begin():
-                db_async_session.add(Like(user_id=user_id, tweet_id=tweet_id))
+                await db_async_session.execute(
+                    insert(Like).values(user_pk=User.pk_of(user_id), tweet_id=tweet_id)
+                )
+
+                if broker.has_subscribers:
+                    summary = await cls.get_likes_summary(db_async_session, [tweet_id])
+
+            await cls.publish_likes_event("like_added", user_id, summary)
             return True
         except IntegrityError as exc:
-            exc_detail = str(exc.orig).split("\n")[1]
+            exc_detail = str(exc.orig)
 
+            # Ключ несуществующего пользователя равен NULL и нарушает ограничение NOT NULL
             if all(
-                [
-                    value in exc_detail
-                    for value in (user_id, "user_id", "is not present in table")
-                ]
+                [value in exc_detail for value in ('"user_pk"', "null value in column")]
             ):
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
@@ -73,9 +92,8 @@ class Like(Base):
                 [
                     value in exc_detail
                     for value in (
-                        user_id,
                         str(tweet_id),
-                        "user_id",
+                        "user_pk",
                         "tweet_id",
                         "already exists",
                     )
@@ -101,19 +119,345 @@ class Like(Base):
         logger.debug(
             "Удаление лайка: user_id = {}, tweet_id = {}".format(user_id, tweet_id)
         )
+        summary = {}
+
         async with db_async_session.begin():
             result = await db_async_session.execute(
                 delete(Like)
-                .where(Like.user_id == user_id)
+                .where(Like.user_pk == User.pk_of(user_id))
                 .where(Like.tweet_id == tweet_id)
             )
 
-            if result.rowcount != 0:
-                return True
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Запись лайка твита с id {tweet_id} от пользователя с id {user_id} не существует",
+            if result.rowcount == 0:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"Запись лайка твита с id {tweet_id} от пользователя с id {user_id} не существует",
+                )
+
+            if broker.has_subscribers:
+                summary = await cls.get_likes_summary(db_async_session, [tweet_id])
+
+        await cls.publish_likes_event("like_deleted", user_id, summary)
+        return True
+
+    @classmethod
+    async def add_likes(
+        cls, db_async_session: AsyncSession, user_id: str, tweet_ids: List[int]
+    ) -> Tuple[Set[int], Set[int]]:
+        """
+        Добавляет лайки нескольким твитам одним запросом.
+        Выполняется в рамках уже открытой транзакции сессии
+
+        :param db_async_session: асинхронная сессия подключения к БД с открытой транзакцией
+        :param user_id: id пользователя, который лайкнул
+        :param tweet_ids: список id твитов, которые лайкнул пользователь
+        :return: множество id существующих твитов и множество id твитов, которым добавлен лайк
+        """
+        from models.tweet import Tweet
+
+        logger.debug(
+            "Пакетное добавление лайков: user_id = {}, количество = {}".format(
+                user_id, len(tweet_ids)
+            )
+        )
+        result = await db_async_session.execute(
+            select(Tweet.id).where(Tweet.id.in_(tweet_ids))
+        )
+        exist_ids = set(result.scalars().all())
+
+        result = await db_async_session.execute(
+            pg_insert(Like)
+            .from_select(
+                ["user_pk", "tweet_id"],
+                select(User.pk_of(user_id), Tweet.id).where(Tweet.id.in_(tweet_ids)),
+            )
+            .on_conflict_do_nothing()
+            .returning(Like.tweet_id)
+        )
+        return exist_ids, set(result.scalars().all())
+
+    @classmethod
+    async def delete_likes(
+        cls, db_async_session: AsyncSession, user_id: str, tweet_ids: List[int]
+    ) -> Set[int]:
+        """
+        Удаляет лайки нескольких твитов одним запросом.
+        Выполняется в рамках уже открытой транзакции сессии
+
+        :param db_async_session: асинхронная сессия подключения к БД с открытой транзакцией
+        :param user_id: id пользователя, который дизлайкнул
+        :param tweet_ids: список id твитов, которые дизлайкнул пользователь
+        :return: множество id твитов, лайк которых удалён
+        """
+        logger.debug(
+            "Пакетное удаление лайков: user_id = {}, количество = {}".format(
+                user_id, len(tweet_ids)
+            )
+        )
+        result = await db_async_session.execute(
+            delete(Like)
+            .where(Like.user_pk == User.pk_of(user_id))
+            .where(Like.tweet_id.in_(tweet_ids))
+            .returning(Like.tweet_id)
+        )
+        return set(result.scalars().all())
+
+    @classmethod
+    async def delete_user_likes_batch(
+        cls, db_async_session: AsyncSession, user_id: str, limit: int
+    ) -> List[int]:
+        """
+        Удаляет не более limit лайков пользователя.
+        Выполняется в рамках уже открытой транзакции сессии
+
+        :param db_async_session: асинхронная сессия подключения к БД с открытой транзакцией
+        :param user_id: id пользователя
+        :param limit: максимальное количество удаляемых лайков
+        :return: список id твитов, лайк которых удалён
+        """
+        batch = aliased(Like)
+        result = await db_async_session.execute(
+            delete(Like)
+            .where(Like.user_pk == User.pk_of(user_id))
+            .where(
+                Like.tweet_id.in_(
+                    select(batch.tweet_id)
+                    .where(batch.user_pk == User.pk_of(user_id))
+                    .limit(limit)
+                )
+            )
+            .returning(Like.tweet_id)
+        )
+        return result.scalars().all()
+
+    @classmethod
+    async def delete_tweets_likes_batch(
+        cls, db_async_session: AsyncSession, tweet_ids: List[int], limit: int
+    ) -> int:
+        """
+        Удаляет не более limit лайков указанных твитов.
+        Выполняется в рамках уже открытой транзакции сессии
+
+        :param db_async_session: асинхронная сессия подключения к БД с открытой транзакцией
+        :param tweet_ids: список id твитов
+        :param limit: максимальное количество удаляемых лайков
+        :return: количество удалённых лайков
+        """
+        batch = aliased(Like)
+        result = await db_async_session.execute(
+            delete(Like).where(
+                tuple_(Like.user_pk, Like.tweet_id).in_(
+                    select(batch.user_pk, batch.tweet_id)
+                    .where(batch.tweet_id.in_(tweet_ids))
+                    .limit(limit)
+                )
+            )
+        )
+        return result.rowcount
+
+    @classmethod
+    async def get_likes_summary(
+        cls,
+        db_async_session: AsyncSession,
+        tweet_ids: List[int],
+        archived: bool = False,
+    ) -> Dict[int, Tuple[str, int]]:
+        """
+        Функция, возвращающая автора и текущее количество лайков для каждого из указанных твитов.
+        Выполняется в рамках уже открытой транзакции сессии
+
+        :param db_async_session: асинхронная сессия подключения к БД с открытой транзакцией
+        :param tweet_ids: список id твитов
+        :param archived: если True, сводка строится по архивным твитам
+        :return: словарь {id твита: (id автора, количество лайков)}
+        """
+        from models.archive import ArchivedLike, ArchivedTweet
+        from models.tweet import Tweet
+
+        tweet_model, like_model = (
+            (ArchivedTweet, ArchivedLike) if archived else (Tweet, Like)
+        )
+        likes_count = (
+            select(func.count(like_model.user_pk))
+            .where(like_model.tweet_id == tweet_model.id)
+            .scalar_subquery()
+        )
+        result = await db_async_session.execute(
+            select(tweet_model.id, User.id, likes_count)
+            .join(User, User.pk == tweet_model.author_pk)
+            .where(tweet_model.id.in_(tweet_ids))
+        )
+        return {
+            tweet_id: (author_id.rstrip(), count)
+            for tweet_id, author_id, count in result.all()
+        }
+
+    @classmethod
+    async def publish_likes_event(
+        cls, event_type: str, user_id: str, summary: Dict[int, Tuple[str, int]]
+    ) -> None:
+        """
+        Функция, публикующая события изменения количества лайков твитов
+
+        :param event_type: тип события (like_added или like_deleted)
+        :param user_id: id пользователя, который изменил лайк
+        :param summary: словарь {id твита: (id автора, количество лайков)}
+        """
+        for tweet_id, (author_id, likes_count) in summary.items():
+            await broker.publish(
+                event_type,
+                tweet_id=tweet_id,
+                author_id=author_id,
+                user_id=user_id,
+                likes_count=likes_count,
+            )
+
+    @classmethod
+    async def get_likes_preview(
+        cls,
+        db_async_session: AsyncSession,
+        tweet_ids: List[int],
+        user_id: str,
+        sample_size: int,
+        like_model: Any = None,
+    ) -> Dict[int, Dict[str, Any]]:
+        """
+        Функция, возвращающая одним запросом краткую сводку лайков твитов страницы: количество лайков,
+        признак лайка текущего пользователя и не более sample_size лайкнувших пользователей.
+        Полные списки лайкнувших не загружаются
+
+        :param db_async_session: асинхронная сессия подключения к БД
+        :param tweet_ids: список id твитов
+        :param user_id: id текущего пользователя
+        :param sample_size: максимальное количество лайкнувших пользователей в сводке
+        :param like_model: модель лайков (по умолчанию Like, для архивных твитов ArchivedLike)
+        :return: словарь {id твита: {likes_count, liked_by_me, sample_likers}} для твитов с лайками
+        """
+        like = like_model or Like
+        by_tweet = {"partition_by": like.tweet_id}
+        ranked = (
+            select(
+                like.tweet_id,
+                User.id.label("user_id"),
+                User.name,
+                func.row_number()
+                .over(order_by=like.user_pk, **by_tweet)
+                .label("position"),
+                func.count().over(**by_tweet).label("likes_count"),
+                func.bool_or(like.user_pk == User.pk_of(user_id))
+                .over(**by_tweet)
+                .label("liked_by_me"),
+            )
+            .join(User, User.pk == like.user_pk)
+            .where(like.tweet_id.in_(tweet_ids))
+            .subquery()
+        )
+
+        async with db_async_session.begin():
+            # Первая строка твита выбирается всегда, чтобы количество лайков было известно и при sample_size = 0
+            result = await db_async_session.execute(
+                select(ranked).where(ranked.c.position <= max(sample_size, 1))
+            )
+
+        preview = {}
+        for row in result.all():
+            tweet = preview.setdefault(
+                row.tweet_id,
+                {
+                    "likes_count": row.likes_count,
+                    "liked_by_me": row.liked_by_me,
+                    "sample_likers": [],
+                },
+            )
+            if row.position <= sample_size:
+                tweet["sample_likers"].append(
+                    {"user_id": row.user_id.rstrip(), "name": row.name}
+                )
+        return preview
+
+    @classmethod
+    async def get_likers(
+        cls,
+        db_async_session: AsyncSession,
+        tweet_id: int,
+        limit: int,
+        cursor: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Функция, возвращающая страницу пользователей, лайкнувших твит (свежий или архивный).
+        Постраничная навигация выполняется по внутреннему ключу пользователя
+
+        :param db_async_session: асинхронная сессия подключения к БД
+        :param tweet_id: id твита
+        :param limit: количество пользователей на странице
+        :param cursor: ключ последнего пользователя предыдущей страницы
+        :return: список словарей {pk, user_id, name}
+        """
+        from models.archive import ArchivedLike, ArchivedTweet
+        from models.tweet import Tweet
+
+        logger.debug("Получение списка лайкнувших твит: id твита = {}".format(tweet_id))
+
+        async with db_async_session.begin():
+            for tweet_model, like_model in (
+                (Tweet, Like),
+                (ArchivedTweet, ArchivedLike),
+            ):
+                tweet_exists = await db_async_session.scalar(
+                    select(tweet_model.id).where(tweet_model.id == tweet_id)
+                )
+                if tweet_exists is None:
+                    continue
+
+                query = (
+                    select(User.pk, User.id, User.name)
+                    .join(like_model, like_model.user_pk == User.pk)
+                    .where(like_model.tweet_id == tweet_id)
+                )
+                if cursor is not None:
+                    query = query.where(User.pk > cursor)
+
+                result = await db_async_session.execute(
+                    query.order_by(User.pk).limit(limit)
+                )
+                return [
+                    {"pk": pk, "user_id": user_id.rstrip(), "name": name}
+                    for pk, user_id, name in result.all()
+                ]
+
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Твит с id {} не существует".format(tweet_id),
+        )
+
+    @classmethod
+    async def get_recent_likes_counts(
+        cls, db_async_session: AsyncSession, tweets_limit: int
+    ) -> Dict[int, int]:
+        """
+        Функция, возвращающая количество лайков последних добавленных твитов
+
+        :param db_async_session: асинхронная сессия подключения к БД
+        :param tweets_limit: количество последних твитов
+        :return: словарь {id твита: количество лайков}
+        """
+        from models.tweet import Tweet
+
+        logger.debug(
+            "Получение количества лайков последних твитов: количество = {}".format(
+                tweets_limit
+            )
+        )
+        recent_tweets = (
+            select(Tweet.id).order_by(Tweet.id.desc()).limit(tweets_limit).subquery()
+        )
+        async with db_async_session.begin():
+            result = await db_async_session.execute(
+                select(Like.tweet_id, func.count(Like.user_pk))
+                .where(Like.tweet_id.in_(select(recent_tweets.c.id)))
+                .group_by(Like.tweet_id)
             )
+            return dict(result.all())
 
     @classmethod
     async def get_likes_count(cls, db_async_session: AsyncSession) -> int:
@@ -126,5 +470,5 @@ class Like(Base):
         logger.debug("Получение количества записей лайков в БД")
 
         async with db_async_session.begin():
-            result = await db_async_session.execute(select(func.count(Like.user_id)))
+            result = await db_async_session.execute(select(func.count(Like.user_pk)))
             return result.scalars().one()
@@ -0,0 +1,33 @@
+"""
+Лёгкие представления строк для эндпоинтов чтения. Вместо ORM-объектов (карта идентичности,
+коллекции связей, отслеживание изменений) запросы выбирают только нужные столбцы в кортежи,
+которые схемы Pydantic читают так же, как ORM-объекты (from_attributes)
+"""
+
+from typing import Any, Dict, List, NamedTuple
+
+
+class UserRow(NamedTuple):
+    id: str
+    name: str
+
+
+class LikeRow(NamedTuple):
+    user_id: str
+    name: str
+
+
+class TweetRow(NamedTuple):
+    id: int
+    content: str
+    attachments: List[str]
+    author: UserRow
+    likes: List[LikeRow]
+    media: List[Dict[str, Any]]
+
+
+class UserInfoRow(NamedTuple):
+    id: str
+    name: str
+    followers: List[UserRow]
+    following: List[UserRow]
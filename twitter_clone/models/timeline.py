@@ -0,0 +1,233 @@
+from datetime import datetime
+from typing import List
+
+from sqlalchemy import (
+    BigInteger,
+    DateTime,
+    ForeignKey,
+    Index,
+    delete,
+    func,
+    literal,
+    select,
+    true,
+    tuple_,
+    union_all,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Mapped, aliased, mapped_column
+
+from config import FEED_FANOUT_THRESHOLD, FEED_FOLLOW_BACKFILL
+from database import Base
+from logger import logger
+from models.follower import follower
+from models.user import User
+
+
+class Timeline(Base):
+    """
+    Материализованная лента пользователя. При добавлении твита автора, у которого меньше
+    FEED_FANOUT_THRESHOLD подписчиков, твит записывается в ленты подписчиков и самого автора.
+    Твиты авторов с большим количеством подписчиков сюда не записываются и читаются из таблицы твитов
+    при чтении ленты, поэтому одна публикация не превращается в запись тысяч строк
+    """
+
+    __tablename__ = "timelines"
+
+    user_pk: Mapped[int] = mapped_column(
+        ForeignKey("users.pk", onupdate="CASCADE", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    # created_at: время создания твита, первичный ключ упорядочивает ленту пользователя по нему
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), primary_key=True
+    )
+    tweet_id: Mapped[int] = mapped_column(
+        ForeignKey("tweets.id", onupdate="CASCADE", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    # author_pk: внутренний ключ автора, по нему твиты удаляются из ленты при отписке
+    author_pk: Mapped[int] = mapped_column(BigInteger)
+
+    __table_args__ = (Index("ix_timelines_tweet_id", "tweet_id"),)
+
+    @classmethod
+    async def is_fan_out_author(
+        cls, db_async_session: AsyncSession, author_id: str
+    ) -> bool:
+        """
+        Функция, проверяющая, записываются ли твиты автора в ленты подписчиков. Подписчики считаются
+        не дальше порога FEED_FANOUT_THRESHOLD, поэтому проверка не зависит от их общего количества.
+        Выполняется в рамках уже открытой транзакции сессии
+
+        :param db_async_session: асинхронная сессия подключения к БД с открытой транзакцией
+        :param author_id: id автора
+        :return: True, если у автора меньше FEED_FANOUT_THRESHOLD подписчиков
+        """
+        followers = (
+            select(follower.c.follower_user_pk)
+            .where(follower.c.following_user_pk == User.pk_of(author_id))
+            .limit(FEED_FANOUT_THRESHOLD)
+            .subquery()
+        )
+        followers_count = await db_async_session.scalar(
+            select(func.count()).select_from(followers)
+        )
+        return followers_count < FEED_FANOUT_THRESHOLD
+
+    @classmethod
+    async def fan_out(
+        cls,
+        db_async_session: AsyncSession,
+        tweet_id: int,
+        author_pk: int,
+        created_at: datetime,
+    ) -> int:
+        """
+        Функция, записывающая новый твит в ленты подписчиков автора и самого автора одним запросом.
+        Выполняется в рамках уже открытой транзакции сессии
+
+        :param db_async_session: асинхронная сессия подключения к БД с открытой транзакцией
+        :param tweet_id: id твита
+        :param author_pk: внутренний ключ автора
+        :param created_at: время создания твита
+        :return: количество лент, в которые записан твит
+        """
+        tweet_columns = (
+            literal(tweet_id),
+            literal(author_pk, BigInteger),
+            literal(created_at, DateTime(timezone=True)),
+        )
+        result = await db_async_session.execute(
+            pg_insert(Timeline).from_select(
+                ["user_pk", "tweet_id", "author_pk", "created_at"],
+                union_all(
+                    select(follower.c.follower_user_pk, *tweet_columns).where(
+                        follower.c.following_user_pk == author_pk
+                    ),
+                    select(literal(author_pk, BigInteger), *tweet_columns),
+                ),
+            )
+        )
+        logger.debug(
+            "Твит записан в ленты: id твита = {}, количество лент = {}".format(
+                tweet_id, result.rowcount
+            )
+        )
+        return result.rowcount
+
+    @classmethod
+    async def add_authors(
+        cls,
+        db_async_session: AsyncSession,
+        user_id: str,
+        author_ids: List[str],
+    ) -> None:
+        """
+        Функция, записывающая в ленту пользователя ранее опубликованные твиты новых подписок.
+        Записываются только твиты, которые при публикации были записаны в ленты подписчиков,
+        и не более FEED_FOLLOW_BACKFILL последних твитов каждого автора, поэтому подписка на автора
+        с длинной историей не копирует её целиком. Выполняется в рамках уже открытой транзакции сессии
+
+        :param db_async_session: асинхронная сессия подключения к БД с открытой транзакцией
+        :param user_id: id подписавшегося пользователя
+        :param author_ids: id пользователей, на которых он подписался
+        """
+        from models.tweet import Tweet
+
+        authors = select(User.pk).where(User.id.in_(author_ids)).subquery()
+        # id твитов растут вместе со временем создания, поэтому последние твиты автора
+        # читаются по индексу ix_tweets_author_pk_id без сортировки всей истории
+        recent_tweets = (
+            select(Tweet.id, Tweet.author_pk, Tweet.created_at)
+            .where(Tweet.author_pk == authors.c.pk, Tweet.fanned_out)
+            .order_by(Tweet.id.desc())
+            .limit(FEED_FOLLOW_BACKFILL)
+            .lateral()
+        )
+        await db_async_session.execute(
+            pg_insert(Timeline)
+            .from_select(
+                ["user_pk", "tweet_id", "author_pk", "created_at"],
+                select(
+                    User.pk_of(user_id),
+                    recent_tweets.c.id,
+                    recent_tweets.c.author_pk,
+                    recent_tweets.c.created_at,
+                ).select_from(authors.join(recent_tweets, true())),
+            )
+            .on_conflict_do_nothing()
+        )
+
+    @classmethod
+    async def remove_authors(
+        cls,
+        db_async_session: AsyncSession,
+        user_id: str,
+        author_ids: List[str],
+    ) -> None:
+        """
+        Функция, удаляющая из ленты пользователя твиты отменённых подписок.
+        Выполняется в рамках уже открытой транзакции сессии
+
+        :param db_async_session: асинхронная сессия подключения к БД с открытой транзакцией
+        :param user_id: id отписавшегося пользователя
+        :param author_ids: id пользователей, от которых он отписался
+        """
+        await db_async_session.execute(
+            delete(Timeline).where(
+                Timeline.user_pk == User.pk_of(user_id),
+                Timeline.author_pk.in_(select(User.pk).where(User.id.in_(author_ids))),
+            )
+        )
+
+    @classmethod
+    async def delete_user_timeline_batch(
+        cls, db_async_session: AsyncSession, user_id: str, limit: int
+    ) -> int:
+        """
+        Удаляет не более limit записей ленты пользователя.
+        Выполняется в рамках уже открытой транзакции сессии
+
+        :param db_async_session: асинхронная сессия подключения к БД с открытой транзакцией
+        :param user_id: id пользователя
+        :param limit: максимальное количество удаляемых записей
+        :return: количество удалённых записей
+        """
+        batch = aliased(Timeline)
+        result = await db_async_session.execute(
+            delete(Timeline).where(
+                tuple_(Timeline.user_pk, Timeline.created_at, Timeline.tweet_id).in_(
+                    select(batch.user_pk, batch.created_at, batch.tweet_id)
+                    .where(batch.user_pk == User.pk_of(user_id))
+                    .limit(limit)
+                )
+            )
+        )
+        return result.rowcount
+
+    @classmethod
+    async def delete_tweets_batch(
+        cls, db_async_session: AsyncSession, tweet_ids: List[int], limit: int
+    ) -> int:
+        """
+        Удаляет не более limit записей указанных твитов из лент подписчиков.
+        Выполняется в рамках уже открытой транзакции сессии
+
+        :param db_async_session: асинхронная сессия подключения к БД с открытой транзакцией
+        :param tweet_ids: список id твитов
+        :param limit: максимальное количество удаляемых записей
+        :return: количество удалённых записей
+        """
+        batch = aliased(Timeline)
+        result = await db_async_session.execute(
+            delete(Timeline).where(
+                tuple_(Timeline.user_pk, Timeline.created_at, Timeline.tweet_id).in_(
+                    select(batch.user_pk, batch.created_at, batch.tweet_id)
+                    .where(batch.tweet_id.in_(tweet_ids))
+                    .limit(limit)
+                )
+            )
+        )
+        return result.rowcount
@@ -1,18 +1,42 @@
-from pathlib import Path
-from typing import List, Optional
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 from fastapi import HTTPException, status
-from sqlalchemy import ForeignKey, String, delete, select
+from sqlalchemy import (
+    CHAR,
+    Boolean,
+    DateTime,
+    ForeignKey,
+    Index,
+    String,
+    any_,
+    bindparam,
+    delete,
+    false,
+    func,
+    insert,
+    select,
+    text,
+    true,
+    tuple_,
+    union_all,
+    update,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import Mapped, mapped_column, relationship, selectinload
 
+from config import SEARCH_HEADLINE_OPTIONS, SEARCH_TS_CONFIG
 from database import Base
+from events import broker
 from logger import logger
 from models.follower import follower
 from models.image import Image
 from models.like import Like
+from models.projections import LikeRow, TweetRow, UserRow
+from models.timeline import Timeline
 from models.user import User
 
 
@@ -21,8 +45,29 @@ class Tweet(Base):
 
     id: Mapped[int] = mapped_column(primary_key=True)
     content: Mapped[str] = mapped_column(String(6553))
-    author_id: Mapped[str] = mapped_column(
-        ForeignKey("users.id", onupdate="CASCADE", ondelete="CASCADE")
+    author_pk: Mapped[int] = mapped_column(
+        ForeignKey("users.pk", onupdate="CASCADE", ondelete="CASCADE")
+    )
+    # content_tsv: поисковый вектор текста твита, заполняется при добавлении твита
+    content_tsv: Mapped[Optional[str]] = mapped_column(TSVECTOR, deferred=True)
+    # created_at: время создания, по которому старые твиты переносятся в архив
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+    # fanned_out: твит записан в ленты подписчиков (timelines), иначе он читается из таблицы твитов
+    fanned_out: Mapped[bool] = mapped_column(Boolean, server_default=false())
+
+    __table_args__ = (
+        Index("ix_tweets_content_tsv", "content_tsv", postgresql_using="gin"),
+        Index("ix_tweets_created_at", "created_at"),
+        Index("ix_tweets_author_pk_id", "author_pk", "id"),
+        Index(
+            "ix_tweets_author_pk_created_at_pulled",
+            "author_pk",
+            text("created_at DESC"),
+            text("id DESC"),
+            postgresql_where=text("NOT fanned_out"),
+        ),
     )
 
     tweet_media_ids: Mapped[Optional[List[Image]]] = relationship(Image)
@@ -32,10 +77,75 @@ class Tweet(Base):
     @hybrid_property
     def attachments(self) -> List[str]:
         return [
-            Path("images", media.folder, f"{media.id}.{media.extension}").__str__()
+            Image.attachment_path(media.id, media.folder, media.extension)
             for media in self.tweet_media_ids
         ]
 
+    @property
+    def media(self) -> List[Dict[str, Any]]:
+        return [image.media for image in self.tweet_media_ids]
+
+    @classmethod
+    async def __attach_images(
+        cls, db_async_session: AsyncSession, tweet_id: int, image_ids: List[str]
+    ) -> List[str]:
+        """
+        Функция, привязывающая изображения к новому твиту одним запросом. Привязываются только
+        свободные изображения, поэтому изображение другого твита не может быть перепривязано
+
+        :param db_async_session: асинхронная сессия подключения к БД (внутри транзакции)
+        :param tweet_id: id нового твита
+        :param image_ids: id изображений без повторов
+        :return: относительные пути привязанных изображений в порядке image_ids
+        """
+        if not image_ids:
+            return []
+
+        result = await db_async_session.execute(
+            update(Image)
+            .where(
+                Image.id == any_(bindparam("image_ids", image_ids, ARRAY(CHAR(32)))),
+                Image.tweet_id.is_(None),
+            )
+            .values(tweet_id=tweet_id)
+            .returning(Image.id, Image.folder, Image.extension)
+        )
+        attached = {row.id: row for row in result}
+
+        if len(attached) != len(image_ids):
+            not_attached_ids = [
+                image_id for image_id in image_ids if image_id not in attached
+            ]
+            # Лишний запрос выполняется только при ошибке, чтобы отличить занятые изображения от несуществующих
+            busy_ids = set(
+                await db_async_session.scalars(
+                    select(Image.id).where(Image.id.in_(not_attached_ids))
+                )
+            )
+
+            if busy_ids:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Изображения уже привязаны к другому твиту: {}".format(
+                        [
+                            image_id
+                            for image_id in not_attached_ids
+                            if image_id in busy_ids
+                        ]
+                    ),
+                )
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Получен список id изображений, которых не существуeт в БД: {str(not_attached_ids)}",
+            )
+
+        return [
+            Image.attachment_path(
+                image_id, attached[image_id].folder, attached[image_id].extension
+            )
+            for image_id in image_ids
+        ]
+
     @classmethod
     async def add_tweet(
         cls,
@@ -45,7 +155,10 @@ class Tweet(Base):
         tweet_media_ids: List[str] = None,
     ) -> int:
         """
-        Функия, добавляющая новый твит в БД
+        Функия, добавляющая новый твит в БД. Твит добавляется и изображения привязываются
+        фиксированным числом запросов независимо от количества изображений.
+        Твит автора, у которого меньше FEED_FANOUT_THRESHOLD подписчиков, в той же транзакции
+        записывается в ленты подписчиков
 
         :param db_async_session: асинхронная сессия подключения к БД
         :param author_id: id пользователя, который создаёт твит
@@ -55,67 +168,71 @@ class Tweet(Base):
         """
         logger.debug("Добавление нового твита в БД: id автора = {}".format(author_id))
 
+        # Повторяющиеся id изображений отбрасываются с сохранением порядка
+        image_ids = list(dict.fromkeys(tweet_media_ids or []))
+
         try:
             async with db_async_session.begin():
-
-                if tweet_media_ids:
-                    result = await db_async_session.execute(
-                        select(Image).where(Image.id.in_(tweet_media_ids))
+                fanned_out = await Timeline.is_fan_out_author(
+                    db_async_session, author_id
+                )
+                result = await db_async_session.execute(
+                    insert(Tweet)
+                    .values(
+                        content=content,
+                        content_tsv=func.to_tsvector(SEARCH_TS_CONFIG, content),
+                        author_pk=User.pk_of(author_id),
+                        fanned_out=fanned_out,
                     )
-                    images = result.scalars().all()
-
-                    if len(images) != len(set(tweet_media_ids)):
-                        images_str = [image.id for image in images]
-                        not_exist_ids = [
-                            image_id
-                            for image_id in tweet_media_ids
-                            if image_id not in images_str
-                        ]
-
-                        raise HTTPException(
-                            status_code=status.HTTP_404_NOT_FOUND,
-                            detail=f"Получен список id изображений, которых не существуeт в БД: {str(not_exist_ids)}",
-                        )
-                else:
-                    images = []
+                    .returning(Tweet.id, Tweet.author_pk, Tweet.created_at)
+                )
+                tweet_id, author_pk, created_at = result.one()
 
-                new_tweet = Tweet(
-                    content=content, author_id=author_id, tweet_media_ids=images
+                if fanned_out:
+                    await Timeline.fan_out(
+                        db_async_session, tweet_id, author_pk, created_at
+                    )
+                attachments = await cls.__attach_images(
+                    db_async_session, tweet_id, image_ids
                 )
-                db_async_session.add(new_tweet)
+
+            await broker.publish(
+                "tweet_added",
+                tweet_id=tweet_id,
+                author_id=author_id,
+                content=content,
+                attachments=attachments,
+            )
         except IntegrityError as exc:
-            exc_detail = str(exc.orig).split("\n")[1]
+            exc_detail = str(exc.orig)
 
+            # Ключ несуществующего автора равен NULL и нарушает ограничение NOT NULL
             if all(
                 [
                     value in exc_detail
-                    for value in (author_id, "author_id", "is not present in table")
+                    for value in ('"author_pk"', "null value in column")
                 ]
             ):
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail=f"Пользователя с id {author_id} не существует",
                 )
+            raise
 
-        return new_tweet.id
+        return tweet_id
 
     @classmethod
     async def delete_tweet(
         cls, db_async_session: AsyncSession, author_id: str, tweet_id: int
     ) -> None:
         """
-        Удаление твита из БД
+        Удаление твита из БД. Если твит уже перенесён в архив, удаляется архивный твит.
+        Существование автора проверяется зависимостью авторизации
 
         :param db_async_session: асинхронная сессия подключения к БД
         :param author_id: id пользователя, к которому принадлежит твит
         :param tweet_id: id удаляемого твита
         """
-        if await User.is_user_exist(db_async_session, author_id) is False:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Пользователя с id {} не существует".format(author_id),
-            )
-
         logger.debug(
             "Удаление твита из БД: id автора = {}, id твита = {}".format(
                 author_id, tweet_id
@@ -125,66 +242,382 @@ class Tweet(Base):
         async with db_async_session.begin():
             result = await db_async_session.execute(
                 delete(Tweet)
-                .where(Tweet.author_id == author_id)
+                .where(Tweet.author_pk == User.pk_of(author_id))
                 .where(Tweet.id == tweet_id)
             )
             if result.rowcount == 0:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="Твит с id {} не существует".format(tweet_id),
+                from models.archive import ArchivedTweet
+
+                deleted_ids, image_paths = await ArchivedTweet.delete_many(
+                    db_async_session, author_id, [tweet_id]
                 )
+                if not deleted_ids:
+                    raise HTTPException(
+                        status_code=status.HTTP_404_NOT_FOUND,
+                        detail="Твит с id {} не существует".format(tweet_id),
+                    )
             for image_path in image_paths:
-                await Image.delete_image_from_disk(image_path)
+                await Image.delete_image_files(image_path)
+
+        await broker.publish("tweet_deleted", tweet_id=tweet_id, author_id=author_id)
+
+    @classmethod
+    async def get_author_tweet_ids(
+        cls, db_async_session: AsyncSession, author_id: str, limit: int
+    ) -> List[int]:
+        """
+        Функция, возвращающая id не более limit твитов автора.
+        Выполняется в рамках уже открытой транзакции сессии
+
+        :param db_async_session: асинхронная сессия подключения к БД с открытой транзакцией
+        :param author_id: id автора
+        :param limit: максимальное количество твитов
+        :return: список id твитов
+        """
+        result = await db_async_session.execute(
+            select(Tweet.id)
+            .where(Tweet.author_pk == User.pk_of(author_id))
+            .order_by(Tweet.id)
+            .limit(limit)
+        )
+        return result.scalars().all()
+
+    @classmethod
+    async def delete_many(
+        cls, db_async_session: AsyncSession, author_id: str, tweet_ids: List[int]
+    ) -> Tuple[Set[int], List[str]]:
+        """
+        Удаление нескольких твитов автора одним запросом. Твиты, уже перенесённые в архив,
+        удаляются из архива вторым запросом.
+        Выполняется в рамках уже открытой транзакции сессии, файлы изображений удалённых твитов
+        необходимо удалить с диска после фиксации транзакции
+
+        :param db_async_session: асинхронная сессия подключения к БД с открытой транзакцией
+        :param author_id: id пользователя, к которому принадлежат твиты
+        :param tweet_ids: список id удаляемых твитов
+        :return: множество id удалённых твитов и список относительных путей их изображений на диске
+        """
+        logger.debug(
+            "Пакетное удаление твитов из БД: id автора = {}, количество = {}".format(
+                author_id, len(tweet_ids)
+            )
+        )
+        result = await db_async_session.execute(
+            select(Image.id, Image.folder, Image.extension)
+            .join(Tweet, Image.tweet_id == Tweet.id)
+            .where(Tweet.author_pk == User.pk_of(author_id))
+            .where(Tweet.id.in_(tweet_ids))
+        )
+        image_paths = [Image.storage_key(*image) for image in result.all()]
+
+        result = await db_async_session.execute(
+            delete(Tweet)
+            .where(Tweet.author_pk == User.pk_of(author_id))
+            .where(Tweet.id.in_(tweet_ids))
+            .returning(Tweet.id)
+        )
+        deleted_ids = set(result.scalars().all())
+        missing_ids = [
+            tweet_id for tweet_id in tweet_ids if tweet_id not in deleted_ids
+        ]
+
+        if missing_ids:
+            from models.archive import ArchivedTweet
+
+            archived_ids, archived_image_keys = await ArchivedTweet.delete_many(
+                db_async_session, author_id, missing_ids
+            )
+            deleted_ids |= archived_ids
+            image_paths.extend(archived_image_keys)
+        return deleted_ids, image_paths
 
     @classmethod
     async def get_tweet_from_followers(
-        cls, db_async_session: AsyncSession, user_id: str
-    ) -> List["Tweet"]:
+        cls, db_async_session: AsyncSession, user_id: str, with_likes: bool = True
+    ) -> List[TweetRow]:
         """
         Функция, которая возвращает списко твитов пользователей, на которых подписан текущий пользователь,
-        а также твиты, созданные текущим пользователем
+        а также твиты, созданные текущим пользователем. Существование пользователя проверяется
+        зависимостью авторизации. Твиты, изображения и лайки читаются тремя запросами столбцов
+        в кортежи без создания ORM-объектов
 
         :param db_async_session: асинхронная сессия подключения к БД
         :param user_id: id текущего пользователя
+        :param with_likes: если False, лайки не загружаются и твиты не сортируются
         :return: список твитов, отсортированных по убыванию количества лайков
         """
-        if not await User.is_user_exist(db_async_session, user_id):
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Пользоватлея с id {user_id} не существует в БД",
-            )
-
         logger.debug(
             "Получение списка твитов пользователя: id пользователя = {}".format(user_id)
         )
+        user_pk = User.pk_of(user_id)
+        followings = select(follower.c.following_user_pk).where(
+            follower.c.follower_user_pk == user_pk
+        )
+        feed_condition = Tweet.author_pk.in_(followings) | (Tweet.author_pk == user_pk)
+        feed_ids = select(Tweet.id).where(feed_condition)
+
         async with db_async_session.begin():
-            followings = select(follower.c.following_user_id).where(
-                follower.c.follower_user_id == user_id
+            tweet_rows = await db_async_session.execute(
+                select(Tweet.id, Tweet.content, User.id, User.name)
+                .join(User, User.pk == Tweet.author_pk)
+                .where(feed_condition)
             )
-            result = await db_async_session.execute(
-                select(Tweet)
-                .options(
-                    selectinload(Tweet.author),
-                    selectinload(Tweet.tweet_media_ids),
-                    selectinload(Tweet.likes).selectinload(Like.user),
+            image_rows = await db_async_session.execute(
+                select(
+                    Image.tweet_id,
+                    Image.id,
+                    Image.folder,
+                    Image.extension,
+                    Image.format,
+                    Image.width,
+                    Image.height,
+                    Image.size_bytes,
+                ).where(Image.tweet_id.in_(feed_ids))
+            )
+            media: Dict[int, List[Dict[str, Any]]] = {}
+            for tweet_id, *image in image_rows:
+                media.setdefault(tweet_id, []).append(Image.media_view(*image))
+
+            likes: Dict[int, List[LikeRow]] = {}
+            if with_likes:
+                like_rows = await db_async_session.execute(
+                    select(Like.tweet_id, User.id, User.name)
+                    .join(User, User.pk == Like.user_pk)
+                    .where(Like.tweet_id.in_(feed_ids))
                 )
-                .where(Tweet.author_id.in_(followings))
+                for tweet_id, liker_id, liker_name in like_rows:
+                    likes.setdefault(tweet_id, []).append(
+                        LikeRow(liker_id.rstrip(), liker_name)
+                    )
+
+            all_tweets = [
+                TweetRow(
+                    tweet_id,
+                    content,
+                    [image["url"] for image in media.get(tweet_id, [])],
+                    UserRow(author_id.rstrip(), author_name),
+                    likes.get(tweet_id, []),
+                    media.get(tweet_id, []),
+                )
+                for tweet_id, content, author_id, author_name in tweet_rows
+            ]
+
+        if not with_likes:
+            return all_tweets
+        return sorted(all_tweets, key=lambda x: len(x.likes), reverse=True)
+
+    @classmethod
+    async def get_recent_feed(
+        cls,
+        db_async_session: AsyncSession,
+        user_id: str,
+        limit: int,
+        before: Optional[Tuple[datetime, int]] = None,
+        archive: bool = False,
+        with_likes: bool = True,
+    ) -> List[Any]:
+        """
+        Функция, возвращающая страницу ленты пользователя по убыванию времени создания твитов.
+        Твиты, записанные в ленту пользователя при публикации, читаются из timelines, твиты остальных
+        авторов ленты - из частичного индекса (author_pk, created_at, id) не записанных в ленты твитов:
+        для каждого автора читается не больше limit твитов (LATERAL ... LIMIT), после чего лучшие
+        limit твитов выбираются слиянием этих списков, поэтому страница не затрагивает твиты
+        за пределами своего окна. Архивные твиты всегда читаются вторым способом
+
+        :param db_async_session: асинхронная сессия подключения к БД
+        :param user_id: id текущего пользователя
+        :param limit: количество твитов на странице
+        :param before: ключ (created_at, id) последнего твита предыдущей страницы
+        :param archive: если True, страница читается из архивных твитов
+        :param with_likes: если False, лайки не загружаются
+        :return: список твитов (или архивных твитов) по убыванию времени создания
+        """
+        from models.archive import ArchivedLike, ArchivedTweet
+
+        logger.debug(
+            "Получение хронологической ленты: id пользователя = {}, before = {}".format(
+                user_id, before
             )
-            all_tweets: List[Optional[Tweet]] = result.scalars().all()
+        )
+        if archive:
+            model, like_model = ArchivedTweet, ArchivedLike
+            options = [selectinload(ArchivedTweet.author)]
+        else:
+            model, like_model = Tweet, Like
+            options = [selectinload(Tweet.author), selectinload(Tweet.tweet_media_ids)]
+        if with_likes:
+            options.append(selectinload(model.likes).selectinload(like_model.user))
 
-            user_tweets_result = await db_async_session.execute(
-                select(Tweet)
-                .options(
-                    selectinload(Tweet.author),
-                    selectinload(Tweet.tweet_media_ids),
-                    selectinload(Tweet.likes).selectinload(Like.user),
+        user_pk = User.pk_of(user_id)
+        authors = union_all(
+            select(follower.c.following_user_pk.label("pk")).where(
+                follower.c.follower_user_pk == user_pk
+            ),
+            select(user_pk.label("pk")),
+        ).subquery("authors")
+
+        per_author = (
+            select(model.id, model.created_at)
+            .where(model.author_pk == authors.c.pk)
+            .order_by(model.created_at.desc(), model.id.desc())
+            .limit(limit)
+        )
+        if not archive:
+            per_author = per_author.where(~Tweet.fanned_out)
+        if before is not None:
+            per_author = per_author.where(
+                tuple_(model.created_at, model.id) < tuple_(*before)
+            )
+        per_author = per_author.lateral("per_author")
+        pulled = (
+            select(per_author.c.id, per_author.c.created_at)
+            .select_from(authors)
+            .join(per_author, true())
+        )
+
+        if archive:
+            page = pulled.subquery("page")
+        else:
+            pushed = (
+                select(Timeline.tweet_id.label("id"), Timeline.created_at)
+                .where(Timeline.user_pk == user_pk)
+                .order_by(Timeline.created_at.desc(), Timeline.tweet_id.desc())
+                .limit(limit)
+            )
+            if before is not None:
+                pushed = pushed.where(
+                    tuple_(Timeline.created_at, Timeline.tweet_id) < tuple_(*before)
                 )
-                .where(Tweet.author_id == user_id)
+            page = union_all(pushed, pulled).subquery("page")
+
+        async with db_async_session.begin():
+            result = await db_async_session.execute(
+                select(page.c.id)
+                .order_by(page.c.created_at.desc(), page.c.id.desc())
+                .limit(limit)
             )
-            user_tweets: List[Optional[Tweet]] = user_tweets_result.scalars().all()
-            all_tweets.extend(user_tweets)
+            tweet_ids = result.scalars().all()
 
-        return sorted(all_tweets, key=lambda x: len(x.likes), reverse=True)
+            if not tweet_ids:
+                return []
+
+            result = await db_async_session.execute(
+                select(model).options(*options).where(model.id.in_(tweet_ids))
+            )
+            tweets = {tweet.id: tweet for tweet in result.scalars().all()}
+
+        return [tweets[tweet_id] for tweet_id in tweet_ids if tweet_id in tweets]
+
+    @classmethod
+    async def get_author_tweets(
+        cls,
+        db_async_session: AsyncSession,
+        author_id: str,
+        limit: int,
+        before_id: Optional[int] = None,
+        archive: bool = False,
+    ) -> List[Any]:
+        """
+        Функция, возвращающая страницу твитов автора по убыванию id. Постраничная навигация выполняется
+        по ключу id, поэтому страница читается одним диапазонным сканированием индекса (author_pk, id)
+
+        :param db_async_session: асинхронная сессия подключения к БД
+        :param author_id: id автора
+        :param limit: количество твитов на странице
+        :param before_id: id последнего твита предыдущей страницы
+        :param archive: если True, страница читается из архивных твитов
+        :return: список твитов (или архивных твитов) без лайков
+        """
+        from models.archive import ArchivedTweet
+
+        logger.debug(
+            "Получение твитов автора: id автора = {}, before_id = {}".format(
+                author_id, before_id
+            )
+        )
+        if archive:
+            model, options = ArchivedTweet, [selectinload(ArchivedTweet.author)]
+        else:
+            model = Tweet
+            options = [selectinload(Tweet.author), selectinload(Tweet.tweet_media_ids)]
+
+        query = (
+            select(model)
+            .options(*options)
+            .where(model.author_pk == User.pk_of(author_id))
+        )
+        if before_id is not None:
+            query = query.where(model.id < before_id)
+
+        async with db_async_session.begin():
+            result = await db_async_session.execute(
+                query.order_by(model.id.desc()).limit(limit)
+            )
+            return result.scalars().all()
+
+    @classmethod
+    async def search(
+        cls,
+        db_async_session: AsyncSession,
+        query: str,
+        limit: int,
+        cursor: Optional[Tuple[float, int]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Функция полнотекстового поиска твитов по GIN-индексу поискового вектора.
+        Результаты отсортированы по убыванию релевантности, постраничная навигация выполняется по ключу (rank, id)
+
+        :param db_async_session: асинхронная сессия подключения к БД
+        :param query: поисковый запрос в формате websearch (слова, "фразы", -исключения, or)
+        :param limit: количество твитов на странице
+        :param cursor: ключ (rank, id) последнего твита предыдущей страницы
+        :return: список найденных твитов с авторами, релевантностью и фрагментами текста с подсветкой
+        """
+        logger.debug(
+            "Поиск твитов: query = {}, limit = {}, cursor = {}".format(
+                query, limit, cursor
+            )
+        )
+        ts_query = func.websearch_to_tsquery(SEARCH_TS_CONFIG, query)
+        rank = func.ts_rank(Tweet.content_tsv, ts_query)
+
+        page_query = select(Tweet.id, rank.label("rank")).where(
+            Tweet.content_tsv.op("@@")(ts_query)
+        )
+        if cursor is not None:
+            page_query = page_query.where(tuple_(rank, Tweet.id) < tuple_(*cursor))
+
+        page = page_query.order_by(rank.desc(), Tweet.id.desc()).limit(limit).subquery()
+
+        async with db_async_session.begin():
+            result = await db_async_session.execute(
+                select(
+                    Tweet.id,
+                    Tweet.content,
+                    page.c.rank,
+                    func.ts_headline(
+                        SEARCH_TS_CONFIG,
+                        Tweet.content,
+                        ts_query,
+                        SEARCH_HEADLINE_OPTIONS,
+                    ).label("snippet"),
+                    User.id.label("author_id"),
+                    User.name.label("author_name"),
+                )
+                .join(page, page.c.id == Tweet.id)
+                .join(User, User.pk == Tweet.author_pk)
+                .order_by(page.c.rank.desc(), Tweet.id.desc())
+            )
+            return [
+                {
+                    "id": row.id,
+                    "content": row.content,
+                    "rank": row.rank,
+                    "snippet": row.snippet,
+                    "author": {"id": row.author_id.rstrip(), "name": row.author_name},
+                }
+                for row in result.all()
+            ]
 
     @classmethod
     async def get_all_tweet_ids(cls, db_async_session: AsyncSession) -> List[int]:
@@ -200,6 +633,34 @@ class Tweet(Base):
             result = await db_async_session.execute(select(Tweet.id))
             return result.scalars().all()
 
+    @classmethod
+    async def get_tweets_by_ids(
+        cls, db_async_session: AsyncSession, tweet_ids: List[int]
+    ) -> List["Tweet"]:
+        """
+        Функция, которая возвращает твиты с авторами и изображениями по списку id
+
+        :param db_async_session: асинхронная сессия подключения к БД
+        :param tweet_ids: список id твитов
+        :return: список объектов твитов
+        """
+        logger.debug(
+            "Получение твитов по списку id: количество = {}".format(len(tweet_ids))
+        )
+
+        if not tweet_ids:
+            return []
+
+        async with db_async_session.begin():
+            result = await db_async_session.execute(
+                select(Tweet)
+                .options(
+                    selectinload(Tweet.author), selectinload(Tweet.tweet_media_ids)
+                )
+                .where(Tweet.id.in_(tweet_ids))
+            )
+            return result.scalars().all()
+
     @classmethod
     async def get_tweet_by_id(
         cls, db_async_session: AsyncSession, tweet_id: int
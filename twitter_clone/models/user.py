@@ -1,36 +1,53 @@
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 from fastapi import HTTPException, status
-from sqlalchemy import CHAR, String, delete, func, select
+from sqlalchemy import (
+    CHAR,
+    BigInteger,
+    Identity,
+    ScalarSelect,
+    String,
+    delete,
+    func,
+    or_,
+    select,
+    tuple_,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import Mapped, mapped_column, relationship, selectinload
+from sqlalchemy.orm import Mapped, aliased, mapped_column, relationship
 
 from database import Base
+from events import broker
 from logger import logger
 from models.follower import follower
+from models.projections import UserInfoRow, UserRow
 
 
 class User(Base):
     __tablename__ = "users"
 
-    id: Mapped[str] = mapped_column(CHAR(32), primary_key=True)
+    # pk: внутренний ключ пользователя для внешних ключей и соединений таблиц
+    # id: внешний id пользователя (значение заголовка api-key)
+    pk: Mapped[int] = mapped_column(BigInteger, Identity(), primary_key=True)
+    id: Mapped[str] = mapped_column(CHAR(32), unique=True)
     name: Mapped[str] = mapped_column(String(20), unique=True)
 
     # followers: список пользователей, которые подписаны на текущего пользователя (подписчики)
     followers: Mapped[List["User"]] = relationship(
         "User",
         secondary=follower,
-        primaryjoin=follower.c.following_user_id == id,
-        secondaryjoin=follower.c.follower_user_id == id,
+        primaryjoin=follower.c.following_user_pk == pk,
+        secondaryjoin=follower.c.follower_user_pk == pk,
         back_populates="following",
     )
     # following: список пользователей, на которыx подписан текущий пользователь (подписки)
     following: Mapped[List["User"]] = relationship(
         "User",
         secondary=follower,
-        primaryjoin=follower.c.follower_user_id == id,
-        secondaryjoin=follower.c.following_user_id == id,
+        primaryjoin=follower.c.follower_user_pk == pk,
+        secondaryjoin=follower.c.following_user_pk == pk,
         back_populates="followers",
     )
 
@@ -42,6 +59,17 @@ class User(Base):
         """
         return {c.name: getattr(self, c.name) for c in self.__table__.columns}
 
+    @classmethod
+    def pk_of(cls, user_id: str) -> ScalarSelect:
+        """
+        Функция, возвращающая подзапрос внутреннего ключа пользователя по его id.
+        Для несуществующего пользователя подзапрос возвращает NULL
+
+        :param user_id: id пользователя
+        :return: скалярный подзапрос
+        """
+        return select(cls.pk).where(cls.id == user_id).scalar_subquery()
+
     @classmethod
     async def add_user(
         cls, db_async_session: AsyncSession, user_id: str, name: str
@@ -75,14 +103,16 @@ class User(Base):
                 detail=f"Пользователь с id {user_id} уже существует",
             )
 
+        await broker.publish("user_added", user_id=user_id)
         return new_user
 
     @classmethod
     async def get_user_data(
         cls, db_async_session: AsyncSession, user_id: str
-    ) -> "User":
+    ) -> UserInfoRow:
         """
-        Функция, которая возвращает полную информацию профиля пользователя
+        Функция, которая возвращает полную информацию профиля пользователя.
+        Пользователь, подписчики и подписки читаются запросами столбцов без создания ORM-объектов
 
         :param db_async_session: асинхронная сессия подключения к БД
         :param user_id: id пользователя
@@ -93,19 +123,30 @@ class User(Base):
         )
         async with db_async_session.begin():
             result = await db_async_session.execute(
-                select(User)
-                .options(selectinload(User.followers), selectinload(User.following))
-                .where(User.id == user_id)
+                select(User.pk, User.name).where(User.id == user_id)
             )
-            user = result.scalars().one_or_none()
+            user = result.one_or_none()
 
-            if user:
-                return user
+            if user is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"Пользователь с id {user_id} не существует",
+                )
 
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Пользователь с id {user_id} не существует",
+            followers = await db_async_session.execute(
+                select(User.id, User.name)
+                .join(follower, follower.c.follower_user_pk == User.pk)
+                .where(follower.c.following_user_pk == user.pk)
+            )
+            followers = [UserRow(row.id.rstrip(), row.name) for row in followers]
+            following = await db_async_session.execute(
+                select(User.id, User.name)
+                .join(follower, follower.c.following_user_pk == User.pk)
+                .where(follower.c.follower_user_pk == user.pk)
             )
+            following = [UserRow(row.id.rstrip(), row.name) for row in following]
+
+        return UserInfoRow(user_id, user.name, followers, following)
 
     @classmethod
     async def delete_user(cls, db_async_session: AsyncSession, user_id: str) -> bool:
@@ -121,7 +162,12 @@ class User(Base):
             result = await db_async_session.execute(
                 delete(User).where(User.id == user_id)
             )
-            return result.rowcount != 0
+
+        if result.rowcount == 0:
+            return False
+
+        await broker.publish("user_deleted", user_id=user_id)
+        return True
 
     @classmethod
     async def follow(
@@ -131,13 +177,16 @@ class User(Base):
         following_user_id: str,
     ) -> bool:
         """
-        Функция, которая добавляет подписку на пользователя
+        Функция, которая добавляет подписку на пользователя. Ранее опубликованные твиты пользователя,
+        записанные в ленты подписчиков, в той же транзакции записываются в ленту нового подписчика
 
         :param db_async_session: асинхронная сессия подключения к БД
         :param follower_user_id: id пользователя, который подписывается на пользователя с id following_user_id
         :param following_user_id: id пользователя, на которого подписывается пользователь с id follower_user_id
         :return: bool-евый результат выполнения
         """
+        from models.timeline import Timeline
+
         logger.debug(
             "Подписка пользователя c id = {} на пользователя с id = {}".format(
                 follower_user_id, following_user_id
@@ -151,19 +200,22 @@ class User(Base):
         try:
             async with db_async_session.begin():
                 await db_async_session.execute(
-                    follower.insert().values((follower_user_id, following_user_id))
+                    follower.insert().values(
+                        follower_user_pk=User.pk_of(follower_user_id),
+                        following_user_pk=User.pk_of(following_user_id),
+                    )
+                )
+                await Timeline.add_authors(
+                    db_async_session, follower_user_id, [following_user_id]
                 )
         except IntegrityError as exc:
-            exc_detail = str(exc.orig).split("\n")[1]
+            # Ключ несуществующего пользователя равен NULL и нарушает ограничение NOT NULL
+            exc_detail = str(exc.orig)
 
             if all(
                 [
                     value in exc_detail
-                    for value in (
-                        follower_user_id,
-                        "follower_user_id",
-                        "is not present in table",
-                    )
+                    for value in ('"follower_user_pk"', "null value in column")
                 ]
             ):
                 raise HTTPException(
@@ -174,11 +226,7 @@ class User(Base):
             if all(
                 [
                     value in exc_detail
-                    for value in (
-                        following_user_id,
-                        "following_user_id",
-                        "is not present in table",
-                    )
+                    for value in ('"following_user_pk"', "null value in column")
                 ]
             ):
                 raise HTTPException(
@@ -190,10 +238,8 @@ class User(Base):
                 [
                     value in exc_detail
                     for value in (
-                        follower_user_id,
-                        following_user_id,
-                        "follower_user_id",
-                        "following_user_id",
+                        "follower_user_pk",
+                        "following_user_pk",
                         "already exists",
                     )
                 ]
@@ -204,6 +250,11 @@ class User(Base):
                     f"на пользователя с {following_user_id} уже существует в БД",
                 )
 
+        await broker.publish(
+            "follow",
+            follower_user_id=follower_user_id,
+            following_user_id=following_user_id,
+        )
         return True
 
     @classmethod
@@ -214,12 +265,14 @@ class User(Base):
         following_user_id: str,
     ) -> bool:
         """
-        Функция, которая удаляет подписку от пользователя
+        Функция, которая удаляет подписку от пользователя вместе с его твитами в ленте подписчика
 
         :param db_async_session: асинхронная сессия подключения к БД
         :param follower_user_id: id пользователя, который отписывается от пользователя с id following_user_id
         :param following_user_id: id пользователя, от которого отписывается пользователь с id follower_user_id
         """
+        from models.timeline import Timeline
+
         logger.debug(
             "Отписка пользователя c id = {} от пользователя с id = {}".format(
                 follower_user_id, following_user_id
@@ -228,16 +281,186 @@ class User(Base):
         async with db_async_session.begin():
             row = await db_async_session.execute(
                 follower.delete()
-                .where(follower.c.follower_user_id == follower_user_id)
-                .where(follower.c.following_user_id == following_user_id)
+                .where(follower.c.follower_user_pk == User.pk_of(follower_user_id))
+                .where(follower.c.following_user_pk == User.pk_of(following_user_id))
             )
-            if row.rowcount != 0:
-                return True
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Запись об отписке пользователя с id {follower_user_id} "
-                f"от пользователя с {following_user_id} не существует в БД",
+            if row.rowcount == 0:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"Запись об отписке пользователя с id {follower_user_id} "
+                    f"от пользователя с {following_user_id} не существует в БД",
+                )
+            await Timeline.remove_authors(
+                db_async_session, follower_user_id, [following_user_id]
+            )
+
+        await broker.publish(
+            "unfollow",
+            follower_user_id=follower_user_id,
+            following_user_id=following_user_id,
+        )
+        return True
+
+    @classmethod
+    async def follow_many(
+        cls,
+        db_async_session: AsyncSession,
+        follower_user_id: str,
+        following_user_ids: List[str],
+    ) -> Tuple[Set[str], Set[str]]:
+        """
+        Функция, которая одним запросом добавляет подписки на нескольких пользователей.
+        Выполняется в рамках уже открытой транзакции сессии
+
+        :param db_async_session: асинхронная сессия подключения к БД с открытой транзакцией
+        :param follower_user_id: id пользователя, который подписывается
+        :param following_user_ids: список id пользователей, на которых подписывается пользователь
+        :return: множество id существующих пользователей и множество id пользователей, подписка на которых добавлена
+        """
+        from models.timeline import Timeline
+
+        logger.debug(
+            "Пакетная подписка пользователя c id = {} на пользователей: количество = {}".format(
+                follower_user_id, len(following_user_ids)
+            )
+        )
+        result = await db_async_session.execute(
+            select(User.id).where(User.id.in_(following_user_ids))
+        )
+        exist_ids = {user_id.rstrip() for user_id in result.scalars().all()}
+
+        inserted = (
+            pg_insert(follower)
+            .from_select(
+                ["follower_user_pk", "following_user_pk"],
+                select(User.pk_of(follower_user_id), User.pk)
+                .where(User.id.in_(following_user_ids))
+                .where(User.id != follower_user_id),
+            )
+            .on_conflict_do_nothing()
+            .returning(follower.c.following_user_pk)
+            .cte("inserted")
+        )
+        result = await db_async_session.execute(
+            select(User.id).join(inserted, inserted.c.following_user_pk == User.pk)
+        )
+        added_ids = {user_id.rstrip() for user_id in result.scalars().all()}
+
+        if added_ids:
+            await Timeline.add_authors(
+                db_async_session, follower_user_id, list(added_ids)
+            )
+        return exist_ids, added_ids
+
+    @classmethod
+    async def unfollow_many(
+        cls,
+        db_async_session: AsyncSession,
+        follower_user_id: str,
+        following_user_ids: List[str],
+    ) -> Set[str]:
+        """
+        Функция, которая одним запросом удаляет подписки на нескольких пользователей.
+        Выполняется в рамках уже открытой транзакции сессии
+
+        :param db_async_session: асинхронная сессия подключения к БД с открытой транзакцией
+        :param follower_user_id: id пользователя, который отписывается
+        :param following_user_ids: список id пользователей, от которых отписывается пользователь
+        :return: множество id пользователей, подписка на которых удалена
+        """
+        from models.timeline import Timeline
+
+        logger.debug(
+            "Пакетная отписка пользователя c id = {} от пользователей: количество = {}".format(
+                follower_user_id, len(following_user_ids)
+            )
+        )
+        deleted = (
+            follower.delete()
+            .where(follower.c.follower_user_pk == User.pk_of(follower_user_id))
+            .where(
+                follower.c.following_user_pk.in_(
+                    select(User.pk).where(User.id.in_(following_user_ids))
+                )
+            )
+            .returning(follower.c.following_user_pk)
+            .cte("deleted")
+        )
+        result = await db_async_session.execute(
+            select(User.id).join(deleted, deleted.c.following_user_pk == User.pk)
+        )
+        deleted_ids = {user_id.rstrip() for user_id in result.scalars().all()}
+
+        if deleted_ids:
+            await Timeline.remove_authors(
+                db_async_session, follower_user_id, list(deleted_ids)
+            )
+        return deleted_ids
+
+    @classmethod
+    async def delete_follows_batch(
+        cls, db_async_session: AsyncSession, user_id: str, limit: int
+    ) -> List[Tuple[str, str]]:
+        """
+        Функция, которая удаляет не более limit подписок пользователя и подписок на него.
+        Выполняется в рамках уже открытой транзакции сессии
+
+        :param db_async_session: асинхронная сессия подключения к БД с открытой транзакцией
+        :param user_id: id пользователя
+        :param limit: максимальное количество удаляемых подписок
+        :return: список пар (id подписчика, id пользователя, на которого он был подписан)
+        """
+        user_pk = User.pk_of(user_id)
+        batch = follower.alias("batch")
+        deleted = (
+            follower.delete()
+            .where(
+                tuple_(follower.c.follower_user_pk, follower.c.following_user_pk).in_(
+                    select(batch.c.follower_user_pk, batch.c.following_user_pk)
+                    .where(
+                        or_(
+                            batch.c.follower_user_pk == user_pk,
+                            batch.c.following_user_pk == user_pk,
+                        )
+                    )
+                    .limit(limit)
+                )
+            )
+            .returning(follower.c.follower_user_pk, follower.c.following_user_pk)
+            .cte("deleted")
+        )
+        follower_user = aliased(User)
+        following_user = aliased(User)
+        result = await db_async_session.execute(
+            select(follower_user.id, following_user.id)
+            .join(deleted, deleted.c.follower_user_pk == follower_user.pk)
+            .join(following_user, deleted.c.following_user_pk == following_user.pk)
+        )
+        return [
+            (follower_user_id.rstrip(), following_user_id.rstrip())
+            for follower_user_id, following_user_id in result.all()
+        ]
+
+    @classmethod
+    async def get_following_ids(
+        cls, db_async_session: AsyncSession, user_id: str
+    ) -> List[str]:
+        """
+        Функция, которая возвращает список id пользователей, на которых подписан пользователь
+
+        :param db_async_session: асинхронная сессия подключения к БД
+        :param user_id: id пользователя
+        :return: список id пользователей (подписок)
+        """
+        logger.debug("Получение списка подписок пользователя: id = {}".format(user_id))
+
+        async with db_async_session.begin():
+            result = await db_async_session.execute(
+                select(User.id)
+                .join(follower, follower.c.following_user_pk == User.pk)
+                .where(follower.c.follower_user_pk == User.pk_of(user_id))
             )
+            return [following_id.rstrip() for following_id in result.scalars().all()]
 
     @classmethod
     async def get_all_user_ids(cls, db_async_session: AsyncSession) -> List[str]:
@@ -282,8 +505,8 @@ class User(Base):
 
         async with db_async_session.begin():
             result = await db_async_session.execute(
-                select(User).where(User.id == user_id)
+                select(User.pk).where(User.id == user_id)
             )
-            user = result.scalars().one_or_none()
+            user_pk = result.scalars().one_or_none()
 
-        return user is not None
+        return user_pk is not None
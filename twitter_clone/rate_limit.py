@@ -0,0 +1,266 @@
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from math import ceil
+from typing import Callable, Dict, Optional, Tuple
+
+from fastapi import status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from cache import CacheBackend, cache_backend
+from config import RATE_LIMIT_ENABLED, RATE_LIMIT_MAX_KEYS, RATE_LIMIT_RULES
+from logger import logger
+from schemas.error import ErrorResult
+from utility.auth import auth_cache
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """
+    Лимит корзины токенов: не более requests запросов за period секунд с допустимым всплеском до requests
+    """
+
+    requests: int
+    period: float
+
+    @property
+    def rate(self) -> float:
+        return self.requests / self.period
+
+    @property
+    def capacity(self) -> int:
+        return self.requests
+
+
+def parse_rate_limit_rules(rules: str) -> Dict[Tuple[str, str], RateLimit]:
+    """
+    Функция, разбирающая правила ограничения частоты запросов
+
+    :param rules: строка вида "POST /api/tweets=30/60,GET /media/*=300/60", путь с * на конце
+    задаёт лимит для всех путей с этим префиксом
+    :return: словарь {(метод, путь): лимит}
+    """
+    parsed = {}
+
+    for rule in filter(None, (rule.strip() for rule in rules.split(","))):
+        route, limit = rule.rsplit("=", 1)
+        method, path = route.split()
+        requests, period = limit.split("/")
+        parsed[(method.upper(), path)] = RateLimit(int(requests), float(period))
+
+    return parsed
+
+
+class RateLimitBackend(ABC):
+    """
+    Интерфейс хранилища корзин токенов
+    """
+
+    @abstractmethod
+    async def acquire(self, key: str, limit: RateLimit) -> float:
+        """
+        Функция, забирающая один токен из корзины
+
+        :param key: ключ корзины
+        :param limit: лимит корзины
+        :return: 0, если запрос разрешён, иначе время в секундах до появления токена
+        """
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """
+    Корзины токенов в памяти процесса. На ключ хранится только количество токенов и момент,
+    когда корзина заполнится. Заполнившиеся корзины неотличимы от новых, поэтому удаляются
+    при следующих запросах, начиная с давно не использованных
+    """
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS) -> None:
+        self.__max_keys = max_keys
+        self.__buckets: OrderedDict[str, Tuple[float, float, float]] = OrderedDict()
+
+    def __evict(self, now: float) -> None:
+        while self.__buckets:
+            _, _, full_at = next(iter(self.__buckets.values()))
+            if full_at > now and len(self.__buckets) <= self.__max_keys:
+                break
+            self.__buckets.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self.__buckets)
+
+    async def acquire(self, key: str, limit: RateLimit) -> float:
+        now = time.monotonic()
+        tokens, updated_at, _ = self.__buckets.pop(key, (limit.capacity, now, now))
+        tokens = min(limit.capacity, tokens + (now - updated_at) * limit.rate)
+
+        retry_after = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / limit.rate
+
+        self.__buckets[key] = (
+            tokens,
+            now,
+            now + (limit.capacity - tokens) / limit.rate,
+        )
+        self.__evict(now)
+        return retry_after
+
+
+# Время берётся на сервере Redis, поэтому часы воркеров не должны быть синхронизированы
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(state[1]) or capacity
+local updated_at = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1000)
+return tostring(retry_after)
+"""
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """
+    Корзины токенов в общем хранилище для нескольких воркеров. Корзина обновляется атомарно
+    одним Lua-скриптом и удаляется сервером по истечении времени её заполнения
+    """
+
+    def __init__(self, backend: CacheBackend) -> None:
+        self.__backend = backend
+        self.__script = backend.client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def acquire(self, key: str, limit: RateLimit) -> float:
+        retry_after = await self.__script(
+            keys=[self.__backend.key(key)], args=[limit.rate, limit.capacity]
+        )
+        return float(retry_after)
+
+
+def create_rate_limit_backend(
+    backend: CacheBackend = cache_backend,
+) -> RateLimitBackend:
+    """
+    Функция, создающая хранилище корзин токенов: общее, если общее хранилище кэшей, иначе в памяти процесса
+
+    :param backend: хранилище кэшей приложения
+    :return: экземпляр хранилища корзин
+    """
+    if backend.is_shared:
+        return RedisRateLimitBackend(backend)
+    return MemoryRateLimitBackend()
+
+
+class RateLimitMiddleware:
+    """
+    ASGI-middleware, ограничивающее частоту запросов пользователя (проверенный заголовок api-key) или остальных
+    клиентов (IP-адрес) к маршрутам, указанным в правилах. При превышении лимита возвращается ответ 429 с заголовком Retry-After
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        backend: Optional[RateLimitBackend] = None,
+        rules: str = RATE_LIMIT_RULES,
+        enabled: bool = RATE_LIMIT_ENABLED,
+        is_known_key: Callable[[str], bool] = auth_cache.is_cached_known,
+    ) -> None:
+        self.app = app
+        self.backend = backend or create_rate_limit_backend()
+        self.rules = parse_rate_limit_rules(rules) if enabled else {}
+        self.is_known_key = is_known_key
+
+    def client_key(self, scope: Scope) -> str:
+        """
+        Функция, возвращающая ключ клиента, для которого считается лимит: api-key пользователя, если ключ уже
+        проверен кэшем авторизации, иначе IP-адрес клиента, чтобы запросы без api-key или с подобранными ключами
+        не получали новые корзины. За обратным прокси адрес клиента берётся из X-Forwarded-For только
+        при запуске uvicorn с --proxy-headers
+
+        :param scope: ASGI-scope запроса
+        :return: ключ клиента
+        """
+        api_key = dict(scope["headers"]).get(b"api-key", b"").decode(errors="replace")
+        if api_key and self.is_known_key(api_key):
+            return "key:{}".format(api_key)
+
+        client = scope.get("client")
+        return "ip:{}".format(client[0] if client else "unknown")
+
+    def match(
+        self, method: str, path: str
+    ) -> Tuple[Tuple[str, str], Optional[RateLimit]]:
+        """
+        Функция, находящая правило запроса. Запросы ко всем путям правила с префиксом
+        считаются в одной корзине клиента
+
+        :param method: метод запроса
+        :param path: путь запроса
+        :return: маршрут правила (или запроса, если правила нет) и лимит
+        """
+        route = (method, path)
+        if route in self.rules:
+            return route, self.rules[route]
+
+        for (rule_method, rule_path), limit in self.rules.items():
+            if (
+                rule_method == method
+                and rule_path.endswith("*")
+                and path.startswith(rule_path[:-1])
+            ):
+                return (rule_method, rule_path), limit
+        return route, None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route, limit = self.match(scope["method"], scope["path"])
+
+        if limit:
+            client = self.client_key(scope)
+            try:
+                retry_after = await self.backend.acquire(
+                    "rate:{}:{} {}".format(client, *route), limit
+                )
+            except Exception as exc:
+                # При недоступном хранилище запросы не ограничиваются
+                logger.exception("Ошибка ограничения частоты запросов: {}".format(exc))
+                retry_after = 0
+
+            if retry_after > 0:
+                logger.warning(
+                    "Превышен лимит запросов: клиент = {}, маршрут = {} {}".format(
+                        client, *route
+                    )
+                )
+                content = ErrorResult(
+                    result=False,
+                    error_type="RateLimitExceeded",
+                    error_message="Превышен лимит запросов {} {}: {} за {:g} сек.".format(
+                        *route, limit.requests, limit.period
+                    ),
+                )
+                response = JSONResponse(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    content=jsonable_encoder(content),
+                    headers={"Retry-After": str(ceil(retry_after))},
+                )
+                await response(scope, receive, send)
+                return
+
+        await self.app(scope, receive, send)
@@ -0,0 +1,53 @@
+from typing import List, Literal, Optional
+
+from pydantic import BaseModel, Field, conlist, model_validator
+
+from config import BATCH_MAX_OPERATIONS
+from schemas.result import Result
+
+USER_ACTIONS = ("follow", "unfollow")
+TWEET_ACTIONS = ("like", "unlike", "delete")
+
+
+class BatchOperation(BaseModel):
+    action: Literal["follow", "unfollow", "like", "unlike", "delete"] = Field(
+        ..., title="Тип операции"
+    )
+    user_id: Optional[str] = Field(
+        None,
+        title="id пользователя (для операций follow и unfollow)",
+        max_length=32,
+        min_length=1,
+    )
+    tweet_id: Optional[int] = Field(
+        None, title="id твита (для операций like, unlike и delete)"
+    )
+
+    @model_validator(mode="after")
+    def check_target(self) -> "BatchOperation":
+        if self.action in USER_ACTIONS and self.user_id is None:
+            raise ValueError(
+                "Для операции {} необходимо указать user_id".format(self.action)
+            )
+        if self.action in TWEET_ACTIONS and self.tweet_id is None:
+            raise ValueError(
+                "Для операции {} необходимо указать tweet_id".format(self.action)
+            )
+        return self
+
+
+class NewBatch(BaseModel):
+    operations: conlist(
+        BatchOperation, min_length=1, max_length=BATCH_MAX_OPERATIONS
+    ) = Field(..., title="Список операций, выполняемых в одной транзакции")
+
+
+class BatchOperationResult(BaseModel):
+    action: str
+    result: bool
+    status_code: int
+    error_message: Optional[str] = None
+
+
+class BatchResult(Result):
+    results: List[BatchOperationResult]
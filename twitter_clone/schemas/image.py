@@ -1,5 +1,17 @@
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
 from schemas.result import Result
 
 
 class ImageResult(Result):
     media_id: str
+
+
+class AttachmentView(BaseModel):
+    url: str = Field(..., title="Путь изображения")
+    format: Optional[str] = Field(None, title="Формат изображения")
+    width: Optional[int] = Field(None, title="Ширина изображения в пикселях")
+    height: Optional[int] = Field(None, title="Высота изображения в пикселях")
+    bytes: Optional[int] = Field(None, title="Объём файла изображения в байтах")
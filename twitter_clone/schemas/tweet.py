@@ -2,6 +2,7 @@ from typing import List, Optional
 
 from pydantic import BaseModel, ConfigDict, Field, conlist
 
+from schemas.image import AttachmentView
 from schemas.like import Like
 from schemas.result import Result
 from schemas.user import User
@@ -18,15 +19,85 @@ class TweetView(BaseModel):
     id: int
     content: str
     attachments: List[Optional[str]]
+    media: List[AttachmentView] = Field(
+        default_factory=list, title="Формат, размеры и объём изображений твита"
+    )
     author: User
     likes: List[Optional[Like]]
 
     model_config = ConfigDict(from_attributes=True)
 
 
+class TweetCompactView(BaseModel):
+    id: int
+    content: str
+    attachments: List[Optional[str]]
+    media: List[AttachmentView] = Field(
+        default_factory=list, title="Формат, размеры и объём изображений твита"
+    )
+    author: User
+    likes_count: int = Field(0, title="Количество лайков")
+    liked_by_me: bool = Field(False, title="Текущий пользователь лайкнул твит")
+    sample_likers: List[Like] = Field(
+        default_factory=list, title="Несколько пользователей, лайкнувших твит"
+    )
+
+    model_config = ConfigDict(from_attributes=True)
+
+
 class TweetResult(Result):
     tweet_id: int
 
 
 class TweetListResult(Result):
     tweets: List[Optional[TweetView]]
+
+
+class TweetListPageResult(Result):
+    tweets: List[TweetView]
+    next_cursor: Optional[str] = None
+
+
+class TweetCompactListResult(Result):
+    tweets: List[Optional[TweetCompactView]]
+
+
+class TweetPageResult(Result):
+    tweets: List[TweetCompactView]
+    next_cursor: Optional[str] = None
+
+
+class LikeListResult(Result):
+    likes: List[Like]
+    next_cursor: Optional[str] = None
+
+
+class TweetSearchView(BaseModel):
+    id: int
+    content: str
+    snippet: str
+    rank: float
+    author: User
+
+
+class SearchResult(Result):
+    tweets: List[Optional[TweetSearchView]]
+    next_cursor: Optional[str] = None
+
+
+class TrendingTweetView(BaseModel):
+    id: int
+    content: str
+    attachments: List[Optional[str]]
+    media: List[AttachmentView] = Field(
+        default_factory=list, title="Формат, размеры и объём изображений твита"
+    )
+    author: User
+    likes_count: int
+    score: float
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class TrendingResult(Result):
+    tweets: List[Optional[TrendingTweetView]]
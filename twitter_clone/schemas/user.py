@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import Dict, List, Literal, Optional
 
 from pydantic import BaseModel, ConfigDict, Field
 
@@ -24,3 +24,27 @@ class UserInfoResult(Result):
 
 class NewUserResult(Result):
     user: User
+
+
+class AccountDeletion(BaseModel):
+    status: Literal["running", "completed", "failed", "interrupted"] = Field(
+        ..., title="Состояние удаления"
+    )
+    stage: Literal[
+        "likes",
+        "archived_likes",
+        "follows",
+        "timeline",
+        "tweets",
+        "archived_tweets",
+        "user",
+    ] = Field(..., title="Текущий этап удаления")
+    deleted: Dict[str, int] = Field(..., title="Количество удалённых записей по типам")
+    error: Optional[str] = None
+    token: Optional[str] = Field(
+        None, title="Ключ для запроса хода удаления (возвращается только при запуске)"
+    )
+
+
+class AccountDeletionResult(Result):
+    deletion: AccountDeletion
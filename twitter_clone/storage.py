@@ -0,0 +1,292 @@
+import asyncio
+import mimetypes
+from abc import ABC, abstractmethod
+from contextlib import AsyncExitStack
+from pathlib import Path
+from typing import AsyncIterable, AsyncIterator, Optional, Union
+
+import aiofiles
+from aiofiles.os import makedirs as aio_makedirs
+from aiofiles.os import remove as aio_remove
+from aiofiles.os import rmdir as aio_rmdir
+
+from config import (
+    S3_ACCESS_KEY_ID,
+    S3_BUCKET,
+    S3_ENDPOINT_URL,
+    S3_PART_SIZE_MB,
+    S3_PUBLIC_URL,
+    S3_REGION,
+    S3_SECRET_ACCESS_KEY,
+    STORAGE_BACKEND,
+)
+from logger import logger
+
+ABS_PATH = Path(__file__).parent
+IMAGES_PATH = Path(ABS_PATH, "static", "images")
+# Исходные файлы перекодированных изображений хранятся вне каталога static и не раздаются клиентам
+ORIGINALS_PATH = Path(ABS_PATH, "originals")
+
+# Типы, которых может не быть в системной базе типов, нужны для заголовка Content-Type в бакете
+mimetypes.add_type("image/webp", ".webp")
+mimetypes.add_type("image/avif", ".avif")
+
+# Содержимое файла целиком или поток его частей
+FileData = Union[bytes, AsyncIterable[bytes]]
+
+
+async def iter_chunks(data: bytes, chunk_size: int) -> AsyncIterator[bytes]:
+    view = memoryview(data)
+    for start in range(0, len(view), chunk_size):
+        yield view[start : start + chunk_size]
+
+
+class StorageBackend(ABC):
+    """
+    Интерфейс хранилища файлов изображений. Файлы адресуются ключами вида {папка}/{имя файла},
+    ссылки на файлы для клиентов формирует хранилище, поэтому приложение не зависит от того,
+    лежат файлы на диске сервера или в объектном хранилище
+    """
+
+    def __init__(self, base_url: str) -> None:
+        self.base_url = base_url
+
+    def url(self, key: str) -> str:
+        """
+        Функция, возвращающая ссылку на файл для клиентов
+        """
+        return self.base_url + key
+
+    @abstractmethod
+    async def save(self, key: str, data: FileData) -> None:
+        """
+        Функция, сохраняющая файл из байтов или потока частей
+        """
+
+    @abstractmethod
+    async def load(self, key: str) -> Optional[bytes]:
+        """
+        Функция, возвращающая содержимое файла или None, если файла нет
+        """
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """
+        Функция, удаляющая файл. Отсутствие файла не считается ошибкой
+        """
+
+    async def close(self) -> None:
+        """
+        Функция, закрывающая подключение к хранилищу
+        """
+
+
+class LocalStorageBackend(StorageBackend):
+    """
+    Хранилище в каталоге на диске сервера. Файлы каталога static/images раздаются самим приложением,
+    поэтому ссылки на них относительные
+    """
+
+    def __init__(self, path: Path, base_url: str) -> None:
+        super().__init__(base_url)
+        self.__path = path
+
+    async def save(self, key: str, data: FileData) -> None:
+        file_path = Path(self.__path, key)
+        await aio_makedirs(file_path.parent, exist_ok=True)
+        async with aiofiles.open(file_path.__str__(), mode="wb") as new_file:
+            if isinstance(data, bytes):
+                await new_file.write(data)
+            else:
+                async for chunk in data:
+                    await new_file.write(chunk)
+
+    async def load(self, key: str) -> Optional[bytes]:
+        try:
+            async with aiofiles.open(
+                Path(self.__path, key).__str__(), mode="rb"
+            ) as file:
+                return await file.read()
+        except FileNotFoundError:
+            return None
+
+    async def delete(self, key: str) -> None:
+        file_path = Path(self.__path, key)
+        try:
+            await aio_remove(file_path)
+        except FileNotFoundError:
+            pass
+
+        # Папка удаляется вместе с последним файлом
+        try:
+            await aio_rmdir(file_path.parent)
+        except OSError:
+            pass
+
+
+class S3StorageBackend(StorageBackend):
+    """
+    Хранилище в бакете S3-совместимого объектного хранилища (AWS S3, MinIO, Ceph и др.). Файлы больше
+    part_size загружаются потоком частей (multipart upload), поэтому в памяти держится не больше одной части.
+    Для раздачи изображений клиентам на префикс images бакета должно быть открыто чтение
+    """
+
+    def __init__(
+        self,
+        prefix: str,
+        bucket: str = S3_BUCKET,
+        endpoint_url: Optional[str] = S3_ENDPOINT_URL,
+        region: str = S3_REGION,
+        access_key_id: Optional[str] = S3_ACCESS_KEY_ID,
+        secret_access_key: Optional[str] = S3_SECRET_ACCESS_KEY,
+        public_url: Optional[str] = S3_PUBLIC_URL,
+        part_size: int = int(S3_PART_SIZE_MB * 1024 * 1024),
+    ) -> None:
+        if public_url is None:
+            public_url = (
+                "{}/{}".format(endpoint_url.rstrip("/"), bucket)
+                if endpoint_url
+                else "https://{}.s3.{}.amazonaws.com".format(bucket, region)
+            )
+        super().__init__("{}/{}".format(public_url.rstrip("/"), prefix))
+        self.__prefix = prefix
+        self.__bucket = bucket
+        self.__client_options = dict(
+            endpoint_url=endpoint_url,
+            region_name=region,
+            aws_access_key_id=access_key_id,
+            aws_secret_access_key=secret_access_key,
+        )
+        self.__part_size = part_size
+        self.__exit_stack = AsyncExitStack()
+        self.__client = None
+        self.__client_lock = asyncio.Lock()
+
+    async def __get_client(self):
+        async with self.__client_lock:
+            if self.__client is None:
+                # aiobotocore загружается только при первом обращении к хранилищу
+                from aiobotocore.session import get_session
+
+                self.__client = await self.__exit_stack.enter_async_context(
+                    get_session().create_client("s3", **self.__client_options)
+                )
+        return self.__client
+
+    async def save(self, key: str, data: FileData) -> None:
+        client = await self.__get_client()
+        object_key = self.__prefix + key
+        content_type = mimetypes.guess_type(key)[0] or "application/octet-stream"
+
+        if isinstance(data, bytes):
+            data = iter_chunks(data, self.__part_size)
+
+        upload_id = None
+        parts = []
+        buffer = bytearray()
+
+        async def upload_part() -> None:
+            response = await client.upload_part(
+                Bucket=self.__bucket,
+                Key=object_key,
+                UploadId=upload_id,
+                PartNumber=len(parts) + 1,
+                Body=bytes(buffer),
+            )
+            parts.append({"ETag": response["ETag"], "PartNumber": len(parts) + 1})
+            buffer.clear()
+
+        try:
+            async for chunk in data:
+                buffer += chunk
+
+                if len(buffer) >= self.__part_size:
+                    if upload_id is None:
+                        response = await client.create_multipart_upload(
+                            Bucket=self.__bucket,
+                            Key=object_key,
+                            ContentType=content_type,
+                        )
+                        upload_id = response["UploadId"]
+                    await upload_part()
+
+            # Файл меньше одной части загружается одним запросом
+            if upload_id is None:
+                await client.put_object(
+                    Bucket=self.__bucket,
+                    Key=object_key,
+                    Body=bytes(buffer),
+                    ContentType=content_type,
+                )
+                return
+
+            if buffer:
+                await upload_part()
+            await client.complete_multipart_upload(
+                Bucket=self.__bucket,
+                Key=object_key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+            logger.debug(
+                "Файл загружен частями: key = {}, частей = {}".format(
+                    object_key, len(parts)
+                )
+            )
+        except Exception:
+            if upload_id is not None:
+                await client.abort_multipart_upload(
+                    Bucket=self.__bucket, Key=object_key, UploadId=upload_id
+                )
+            raise
+
+    async def load(self, key: str) -> Optional[bytes]:
+        from botocore.exceptions import ClientError
+
+        client = await self.__get_client()
+        try:
+            response = await client.get_object(
+                Bucket=self.__bucket, Key=self.__prefix + key
+            )
+        except ClientError as exc:
+            if exc.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                return None
+            raise
+
+        async with response["Body"] as stream:
+            return await stream.read()
+
+    async def delete(self, key: str) -> None:
+        client = await self.__get_client()
+        await client.delete_object(Bucket=self.__bucket, Key=self.__prefix + key)
+
+    async def close(self) -> None:
+        await self.__exit_stack.aclose()
+        self.__client = None
+
+
+def create_storage_backend(
+    path: Path, prefix: str, backend: str = STORAGE_BACKEND
+) -> StorageBackend:
+    """
+    Функция, создающая хранилище файлов по названию из настроек
+
+    :param path: каталог хранилища на диске сервера
+    :param prefix: префикс ключей в бакете и ссылок на файлы
+    :param backend: local - каталог на диске сервера, s3 - бакет S3_BUCKET
+    :return: экземпляр хранилища
+    """
+    logger.debug(
+        "Создание хранилища файлов: backend = {}, prefix = {}".format(backend, prefix)
+    )
+
+    if backend == "local":
+        return LocalStorageBackend(path, prefix)
+    if backend == "s3":
+        return S3StorageBackend(prefix)
+
+    raise ValueError("Неизвестное хранилище файлов: {}".format(backend))
+
+
+image_storage = create_storage_backend(IMAGES_PATH, "images/")
+original_storage = create_storage_backend(ORIGINALS_PATH, "originals/")
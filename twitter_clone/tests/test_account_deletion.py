@@ -0,0 +1,228 @@
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+from sqlalchemy import select, update
+
+from cache import MemoryCacheBackend
+from models.archive import ArchivedLike, ArchivedTweet
+from models.image import Image
+from models.like import Like
+from models.tweet import Tweet
+from models.user import User
+from storage import image_storage
+from utility.account_deletion import AccountDeletion
+from utility.archive import archive_old_tweets
+
+
+async def wait_for_deletion(
+    deletion: AccountDeletion, user_id: str, token: str
+) -> dict:
+    for _ in range(100):
+        progress = await deletion.get_progress(user_id, token)
+        if progress["status"] != "running":
+            return progress
+        await asyncio.sleep(0.05)
+    raise TimeoutError
+
+
+async def test_account_deletion_removes_user_data_in_batches(db_session):
+    async_session = db_session()
+    user = await User.add_user(async_session, user_id="test_id_30", name="Testname_30")
+    other = await User.add_user(async_session, user_id="test_id_31", name="Testname_31")
+    filename = "image.jpg"
+
+    with open(Path("tests", "media", filename), mode="rb") as image_file:
+        image_id = await Image.add_image(
+            async_session, image=image_file.read(), filename=filename
+        )
+
+    tweet_ids = [
+        await Tweet.add_tweet(
+            async_session,
+            author_id=user.id,
+            content="Some simple text for test...",
+            tweet_media_ids=[image_id] if number == 0 else None,
+        )
+        for number in range(5)
+    ]
+    image_paths = await Image.get_image_paths(async_session, tweet_ids[0])
+    other_tweet_id = await Tweet.add_tweet(
+        async_session, author_id=other.id, content="Some simple text for test..."
+    )
+    for tweet_id in tweet_ids:
+        await Like.add_like(async_session, user_id=other.id, tweet_id=tweet_id)
+    await Like.add_like(async_session, user_id=user.id, tweet_id=other_tweet_id)
+    await User.follow(
+        async_session, follower_user_id=user.id, following_user_id=other.id
+    )
+    await User.follow(
+        async_session, follower_user_id=other.id, following_user_id=user.id
+    )
+
+    deletion = AccountDeletion(MemoryCacheBackend(), batch_size=2, pause=0)
+    progress = await deletion.start(user.id, db_session)
+    assert progress["status"] == "running"
+    assert await deletion.get_progress(user.id, "wrong token") is None
+
+    progress = await wait_for_deletion(deletion, user.id, progress["token"])
+    assert progress["status"] == "completed"
+    assert progress["deleted"] == {"likes": 1, "follows": 2, "tweets": 5, "images": 1}
+
+    assert not await User.is_user_exist(async_session, user.id)
+    assert set(tweet_ids).isdisjoint(await Tweet.get_all_tweet_ids(async_session))
+    assert await image_storage.load(image_paths[0]) is None
+    assert other_tweet_id in await Tweet.get_all_tweet_ids(async_session)
+
+    await User.delete_user(async_session, user_id=other.id)
+
+
+async def test_account_deletion_removes_archived_tweets_and_files(db_session):
+    async_session = db_session()
+    user = await User.add_user(async_session, user_id="test_id_46", name="Testname_46")
+    other = await User.add_user(async_session, user_id="test_id_47", name="Testname_47")
+    filename = "image.jpg"
+
+    with open(Path("tests", "media", filename), mode="rb") as image_file:
+        image_id = await Image.add_image(
+            async_session, image=image_file.read(), filename=filename
+        )
+
+    tweet_id = await Tweet.add_tweet(
+        async_session,
+        author_id=user.id,
+        content="Some old text for test...",
+        tweet_media_ids=[image_id],
+    )
+    image_paths = await Image.get_image_paths(async_session, tweet_id)
+    other_tweet_id = await Tweet.add_tweet(
+        async_session, author_id=other.id, content="Some old text for test..."
+    )
+    await Like.add_like(async_session, user_id=other.id, tweet_id=tweet_id)
+    await Like.add_like(async_session, user_id=user.id, tweet_id=other_tweet_id)
+
+    async with async_session.begin():
+        await async_session.execute(
+            update(Tweet)
+            .where(Tweet.id.in_([tweet_id, other_tweet_id]))
+            .values(created_at=datetime.now(timezone.utc) - timedelta(days=10))
+        )
+    await archive_old_tweets(db_session, after_days=5, batch_size=10)
+
+    deletion = AccountDeletion(MemoryCacheBackend(), batch_size=2, pause=0)
+    progress = await deletion.start(user.id, db_session)
+
+    progress = await wait_for_deletion(deletion, user.id, progress["token"])
+    assert progress["status"] == "completed"
+    assert progress["deleted"] == {"likes": 1, "follows": 0, "tweets": 1, "images": 1}
+    assert await image_storage.load(image_paths[0]) is None
+
+    async with async_session.begin():
+        archived_ids = set(
+            (
+                await async_session.execute(
+                    select(ArchivedTweet.id).where(
+                        ArchivedTweet.id.in_([tweet_id, other_tweet_id])
+                    )
+                )
+            ).scalars()
+        )
+        archived_likes = await async_session.scalar(
+            select(ArchivedLike.tweet_id).where(ArchivedLike.tweet_id == other_tweet_id)
+        )
+    assert archived_ids == {other_tweet_id}
+    assert archived_likes is None
+
+    await User.delete_user(async_session, user_id=other.id)
+
+
+# Сессия, открытие которой не завершается: задача удаления остаётся выполняющейся
+class BlockedSession:
+    async def __aenter__(self):
+        await asyncio.Event().wait()
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+
+async def test_running_deletion_progress_is_restored_after_eviction():
+    backend = MemoryCacheBackend()
+    deletion = AccountDeletion(backend, pause=0)
+    progress = await deletion.start("test_id", BlockedSession)
+    await asyncio.sleep(0)
+
+    await backend.delete(AccountDeletion.progress_key("test_id"))
+    assert await deletion.start("test_id", BlockedSession) is progress
+    assert await deletion.get_progress("test_id", progress["token"]) is not None
+
+    await deletion.shutdown()
+    assert (await deletion.get_progress("test_id", progress["token"]))[
+        "status"
+    ] == "interrupted"
+
+
+async def test_stale_running_deletion_is_restarted_with_same_token():
+    backend = MemoryCacheBackend()
+    deletion = AccountDeletion(backend, pause=0, stale_after=60)
+    stored = {
+        "status": "running",
+        "stage": "tweets",
+        "deleted": {"likes": 0, "follows": 0, "tweets": 0, "images": 0},
+        "error": None,
+        "token": "token",
+        "owner": "other:1",
+        "heartbeat": time.time(),
+    }
+    key = AccountDeletion.progress_key("test_id")
+
+    await backend.set(key, json.dumps(stored).encode())
+    assert await deletion.start("test_id", BlockedSession) == stored
+
+    stored["heartbeat"] -= 120
+    await backend.set(key, json.dumps(stored).encode())
+    progress = await deletion.start("test_id", BlockedSession)
+    assert progress["stage"] == "likes"
+    assert progress["token"] == "token"
+    assert progress["owner"] != "other:1"
+
+    await deletion.shutdown()
+
+
+@pytest.mark.usefixtures("client")
+class TestAccountDeletionRoutes:
+
+    def test_error_when_deletion_was_not_started(self, client):
+        response = client.get(
+            "/api/users/me/deletion",
+            headers={"api-key": "test_id_32", "deletion-token": "token"},
+        )
+        assert response.status_code == 404
+        assert response.json()["result"] is False
+
+    def test_error_when_delete_with_not_exist_user(self, client):
+        response = client.delete("/api/users/me", headers={"api-key": "test_id_33"})
+        assert response.status_code == 401
+        assert response.json()["result"] is False
+
+    def test_deletion_progress_requires_deletion_token(self, client):
+        client.post("/api/users", json={"id": "test_id_48", "name": "Testname_48"})
+
+        response = client.delete("/api/users/me", headers={"api-key": "test_id_48"})
+        assert response.status_code == 202
+        token = response.json()["deletion"]["token"]
+
+        response = client.get(
+            "/api/users/me/deletion",
+            headers={"api-key": "test_id_48", "deletion-token": "wrong token"},
+        )
+        assert response.status_code == 404
+
+        response = client.get(
+            "/api/users/me/deletion",
+            headers={"api-key": "test_id_48", "deletion-token": token},
+        )
+        assert response.status_code == 200
+        assert response.json()["deletion"]["token"] is None
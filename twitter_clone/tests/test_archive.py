@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, select, update
+
+from models.archive import ArchivedLike, ArchivedTweet
+from models.like import Like
+from models.tweet import Tweet
+from models.user import User
+from utility.archive import archive_old_tweets
+
+
+async def test_old_tweets_are_moved_to_archive_with_likes(db_session, client):
+    async_session = db_session()
+    user = await User.add_user(async_session, user_id="test_id_34", name="Testname_34")
+    old_tweet_ids = [
+        await Tweet.add_tweet(
+            async_session, author_id=user.id, content="Some old text for test..."
+        )
+        for _ in range(3)
+    ]
+    new_tweet_id = await Tweet.add_tweet(
+        async_session, author_id=user.id, content="Some new text for test..."
+    )
+    await Like.add_like(async_session, user_id="test", tweet_id=old_tweet_ids[0])
+
+    async with async_session.begin():
+        await async_session.execute(
+            update(Tweet)
+            .where(Tweet.id.in_(old_tweet_ids))
+            .values(created_at=datetime.now(timezone.utc) - timedelta(days=10))
+        )
+
+    archived_count = await archive_old_tweets(db_session, after_days=5, batch_size=2)
+    assert archived_count == 3
+
+    tweet_ids = await Tweet.get_all_tweet_ids(async_session)
+    assert new_tweet_id in tweet_ids
+    assert set(old_tweet_ids).isdisjoint(tweet_ids)
+
+    archived = {
+        tweet.id: tweet
+        for tweet in await ArchivedTweet.get_tweets_from_followers(
+            async_session, user.id
+        )
+    }
+    assert set(archived) == set(old_tweet_ids)
+    assert [like.user_id.rstrip() for like in archived[old_tweet_ids[0]].likes] == [
+        "test"
+    ]
+
+    hot_response = client.get("/api/tweets", headers={"api-key": user.id})
+    assert {tweet["id"] for tweet in hot_response.json()["tweets"]} == {new_tweet_id}
+
+    response = client.get("/api/tweets?archive=true", headers={"api-key": user.id})
+    assert response.status_code == 200
+    assert {tweet["id"] for tweet in response.json()["tweets"]} == {
+        new_tweet_id,
+        *old_tweet_ids,
+    }
+
+    # Архивный твит удаляется вместе с лайками
+    response = client.delete(
+        "/api/tweets/{}".format(old_tweet_ids[0]), headers={"api-key": user.id}
+    )
+    assert response.status_code == 200
+    archived = await ArchivedTweet.get_tweets_from_followers(async_session, user.id)
+    assert {tweet.id for tweet in archived} == set(old_tweet_ids[1:])
+
+    async with async_session.begin():
+        likes_count = await async_session.scalar(
+            select(func.count())
+            .select_from(ArchivedLike)
+            .where(ArchivedLike.tweet_id == old_tweet_ids[0])
+        )
+    assert likes_count == 0
+
+    await User.delete_user(async_session, user_id=user.id)
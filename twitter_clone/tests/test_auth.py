@@ -0,0 +1,46 @@
+from events import Event
+from utility.auth import AuthCache
+
+
+async def test_known_and_unknown_keys_cached_until_user_events(monkeypatch):
+    users, queries = {"test"}, []
+
+    async def fake_is_user_exist(db_async_session, user_id):
+        queries.append(user_id)
+        return user_id in users
+
+    monkeypatch.setattr("utility.auth.User.is_user_exist", fake_is_user_exist)
+    auth_cache = AuthCache(max_keys=10, positive_ttl=60, negative_ttl=60)
+
+    for _ in range(3):
+        assert await auth_cache.is_known(None, "test") is True
+        assert await auth_cache.is_known(None, "new") is False
+    assert queries == ["test", "new"]
+    assert auth_cache.is_cached_known("test") is True
+    assert auth_cache.is_cached_known("new") is False
+    assert auth_cache.is_cached_known("other") is False
+
+    users.add("new")
+    auth_cache.on_event(Event("user_added", {"user_id": "new"}))
+    assert await auth_cache.is_known(None, "new") is True
+
+
+async def test_expired_and_overflowing_keys_queried_again(monkeypatch):
+    queries = []
+
+    async def fake_is_user_exist(db_async_session, user_id):
+        queries.append(user_id)
+        return True
+
+    monkeypatch.setattr("utility.auth.User.is_user_exist", fake_is_user_exist)
+    auth_cache = AuthCache(max_keys=1, positive_ttl=60, negative_ttl=60)
+    await auth_cache.is_known(None, "first")
+    await auth_cache.is_known(None, "second")
+    await auth_cache.is_known(None, "first")
+    assert queries == ["first", "second", "first"]
+    assert len(auth_cache) == 1
+
+    expired_cache = AuthCache(max_keys=10, positive_ttl=-1, negative_ttl=-1)
+    await expired_cache.is_known(None, "first")
+    await expired_cache.is_known(None, "first")
+    assert queries[-2:] == ["first", "first"]
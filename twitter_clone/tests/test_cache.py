@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+from cache import MemoryCacheBackend, create_cache_backend
+
+
+async def test_volatile_keys_evicted_in_lru_order():
+    backend = MemoryCacheBackend(max_entries=2)
+    await backend.set("first", b"1", ttl=60)
+    await backend.set("second", b"2", ttl=60)
+    await backend.get("first")
+    await backend.set("third", b"3", ttl=60)
+
+    assert await backend.get_many(["first", "second", "third"]) == [b"1", None, b"3"]
+
+
+async def test_persistent_counters_not_evicted_and_expired_keys_dropped():
+    backend = MemoryCacheBackend(max_entries=1)
+    assert await backend.incr("counter") == 1
+    assert await backend.incr("counter") == 2
+    await backend.set("expired", b"1", ttl=-1)
+    await backend.set("volatile", b"1", ttl=60)
+
+    assert await backend.get("counter") == b"2"
+    assert await backend.get("expired") is None
+
+
+def test_memory_backend_refused_for_several_workers():
+    assert isinstance(create_cache_backend("memory", workers=1), MemoryCacheBackend)
+
+    with pytest.raises(ValueError):
+        create_cache_backend("memory", workers=4)
+
+
+async def test_memory_backend_delivers_messages_to_subscribers():
+    backend = MemoryCacheBackend()
+    messages = backend.subscribe("events")
+    received = asyncio.ensure_future(messages.__anext__())
+    await asyncio.sleep(0)
+
+    await backend.publish("events", b"message")
+    await backend.publish("other", b"ignored")
+
+    assert await received == b"message"
+    await messages.aclose()
+    await backend.publish("events", b"no subscribers")
@@ -1,5 +1,15 @@
 from pathlib import Path
 
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from migrations import (
+    LATEST_VERSION,
+    create_baseline_tables,
+    get_schema_version,
+    run_migrations,
+)
 from models.image import Image
 from models.like import Like
 from models.tweet import Tweet
@@ -100,3 +110,82 @@ async def test_cascade_delete_image_after_delete_tweet(db_session):
     images_after = await Image.get_all_image_ids(async_session)
 
     assert len(images_before) == len(images_after) + 1
+
+
+async def get_index_names(connection) -> set:
+    result = await connection.execute(
+        text(
+            "SELECT indexname FROM pg_indexes "
+            "WHERE schemaname = 'public' AND tablename <> 'schema_migrations'"
+        )
+    )
+    return set(result.scalars().all())
+
+
+async def test_migrations_upgrade_existing_schema_once(db_session):
+    engine = db_session.kw["bind"]
+
+    # Схема до введения миграций создаётся в отдельной БД того же сервера
+    async with engine.connect() as connection:
+        connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+        await connection.execute(text("DROP DATABASE IF EXISTS baseline"))
+        await connection.execute(text("CREATE DATABASE baseline"))
+
+    baseline_engine = create_async_engine(
+        engine.url.set(database="baseline"), poolclass=NullPool
+    )
+    try:
+        async with baseline_engine.begin() as connection:
+            await create_baseline_tables(connection)
+            ids = {"author": "a" * 32, "reader": "b" * 32}
+            await connection.execute(
+                text(
+                    "INSERT INTO users (id, name) VALUES (:author, 'author'), (:reader, 'reader')"
+                ),
+                ids,
+            )
+            await connection.execute(
+                text("INSERT INTO followers VALUES (:reader, :author)"), ids
+            )
+            await connection.execute(
+                text(
+                    "INSERT INTO tweets (content, author_id) VALUES ('tweet', :author)"
+                ),
+                ids,
+            )
+            await connection.execute(text("INSERT INTO likes VALUES (:reader, 1)"), ids)
+
+        assert await run_migrations(baseline_engine) is False
+        assert await run_migrations(baseline_engine) is False
+
+        async with baseline_engine.connect() as connection:
+            assert await get_schema_version(connection) == LATEST_VERSION
+            assert (
+                await connection.scalar(
+                    text(
+                        "SELECT users.name FROM tweets "
+                        "JOIN likes ON likes.tweet_id = tweets.id "
+                        "JOIN users ON users.pk = likes.user_pk"
+                    )
+                )
+                == "reader"
+            )
+            # Таблицы архива и лент создаются своими миграциями после перехода на users.pk
+            assert (
+                await connection.scalar(
+                    text(
+                        "SELECT count(*) FROM information_schema.columns WHERE "
+                        "(table_name = 'tweets_archive' AND column_name IN ('author_pk', 'media')) "
+                        "OR (table_name = 'likes_archive' AND column_name = 'user_pk') "
+                        "OR (table_name = 'timelines' AND column_name = 'user_pk')"
+                    )
+                )
+                == 4
+            )
+            migrated_indexes = await get_index_names(connection)
+
+        # Миграции приводят к тем же индексам, что и создание схемы из моделей
+        async with engine.connect() as connection:
+            assert migrated_indexes == await get_index_names(connection)
+    finally:
+        await baseline_engine.dispose()
@@ -0,0 +1,48 @@
+from events import EventBroker
+
+
+async def test_published_event_delivered_to_subscriber():
+    broker = EventBroker(queue_size=10)
+    queue = broker.subscribe()
+    await broker.publish("tweet_added", tweet_id=1, author_id="test")
+
+    event = queue.get_nowait()
+    assert event.type == "tweet_added"
+    assert event.data == {"tweet_id": 1, "author_id": "test"}
+    assert event.to_sse().startswith("event: tweet_added\ndata: ")
+
+
+async def test_listener_called_and_unsubscribed_queue_skipped():
+    broker = EventBroker(queue_size=10)
+    received = []
+    broker.add_listener(received.append)
+    queue = broker.subscribe()
+    broker.unsubscribe(queue)
+    await broker.publish("follow", follower_user_id="a", following_user_id="b")
+
+    assert [event.type for event in received] == ["follow"]
+    assert queue.empty()
+
+
+async def test_event_skipped_when_subscriber_queue_is_full():
+    broker = EventBroker(queue_size=1)
+    queue = broker.subscribe()
+    await broker.publish("like_added", tweet_id=1)
+    await broker.publish("like_added", tweet_id=2)
+
+    assert queue.qsize() == 1
+    assert queue.get_nowait().data["tweet_id"] == 1
+
+
+async def test_async_listener_awaited_and_remote_events_filtered():
+    broker = EventBroker(queue_size=10)
+    local_only, remote_aware = [], []
+
+    async def listener(event):
+        local_only.append(event)
+
+    broker.add_listener(listener)
+    broker.add_listener(remote_aware.append, remote=True)
+    await broker.publish("tweet_added", tweet_id=1, author_id="test")
+
+    assert len(local_only) == len(remote_aware) == 1
@@ -0,0 +1,64 @@
+import asyncio
+from contextlib import nullcontext
+
+from cache import MemoryCacheBackend
+from utility.feed_cache import FeedCache
+
+
+class FakePool:
+    def __init__(self, size: int, checkedout: int = 0) -> None:
+        self.__size = size
+        self.checked_out = checkedout
+
+    def size(self) -> int:
+        return self.__size
+
+    def checkedout(self) -> int:
+        return self.checked_out
+
+
+def make_payload_factory(payload: bytes, calls: list):
+    async def get_payload(db_async_session):
+        calls.append(db_async_session)
+        return payload
+
+    return get_payload
+
+
+async def test_page_is_recomputed_after_etag_change():
+    cache = FeedCache(MemoryCacheBackend(), nullcontext, FakePool(size=10))
+    calls = []
+
+    first = make_payload_factory(b"first", calls)
+    assert await cache.get("reader", "", "v1", "session", first) == (b"first", "v1")
+    assert await cache.get("reader", "", "v1", "session", first) == (b"first", "v1")
+    assert len(calls) == 1
+
+    second = make_payload_factory(b"second", calls)
+    assert await cache.get("reader", "", "v2", "session", second) == (b"second", "v2")
+    assert await cache.get("reader", "limit=2", "v2", "session", second) == (
+        b"second",
+        "v2",
+    )
+    assert len(calls) == 3
+
+
+async def test_stale_page_is_served_when_db_is_under_pressure():
+    pool = FakePool(size=10)
+    cache = FeedCache(
+        MemoryCacheBackend(),
+        lambda: nullcontext("background"),
+        pool,
+        stale_pool_usage=0.8,
+    )
+    calls = []
+    await cache.get("reader", "", "v1", "session", make_payload_factory(b"old", calls))
+
+    pool.checked_out = 8
+    fresh = make_payload_factory(b"new", calls)
+    assert await cache.get("reader", "", "v2", "session", fresh) == (b"old", "v1")
+
+    await asyncio.sleep(0)
+    assert calls[-1] == "background"
+    assert await cache.get("reader", "", "v2", "session", fresh) == (b"new", "v2")
+    assert len(calls) == 2
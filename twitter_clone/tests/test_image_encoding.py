@@ -0,0 +1,56 @@
+from io import BytesIO
+
+import pytest
+from PIL import Image as PillowImage
+from PIL import features
+
+from utility.image_encoding import encode_image, load_pillow
+
+requires_webp = pytest.mark.skipif(
+    not features.check("webp"), reason="Pillow собран без поддержки WebP"
+)
+requires_avif = pytest.mark.skipif(
+    "AVIF" not in load_pillow().SAVE, reason="Пакет pillow-avif-plugin не установлен"
+)
+
+
+def make_jpeg(size, orientation: int) -> bytes:
+    exif = PillowImage.Exif()
+    exif[0x0112] = orientation
+    output = BytesIO()
+    PillowImage.new("RGB", size, "orange").save(
+        output, format="JPEG", exif=exif.tobytes()
+    )
+    return output.getvalue()
+
+
+@requires_webp
+def test_image_is_rotated_resized_and_stripped_of_exif():
+    encoded = encode_image(make_jpeg((400, 300), 6), "webp", 80, 200)
+
+    assert encoded.format == "WEBP"
+    assert (encoded.width, encoded.height) == (150, 200)
+    with PillowImage.open(BytesIO(encoded.data)) as image:
+        assert image.format == "WEBP"
+        assert image.size == (150, 200)
+        assert not image.getexif()
+
+
+@requires_avif
+def test_image_is_encoded_to_avif():
+    encoded = encode_image(make_jpeg((400, 300), 1), "avif", 80, 200)
+
+    assert encoded.format == "AVIF"
+    assert (encoded.width, encoded.height) == (200, 150)
+    with load_pillow().open(BytesIO(encoded.data)) as image:
+        assert image.format == "AVIF"
+        assert image.size == (200, 150)
+
+
+@requires_webp
+def test_animated_image_is_kept_as_is():
+    frames = [PillowImage.new("RGB", (10, 10), color) for color in ("red", "blue")]
+    output = BytesIO()
+    frames[0].save(output, format="GIF", save_all=True, append_images=frames[1:])
+
+    assert encode_image(output.getvalue(), "webp", 80, 0) is None
@@ -0,0 +1,99 @@
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from utility.media_cache import MediaCache, OpenedFileResponse
+
+
+def make_render(data: bytes, calls: list):
+    async def render():
+        calls.append(data)
+        await asyncio.sleep(0.01)
+        return data
+
+    return render
+
+
+async def test_concurrent_misses_render_once(tmp_path):
+    cache = MediaCache(tmp_path, max_bytes=100)
+    calls = []
+
+    paths = await asyncio.gather(
+        *[cache.get("image/100.webp", make_render(b"x" * 10, calls)) for _ in range(5)]
+    )
+
+    assert len(calls) == 1
+    assert set(paths) == {tmp_path / "image" / "100.webp"}
+    assert paths[0].read_bytes() == b"x" * 10
+
+    await cache.get("image/100.webp", make_render(b"y", calls))
+    assert len(calls) == 1
+
+
+async def test_least_recently_used_files_are_evicted(tmp_path):
+    cache = MediaCache(tmp_path, max_bytes=25)
+    calls = []
+
+    for key in ("a/1.webp", "b/1.webp"):
+        await cache.get(key, make_render(b"x" * 10, calls))
+    await cache.get("a/1.webp", make_render(b"x" * 10, calls))
+    await cache.get("c/1.webp", make_render(b"x" * 10, calls))
+
+    assert len(calls) == 3
+    assert cache.size == 20
+    assert (tmp_path / "a" / "1.webp").exists()
+    assert not (tmp_path / "b" / "1.webp").exists()
+
+    await cache.discard("a")
+    assert cache.size == 10
+    assert not (tmp_path / "a").exists()
+
+
+async def test_files_are_loaded_from_disk_after_restart(tmp_path):
+    calls = []
+    await MediaCache(tmp_path).get("a/1.webp", make_render(b"x" * 10, calls))
+
+    cache = MediaCache(tmp_path)
+    await cache.get("a/1.webp", make_render(b"y", calls))
+
+    assert len(calls) == 1
+    assert cache.size == 10
+
+
+async def test_file_removed_before_open_is_rendered_again(tmp_path):
+    cache = MediaCache(tmp_path, max_bytes=100)
+    calls = []
+    get = cache.get
+
+    async def get_and_evict(key, render):
+        file_path = await get(key, render)
+        if len(calls) == 1:
+            file_path.unlink()
+        return file_path
+
+    cache.get = get_and_evict
+
+    with await cache.open("a/1.webp", make_render(b"x" * 10, calls)) as file:
+        assert file.read() == b"x" * 10
+    assert len(calls) == 2
+
+
+def test_opened_file_is_sent_after_removal(tmp_path):
+    file_path = tmp_path / "1.webp"
+    file_path.write_bytes(b"x" * 100_000)
+    file = file_path.open("rb")
+    file_path.unlink()
+
+    app = FastAPI()
+
+    @app.get("/media")
+    async def get_media():
+        return OpenedFileResponse(file, media_type="image/webp")
+
+    response = TestClient(app).get("/media")
+
+    assert response.status_code == 200
+    assert response.headers["content-length"] == "100000"
+    assert response.content == b"x" * 100_000
+    assert file.closed
@@ -0,0 +1,100 @@
+import pytest
+
+from models.like import Like
+from models.tweet import Tweet
+from models.user import User
+
+
+@pytest.mark.usefixtures("client", "db_session")
+class TestBatchRoute:
+
+    def test_error_when_requested_without_api_key(self, client):
+        response = client.post(
+            "/api/batch", json={"operations": [{"action": "like", "tweet_id": 1}]}
+        )
+        assert response.status_code == 422
+        assert response.json()["result"] is False
+        assert "RequestValidationError" in response.json()["error_type"]
+        assert "Field required" in response.json()["error_message"]
+
+    def test_error_when_requested_with_empty_operations(self, client):
+        response = client.post(
+            "/api/batch", headers={"api-key": "test"}, json={"operations": []}
+        )
+        assert response.status_code == 422
+        assert response.json()["result"] is False
+        assert "RequestValidationError" in response.json()["error_type"]
+
+    def test_error_when_operation_without_target(self, client):
+        response = client.post(
+            "/api/batch",
+            headers={"api-key": "test"},
+            json={"operations": [{"action": "follow"}]},
+        )
+        assert response.status_code == 422
+        assert response.json()["result"] is False
+        assert "Для операции follow необходимо указать user_id" in (
+            response.json()["error_message"]
+        )
+
+    def test_error_when_requested_with_not_exist_api_key(self, client):
+        api_key = "test_id_30"
+        response = client.post(
+            "/api/batch",
+            headers={"api-key": api_key},
+            json={"operations": [{"action": "like", "tweet_id": 1}]},
+        )
+        assert response.status_code == 401
+        assert response.json()["result"] is False
+        assert (
+            f"Пользователя с id {api_key} не существует"
+            == response.json()["error_message"]
+        )
+
+    async def test_successfully_response_with_mixed_operations(
+        self, client, db_session
+    ):
+        async_session = db_session()
+        api_key = "test"
+        user = await User.add_user(
+            async_session, user_id="test_id_31", name="Testname_31"
+        )
+        tweet_id = await Tweet.add_tweet(
+            async_session, author_id=user.id, content="Some tweet for batch test..."
+        )
+        own_tweet_id = await Tweet.add_tweet(
+            async_session, author_id=api_key, content="Own tweet for batch test..."
+        )
+        likes_before = await Like.get_likes_count(async_session)
+
+        response = client.post(
+            "/api/batch",
+            headers={"api-key": api_key},
+            json={
+                "operations": [
+                    {"action": "follow", "user_id": user.id},
+                    {"action": "follow", "user_id": user.id},
+                    {"action": "follow", "user_id": "test_id_32"},
+                    {"action": "like", "tweet_id": tweet_id},
+                    {"action": "like", "tweet_id": 100000},
+                    {"action": "delete", "tweet_id": own_tweet_id},
+                    {"action": "unfollow", "user_id": user.id},
+                ]
+            },
+        )
+        results = response.json()["results"]
+        assert response.status_code == 200
+        assert response.json()["result"] is True
+        assert [result["status_code"] for result in results] == [
+            201,
+            409,
+            404,
+            201,
+            404,
+            200,
+            200,
+        ]
+        assert await Like.get_likes_count(async_session) == likes_before + 1
+        assert own_tweet_id not in await Tweet.get_all_tweet_ids(async_session)
+
+        await User.delete_user(async_session, user_id=user.id)
@@ -2,6 +2,7 @@ import pytest
 
 from models.like import Like
 from models.tweet import Tweet
+from models.user import User
 
 
 @pytest.mark.usefixtures("client", "db_session")
@@ -48,7 +49,7 @@ class TestAddLikeRoute:
         response = client.post(
             f"/api/tweets/{tweet_id}/likes", headers={"api-key": api_key}
         )
-        assert response.status_code == 404
+        assert response.status_code == 401
         assert response.json()["result"] is False
         assert "HTTPException" in response.json()["error_type"]
         assert (
@@ -156,7 +157,7 @@ class TestDeleteLikeRoute:
         response = client.delete(
             f"/api/tweets/{tweet_id}/likes", headers={"api-key": api_key}
         )
-        assert response.status_code == 404
+        assert response.status_code == 401
         assert response.json()["result"] is False
         assert "HTTPException" in response.json()["error_type"]
         assert (
@@ -224,3 +225,59 @@ class TestDeleteLikeRoute:
         assert likes_count_before == await Like.get_likes_count(async_session)
 
         await Tweet.delete_tweet(async_session, tweet_id=tweet_id, author_id=api_key)
+
+
+@pytest.mark.usefixtures("client", "db_session")
+class TestGetLikesRoute:
+
+    def test_error_when_tweet_is_not_exist(self, client):
+        response = client.get("/api/tweets/1000000/likes", headers={"api-key": "test"})
+        assert response.status_code == 404
+        assert response.json()["result"] is False
+
+    async def test_likers_are_paginated_and_summarized_in_compact_feed(
+        self, client, db_session
+    ):
+        async_session = db_session()
+        api_key = "test"
+        user_ids = ["test_id_{}".format(number) for number in range(35, 40)]
+        tweet_id = await Tweet.add_tweet(
+            async_session, author_id=api_key, content="It's just for test..."
+        )
+
+        for number, user_id in enumerate(user_ids, start=35):
+            await User.add_user(
+                async_session, user_id=user_id, name="Testname_{}".format(number)
+            )
+            await Like.add_like(async_session, user_id=user_id, tweet_id=tweet_id)
+
+        likers, cursor = [], None
+        while True:
+            params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+            response = client.get(
+                f"/api/tweets/{tweet_id}/likes",
+                headers={"api-key": api_key},
+                params=params,
+            )
+            assert response.status_code == 200
+            likers.extend(like["user_id"] for like in response.json()["likes"])
+            cursor = response.json()["next_cursor"]
+            if cursor is None:
+                break
+        assert sorted(likers) == user_ids
+
+        response = client.get(
+            "/api/tweets", headers={"api-key": api_key}, params={"compact": "true"}
+        )
+        assert response.status_code == 200
+        tweet = next(
+            tweet for tweet in response.json()["tweets"] if tweet["id"] == tweet_id
+        )
+        assert tweet["likes_count"] == len(user_ids)
+        assert tweet["liked_by_me"] is False
+        assert 0 < len(tweet["sample_likers"]) <= 3
+        assert "likes" not in tweet
+
+        for user_id in user_ids:
+            await User.delete_user(async_session, user_id=user_id)
+        await Tweet.delete_tweet(async_session, tweet_id=tweet_id, author_id=api_key)
@@ -3,6 +3,7 @@ from pathlib import Path
 import pytest
 
 from models.image import Image
+from utility.media_cache import MEDIA_CACHE_PATH
 
 
 @pytest.mark.usefixtures("client", "db_session")
@@ -40,3 +41,82 @@ class TestPostImageRoute:
         assert (
             "В запросе отсутствует файл изображения" == response.json()["error_message"]
         )
+
+    def test_error_when_image_format_is_not_supported(self, client):
+        from io import BytesIO
+
+        from PIL import Image as PillowImage
+
+        icon = BytesIO()
+        PillowImage.new("RGB", (16, 16)).save(icon, format="ICO")
+        file = {"file": ("image.jpg", icon.getvalue(), "image/jpeg")}
+
+        response = client.post("/api/medias", files=file)
+        assert response.status_code == 422
+        assert response.json()["error_message"] == (
+            "Формат изображения ICO не поддерживается"
+        )
+
+    async def test_image_metadata_is_read_from_content(self, client, db_session):
+        from io import BytesIO
+
+        from PIL import Image as PillowImage
+
+        png = BytesIO()
+        PillowImage.new("RGB", (3, 2)).save(png, format="PNG")
+        file = {"file": ("photo.jpg", png.getvalue(), "image/jpeg")}
+
+        response = client.post("/api/medias", files=file)
+        assert response.status_code == 201
+        image_id = response.json()["media_id"]
+
+        async_session = db_session()
+        async with async_session.begin():
+            image = await async_session.get(Image, image_id)
+        assert image.extension == "png"
+        assert image.media == {
+            "url": "images/{}/{}.png".format(image.folder.rstrip(), image_id),
+            "format": "PNG",
+            "width": 3,
+            "height": 2,
+            "bytes": len(png.getvalue()),
+        }
+
+        await Image.delete_image(async_session, image_id)
+
+    async def test_media_is_resized_and_cached(self, client, db_session):
+        from io import BytesIO
+
+        from PIL import Image as PillowImage
+
+        png = BytesIO()
+        PillowImage.new("RGB", (40, 20), "orange").save(png, format="PNG")
+        file = {"file": ("image.png", png.getvalue(), "image/png")}
+        image_id = client.post("/api/medias", files=file).json()["media_id"]
+
+        for _ in range(2):
+            response = client.get(
+                "/media/{}".format(image_id), params={"w": 10, "fmt": "png"}
+            )
+            assert response.status_code == 200
+            assert response.headers["content-type"] == "image/png"
+            with PillowImage.open(BytesIO(response.content)) as image:
+                assert image.size == (10, 5)
+
+        # Ширина больше ширины изображения заменяется ею и отдаёт тот же файл кэша
+        for width in (40, 100):
+            response = client.get(
+                "/media/{}".format(image_id), params={"w": width, "fmt": "png"}
+            )
+            assert response.status_code == 200
+            with PillowImage.open(BytesIO(response.content)) as image:
+                assert image.size == (40, 20)
+        assert sorted(
+            path.name for path in Path(MEDIA_CACHE_PATH, image_id).iterdir()
+        ) == ["10.png", "40.png"]
+
+        await Image.delete_image(db_session(), image_id)
+        response = client.get(
+            "/media/{}".format(image_id), params={"w": 10, "fmt": "png"}
+        )
+        assert response.status_code == 404
@@ -0,0 +1,63 @@
+import pytest
+
+from models.tweet import Tweet
+
+
+@pytest.mark.usefixtures("client", "db_session")
+class TestSearchRoute:
+
+    def test_error_when_requested_without_query(self, client):
+        response = client.get("/api/search", headers={"api-key": "test"})
+        assert response.status_code == 422
+        assert response.json()["result"] is False
+        assert "RequestValidationError" in response.json()["error_type"]
+        assert "Field required" in response.json()["error_message"]
+
+    def test_error_when_requested_with_invalid_cursor(self, client):
+        response = client.get(
+            "/api/search",
+            headers={"api-key": "test"},
+            params={"q": "кот", "cursor": "not-a-cursor"},
+        )
+        assert response.status_code == 422
+        assert response.json()["result"] is False
+        assert "HTTPException" in response.json()["error_type"]
+
+    async def test_successfully_response_with_ranked_pages(self, client, db_session):
+        async_session = db_session()
+        api_key = "test"
+        tweet_ids = [
+            await Tweet.add_tweet(
+                async_session,
+                author_id=api_key,
+                content="Рыжая лиса прыгает через ленивую собаку {}".format(number),
+            )
+            for number in range(3)
+        ]
+
+        response = client.get(
+            "/api/search",
+            headers={"api-key": api_key},
+            params={"q": "лиса", "limit": 2},
+        )
+        assert response.status_code == 200
+        assert response.json()["result"] is True
+        assert len(response.json()["tweets"]) == 2
+        assert "<b>" in response.json()["tweets"][0]["snippet"]
+
+        next_page = client.get(
+            "/api/search",
+            headers={"api-key": api_key},
+            params={"q": "лиса", "limit": 2, "cursor": response.json()["next_cursor"]},
+        )
+        assert next_page.status_code == 200
+        found_ids = [
+            tweet["id"]
+            for tweet in response.json()["tweets"] + next_page.json()["tweets"]
+        ]
+        assert sorted(found_ids) == sorted(tweet_ids)
+
+        for tweet_id in tweet_ids:
+            await Tweet.delete_tweet(
+                async_session, author_id=api_key, tweet_id=tweet_id
+            )
@@ -49,7 +49,7 @@ class TestFollowUserRoute:
         response = client.post(
             f"/api/users/{user_id}/follow", headers={"api-key": api_key}
         )
-        assert response.status_code == 404
+        assert response.status_code == 401
         assert response.json()["result"] is False
         assert "HTTPException" in response.json()["error_type"]
         assert (
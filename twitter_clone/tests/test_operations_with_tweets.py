@@ -3,7 +3,9 @@ from pathlib import Path
 import pytest
 
 from models.image import Image
+from models.like import Like
 from models.tweet import Tweet
+from models.user import User
 from utility.create_data import create_data
 
 
@@ -34,7 +36,7 @@ class TestGetTweetsRoute:
     def test_error_when_requested_with_not_exist_user(self, client):
         api_key = "test_id_14"
         response = client.get("/api/tweets", headers={"api-key": api_key})
-        assert response.status_code == 404
+        assert response.status_code == 401
         assert response.json()["result"] is False
         assert "HTTPException" in response.json()["error_type"]
         assert (
@@ -59,6 +61,128 @@ class TestGetTweetsRoute:
         assert response.json()["result"] is True
         assert len(response.json()["tweets"]) == 2
 
+    def test_not_modified_when_requested_with_actual_etag(self, client):
+        api_key = "test"
+        response = client.get("/api/tweets", headers={"api-key": api_key})
+        etag = response.headers["etag"]
+
+        response = client.get(
+            "/api/tweets", headers={"api-key": api_key, "if-none-match": etag}
+        )
+        assert response.status_code == 304
+        assert response.headers["etag"] == etag
+        assert response.content == b""
+
+    async def test_recent_feed_is_paginated_by_created_at_desc(
+        self, client, db_session
+    ):
+        async_session = db_session()
+        user = await User.add_user(
+            async_session, user_id="test_id_42", name="Testname_42"
+        )
+        tweet_ids = [
+            await Tweet.add_tweet(
+                async_session, author_id=user.id, content="It's just for test..."
+            )
+            for _ in range(3)
+        ]
+
+        pages, cursor = [], None
+        while True:
+            params = {"order": "recent", "limit": 2}
+            if cursor:
+                params["cursor"] = cursor
+            response = client.get(
+                "/api/tweets", headers={"api-key": user.id}, params=params
+            )
+            assert response.status_code == 200
+            pages.append(response.json()["tweets"])
+            cursor = response.json()["next_cursor"]
+            if cursor is None:
+                break
+
+        tweets = [tweet for page in pages for tweet in page]
+        assert [len(page) for page in pages] == [2, 1]
+        assert [tweet["id"] for tweet in tweets] == tweet_ids[::-1]
+
+        await User.delete_user(async_session, user_id=user.id)
+
+    async def test_recent_feed_merges_pushed_and_pulled_tweets(
+        self, client, db_session, monkeypatch
+    ):
+        monkeypatch.setattr("models.timeline.FEED_FANOUT_THRESHOLD", 2)
+        async_session = db_session()
+        users = [
+            await User.add_user(
+                async_session, user_id=f"test_id_{number}", name=f"Testname_{number}"
+            )
+            for number in (43, 44, 45)
+        ]
+        celebrity, author, reader = users
+        await User.follow(async_session, reader.id, celebrity.id)
+        await User.follow(async_session, author.id, celebrity.id)
+        await User.follow(async_session, reader.id, author.id)
+
+        tweet_ids = [
+            await Tweet.add_tweet(
+                async_session,
+                author_id=celebrity.id if number % 2 else author.id,
+                content="It's just for test...",
+            )
+            for number in range(4)
+        ]
+
+        def get_feed_ids():
+            response = client.get(
+                "/api/tweets",
+                headers={"api-key": reader.id},
+                params={"order": "recent", "limit": 10},
+            )
+            assert response.status_code == 200
+            return [tweet["id"] for tweet in response.json()["tweets"]]
+
+        # Твиты автора с одним подписчиком записаны в ленту, твиты автора с двумя - читаются из таблицы твитов
+        assert get_feed_ids() == tweet_ids[::-1]
+
+        await User.unfollow(async_session, reader.id, author.id)
+        assert get_feed_ids() == tweet_ids[1::2][::-1]
+
+        await User.follow(async_session, reader.id, author.id)
+        assert get_feed_ids() == tweet_ids[::-1]
+
+        for user in users:
+            await User.delete_user(async_session, user_id=user.id)
+
+    async def test_follow_backfills_only_recent_tweets_of_author(
+        self, client, db_session, monkeypatch
+    ):
+        monkeypatch.setattr("models.timeline.FEED_FOLLOW_BACKFILL", 2)
+        async_session = db_session()
+        author, reader = [
+            await User.add_user(
+                async_session, user_id=f"test_id_{number}", name=f"Testname_{number}"
+            )
+            for number in (49, 50)
+        ]
+        tweet_ids = [
+            await Tweet.add_tweet(
+                async_session, author_id=author.id, content="It's just for test..."
+            )
+            for _ in range(3)
+        ]
+
+        await User.follow(async_session, reader.id, author.id)
+        response = client.get(
+            "/api/tweets",
+            headers={"api-key": reader.id},
+            params={"order": "recent", "limit": 10},
+        )
+        assert response.status_code == 200
+        assert [tweet["id"] for tweet in response.json()["tweets"]] == tweet_ids[:0:-1]
+
+        for user in (author, reader):
+            await User.delete_user(async_session, user_id=user.id)
+
 
 @pytest.mark.usefixtures("client", "db_session")
 class TestAddTweetRoute:
@@ -216,7 +340,7 @@ class TestAddTweetRoute:
             headers={"api-key": api_key},
             json={"tweet_data": tweet_data, "tweet_media_ids": tweet_media_ids},
         )
-        assert response.status_code == 404
+        assert response.status_code == 401
         assert response.json()["result"] is False
         assert "HTTPException" in response.json()["error_type"]
         assert (
@@ -274,6 +398,47 @@ class TestAddTweetRoute:
                 async_session, author_id=api_key, tweet_id=tweet_id
             )
 
+    async def test_error_when_posted_with_images_of_another_tweet(
+        self, client, db_session
+    ):
+        api_key = "test"
+        tweet_data = "It's just another text with medias for test..."
+
+        await create_data(db_session, images_count=2)
+        async_session = db_session()
+        tweet_media_ids = await Image.get_all_image_ids(async_session)
+
+        first_response = client.post(
+            "/api/tweets",
+            headers={"api-key": api_key},
+            json={"tweet_data": tweet_data, "tweet_media_ids": tweet_media_ids[:1]},
+        )
+        assert first_response.status_code == 201
+
+        all_tweets_before = await Tweet.get_all_tweet_ids(async_session)
+        response = client.post(
+            "/api/tweets",
+            headers={"api-key": api_key},
+            json={"tweet_data": tweet_data, "tweet_media_ids": tweet_media_ids},
+        )
+        all_tweets_after = await Tweet.get_all_tweet_ids(async_session)
+        assert response.status_code == 409
+        assert response.json()["result"] is False
+        assert str(tweet_media_ids[:1]) in response.json()["error_message"]
+        assert all_tweets_before == all_tweets_after
+
+        first_tweet: Tweet = await Tweet.get_tweet_by_id(
+            async_session, first_response.json()["tweet_id"]
+        )
+        assert [media.id for media in first_tweet.tweet_media_ids] == tweet_media_ids[
+            :1
+        ]
+
+        for tweet_id in all_tweets_after:
+            await Tweet.delete_tweet(
+                async_session, author_id=api_key, tweet_id=tweet_id
+            )
+
 
 @pytest.mark.usefixtures("client", "db_session")
 class TestDeleteTweetRoute:
@@ -326,7 +491,7 @@ class TestDeleteTweetRoute:
             f"/api/tweets/{tweet_id}", headers={"api-key": api_key}
         )
 
-        assert response.status_code == 404
+        assert response.status_code == 401
         assert response.json()["result"] is False
         assert "HTTPException" in response.json()["error_type"]
         assert (
@@ -361,3 +526,49 @@ class TestDeleteTweetRoute:
         assert response.status_code == 200
         assert response.json()["result"] is True
         assert len(all_tweets_before) == len(all_tweets_after) + 1
+
+
+@pytest.mark.usefixtures("client", "db_session")
+class TestUserTweetsRoute:
+
+    def test_error_when_user_is_not_exist(self, client):
+        response = client.get(
+            "/api/users/test_id_40/tweets", headers={"api-key": "test"}
+        )
+        assert response.status_code == 404
+        assert response.json()["result"] is False
+
+    async def test_user_tweets_are_paginated_by_id_desc(self, client, db_session):
+        async_session = db_session()
+        user = await User.add_user(
+            async_session, user_id="test_id_41", name="Testname_41"
+        )
+        tweet_ids = [
+            await Tweet.add_tweet(
+                async_session, author_id=user.id, content="It's just for test..."
+            )
+            for _ in range(5)
+        ]
+        await Like.add_like(async_session, user_id="test", tweet_id=tweet_ids[0])
+
+        pages, cursor = [], None
+        while True:
+            params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+            response = client.get(
+                f"/api/users/{user.id}/tweets",
+                headers={"api-key": "test"},
+                params=params,
+            )
+            assert response.status_code == 200
+            pages.append(response.json()["tweets"])
+            cursor = response.json()["next_cursor"]
+            if cursor is None:
+                break
+
+        tweets = [tweet for page in pages for tweet in page]
+        assert [len(page) for page in pages] == [2, 2, 1]
+        assert [tweet["id"] for tweet in tweets] == sorted(tweet_ids, reverse=True)
+        assert tweets[-1]["likes_count"] == 1
+        assert tweets[-1]["liked_by_me"] is True
+
+        await User.delete_user(async_session, user_id=user.id)
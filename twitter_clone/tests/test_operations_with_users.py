@@ -154,7 +154,7 @@ class TestMyProfileInfoRoute:
     async def test_error_when_requested_not_exist_my_user_id(self, client):
         user_id = "test123"
         response = client.get(url="/api/users/me", headers={"api-key": user_id})
-        assert response.status_code == 404
+        assert response.status_code == 401
         assert response.json()["result"] is False
         assert "HTTPException" in response.json()["error_type"]
         assert (
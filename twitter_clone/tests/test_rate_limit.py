@@ -0,0 +1,106 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from rate_limit import (
+    MemoryRateLimitBackend,
+    RateLimit,
+    RateLimitMiddleware,
+    parse_rate_limit_rules,
+)
+
+
+def test_parse_rate_limit_rules():
+    assert parse_rate_limit_rules("post /api/tweets=30/60, GET /api/tweets=2/1") == {
+        ("POST", "/api/tweets"): RateLimit(30, 60),
+        ("GET", "/api/tweets"): RateLimit(2, 1),
+    }
+
+
+async def test_bucket_refills_and_idle_keys_evicted(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("rate_limit.time.monotonic", lambda: now[0])
+    backend = MemoryRateLimitBackend()
+    limit = RateLimit(2, 10)
+
+    assert await backend.acquire("first", limit) == 0
+    assert await backend.acquire("first", limit) == 0
+    assert await backend.acquire("first", limit) == 5
+
+    now[0] += 5
+    assert await backend.acquire("first", limit) == 0
+
+    now[0] += 100
+    await backend.acquire("second", limit)
+    assert len(backend) == 1
+
+
+def test_middleware_returns_429_with_retry_after():
+    app = FastAPI()
+
+    @app.post("/api/tweets")
+    async def add_tweet():
+        return {"result": True}
+
+    app.add_middleware(
+        RateLimitMiddleware,
+        backend=MemoryRateLimitBackend(),
+        rules="POST /api/tweets=1/60",
+        enabled=True,
+        is_known_key=lambda api_key: api_key in ("test", "other"),
+    )
+    client = TestClient(app)
+
+    assert client.post("/api/tweets", headers={"api-key": "test"}).status_code == 200
+    assert client.post("/api/tweets", headers={"api-key": "other"}).status_code == 200
+
+    response = client.post("/api/tweets", headers={"api-key": "test"})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "60"
+    assert response.json()["result"] is False
+
+    assert client.post("/api/tweets").status_code == 200
+    assert client.post("/api/tweets").status_code == 429
+
+
+def test_unknown_api_keys_are_limited_by_ip():
+    app = FastAPI()
+
+    @app.post("/api/medias")
+    async def post_image():
+        return {"result": True}
+
+    app.add_middleware(
+        RateLimitMiddleware,
+        backend=MemoryRateLimitBackend(),
+        rules="POST /api/medias=2/60",
+        enabled=True,
+        is_known_key=lambda api_key: api_key == "test",
+    )
+    client = TestClient(app)
+
+    for number in range(2):
+        response = client.post("/api/medias", headers={"api-key": f"fake_{number}"})
+        assert response.status_code == 200
+    assert client.post("/api/medias", headers={"api-key": "fake_2"}).status_code == 429
+    assert client.post("/api/medias", headers={"api-key": "test"}).status_code == 200
+
+
+def test_prefix_rule_limits_all_paths_in_one_bucket():
+    app = FastAPI()
+
+    @app.get("/media/{image_id}")
+    async def get_media(image_id: str):
+        return {"result": True}
+
+    app.add_middleware(
+        RateLimitMiddleware,
+        backend=MemoryRateLimitBackend(),
+        rules="GET /media/*=2/60",
+        enabled=True,
+    )
+    client = TestClient(app)
+
+    assert client.get("/media/first").status_code == 200
+    assert client.get("/media/second").status_code == 200
+    assert client.get("/media/third").status_code == 429
+    assert client.get("/api/media/first").status_code == 404
@@ -0,0 +1,82 @@
+import asyncio
+from functools import partial
+
+from utility.single_flight import SingleFlight
+
+
+async def test_concurrent_calls_share_one_computation():
+    single_flight = SingleFlight(window=0)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return b"payload"
+
+    results = await asyncio.gather(
+        *(single_flight.do(("feed", "test"), compute) for _ in range(5))
+    )
+
+    assert results == [b"payload"] * 5
+    assert len(calls) == 1
+    assert len(single_flight) == 0
+
+
+async def test_result_reused_within_window_and_errors_not_cached():
+    single_flight = SingleFlight(window=0.05)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return len(calls)
+
+    async def fail():
+        raise ValueError
+
+    assert await single_flight.do("key", compute) == 1
+    assert await single_flight.do("key", compute) == 1
+    await asyncio.sleep(0.06)
+    assert await single_flight.do("key", compute) == 2
+
+    for _ in range(2):
+        try:
+            await single_flight.do("error", fail)
+        except ValueError:
+            pass
+    assert len(single_flight) == 1
+
+
+async def test_cancelled_first_caller_does_not_close_shared_session(monkeypatch):
+    import main
+
+    sessions = []
+
+    class FakeSession:
+        closed = False
+
+        async def __aenter__(self):
+            sessions.append(self)
+            return self
+
+        async def __aexit__(self, *exc_info):
+            self.closed = True
+
+    async def compute(db_async_session):
+        await asyncio.sleep(0.01)
+        assert not db_async_session.closed
+        return b"payload"
+
+    monkeypatch.setattr(main, "AsyncSessionLocal", FakeSession)
+    single_flight = SingleFlight(window=0)
+    first, second = [
+        asyncio.ensure_future(
+            single_flight.do("key", partial(main.run_in_own_session, compute))
+        )
+        for _ in range(2)
+    ]
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert await second == b"payload"
+    assert len(sessions) == 1
+    assert sessions[0].closed
@@ -0,0 +1,20 @@
+import subprocess
+import sys
+
+from benchmarks.startup import LAZY_MODULES
+
+
+def test_heavy_modules_not_imported_on_startup():
+    completed = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, main; print(*(m for m in {} if m in sys.modules))".format(
+                LAZY_MODULES
+            ),
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert completed.stdout.splitlines()[-1].strip() == ""
@@ -0,0 +1,59 @@
+import pytest
+
+from storage import LocalStorageBackend, S3StorageBackend, iter_chunks
+
+PART_SIZE = 5 * 1024 * 1024
+
+
+@pytest.fixture(scope="module")
+def minio():
+    from testcontainers.minio import MinioContainer
+
+    with MinioContainer() as container:
+        container.get_client().make_bucket("twitter-media")
+        yield container.get_config()
+
+
+async def test_local_storage_saves_loads_and_deletes_files(tmp_path):
+    storage = LocalStorageBackend(tmp_path, "images/")
+
+    await storage.save("2024-01-01/a.webp", b"image")
+    await storage.save("2024-01-01/b.webp", iter_chunks(b"streamed image", 4))
+
+    assert storage.url("2024-01-01/a.webp") == "images/2024-01-01/a.webp"
+    assert await storage.load("2024-01-01/a.webp") == b"image"
+    assert await storage.load("2024-01-01/b.webp") == b"streamed image"
+
+    await storage.delete("2024-01-01/a.webp")
+    await storage.delete("2024-01-01/b.webp")
+    await storage.delete("2024-01-01/b.webp")
+
+    assert await storage.load("2024-01-01/a.webp") is None
+    assert not (tmp_path / "2024-01-01").exists()
+
+
+async def test_s3_storage_uploads_large_files_in_parts(minio):
+    storage = S3StorageBackend(
+        "images/",
+        bucket="twitter-media",
+        endpoint_url="http://{}".format(minio["endpoint"]),
+        access_key_id=minio["access_key"],
+        secret_access_key=minio["secret_key"],
+        part_size=PART_SIZE,
+    )
+    large_image = bytes(range(256)) * (PART_SIZE * 2 // 256 + 1)
+
+    try:
+        await storage.save("2024-01-01/small.webp", b"image")
+        await storage.save("2024-01-01/large.webp", iter_chunks(large_image, 65536))
+
+        assert storage.url("2024-01-01/small.webp") == "http://{}/{}".format(
+            minio["endpoint"], "twitter-media/images/2024-01-01/small.webp"
+        )
+        assert await storage.load("2024-01-01/small.webp") == b"image"
+        assert await storage.load("2024-01-01/large.webp") == large_image
+
+        await storage.delete("2024-01-01/large.webp")
+        assert await storage.load("2024-01-01/large.webp") is None
+    finally:
+        await storage.close()
@@ -0,0 +1,59 @@
+from events import Event
+from utility.trending import TrendingRanking
+
+
+def test_recent_likes_outweigh_older_likes(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr("utility.trending.time.time", lambda: now[0])
+    ranking = TrendingRanking(half_life_seconds=3600, capacity=100)
+
+    ranking.add_like(1, likes_count=3, count=3)
+    now[0] += 3 * 3600
+    ranking.add_like(2, likes_count=1)
+
+    assert ranking.top_ids(2) == [2, 1]
+
+
+def test_events_update_ranking():
+    ranking = TrendingRanking(half_life_seconds=3600, capacity=100)
+    ranking.on_event(Event("like_added", {"tweet_id": 1, "likes_count": 1}))
+    ranking.on_event(Event("like_added", {"tweet_id": 2, "likes_count": 1}))
+    ranking.on_event(Event("like_added", {"tweet_id": 2, "likes_count": 2}))
+    assert ranking.top_ids(2) == [2, 1]
+
+    ranking.on_event(Event("tweet_deleted", {"tweet_id": 2}))
+    ranking.on_event(Event("like_deleted", {"tweet_id": 1, "likes_count": 0}))
+    assert ranking.top_ids(2) == []
+
+
+def test_rebase_keeps_order_and_capacity(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr("utility.trending.time.time", lambda: now[0])
+    ranking = TrendingRanking(half_life_seconds=60, capacity=2)
+
+    for tweet_id in range(1, 4):
+        ranking.add_like(tweet_id, count=tweet_id)
+
+    now[0] += 3600
+    ranking.rebase()
+    assert ranking.top_ids(3) == [3, 2]
+
+
+def test_removed_like_subtracts_average_contribution(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr("utility.trending.time.time", lambda: now[0])
+    ranking = TrendingRanking(half_life_seconds=3600, capacity=100)
+
+    ranking.add_like(1, likes_count=4, count=4)
+    ranking.add_like(2, likes_count=1)
+    now[0] += 3 * 3600
+    ranking.remove_like(1, likes_count=3)
+
+    assert ranking.top_ids(2) == [1, 2]
+
+    ranking.remove_like(1)
+    ranking.remove_like(1)
+    assert set(ranking.top_ids(2)) == {1, 2}
+
+    ranking.remove_like(1)
+    assert ranking.top_ids(2) == [2]
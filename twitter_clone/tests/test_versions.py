@@ -0,0 +1,43 @@
+from cache import MemoryCacheBackend
+from events import Event
+from utility.versions import VersionRegistry
+
+
+async def fake_following_ids(db_async_session, user_id):
+    return {"reader": ["author"]}.get(user_id, [])
+
+
+async def test_feed_etag_changes_on_followed_author_events(monkeypatch):
+    monkeypatch.setattr("utility.versions.User.get_following_ids", fake_following_ids)
+    registry = VersionRegistry(MemoryCacheBackend())
+    etag = await registry.get_feed_etag(None, "reader")
+
+    await registry.on_event(Event("tweet_added", {"author_id": "stranger"}))
+    assert await registry.get_feed_etag(None, "reader") == etag
+
+    await registry.on_event(Event("like_added", {"author_id": "author"}))
+    assert await registry.get_feed_etag(None, "reader") != etag
+
+
+async def test_profile_etag_changes_on_follow_events():
+    registry = VersionRegistry(MemoryCacheBackend())
+    author_etag = await registry.get_profile_etag("author")
+    stranger_etag = await registry.get_profile_etag("stranger")
+
+    await registry.on_event(
+        Event("follow", {"follower_user_id": "reader", "following_user_id": "author"})
+    )
+    assert await registry.get_profile_etag("author") != author_etag
+    assert await registry.get_profile_etag("stranger") == stranger_etag
+
+
+async def test_registries_sharing_backend_return_same_etag():
+    backend = MemoryCacheBackend()
+    first, second = VersionRegistry(backend), VersionRegistry(backend)
+
+    await first.on_event(
+        Event("follow", {"follower_user_id": "reader", "following_user_id": "author"})
+    )
+    assert await first.get_profile_etag("author") == await second.get_profile_etag(
+        "author"
+    )
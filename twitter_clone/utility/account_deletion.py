@@ -0,0 +1,384 @@
+import asyncio
+import hmac
+import json
+import os
+import secrets
+import socket
+import time
+from functools import partial
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from cache import CacheBackend, cache_backend
+from config import (
+    ACCOUNT_DELETION_BATCH_SIZE,
+    ACCOUNT_DELETION_PAUSE_SECONDS,
+    ACCOUNT_DELETION_PROGRESS_TTL_SECONDS,
+    ACCOUNT_DELETION_STALE_SECONDS,
+)
+from events import broker
+from logger import logger
+from models.archive import ArchivedLike, ArchivedTweet
+from models.image import Image
+from models.like import Like
+from models.timeline import Timeline
+from models.tweet import Tweet
+from models.user import User
+
+# Этапы удаления в порядке выполнения
+STAGES = (
+    "likes",
+    "archived_likes",
+    "follows",
+    "timeline",
+    "tweets",
+    "archived_tweets",
+    "user",
+)
+
+# Процесс, выполняющий удаление: записывается в ход удаления вместе со временем последнего обновления
+OWNER = "{}:{}".format(socket.gethostname(), os.getpid())
+
+
+class AccountDeletion:
+    """
+    Фоновое удаление аккаунта пользователя. Лайки, подписки, лента, твиты и архивные твиты удаляются пакетами
+    не более batch_size строк, каждый пакет - в отдельной короткой транзакции, с паузой между пакетами,
+    поэтому удаление активного пользователя не блокирует надолго строки общих таблиц.
+    Файлы изображений удаляются из хранилища после фиксации пакета. Последней удаляется строка пользователя,
+    каскадные ограничения при этом удаляют только данные, добавленные во время работы задачи.
+    Ход удаления хранится в хранилище кэшей, поэтому доступен во всех воркерах. Выполняющаяся задача обновляет
+    в нём время последнего обновления, поэтому удаление, прерванное падением воркера, запускается повторно.
+    После удаления пользователя api-key уже не проверяется по БД, поэтому ход удаления выдаётся только по ключу,
+    который получил запустивший удаление пользователь
+    """
+
+    def __init__(
+        self,
+        backend: CacheBackend = cache_backend,
+        batch_size: int = ACCOUNT_DELETION_BATCH_SIZE,
+        pause: float = ACCOUNT_DELETION_PAUSE_SECONDS,
+        stale_after: float = ACCOUNT_DELETION_STALE_SECONDS,
+    ) -> None:
+        self.__backend = backend
+        self.__batch_size = batch_size
+        self.__pause = pause
+        self.__stale_after = stale_after
+        self.__tasks: Dict[str, asyncio.Task] = {}
+        self.__progress: Dict[str, Dict[str, Any]] = {}
+
+    @staticmethod
+    def progress_key(user_id: str) -> str:
+        return "deletion:{}".format(user_id)
+
+    async def __load(self, user_id: str) -> Optional[Dict[str, Any]]:
+        progress = await self.__backend.get(self.progress_key(user_id))
+        return json.loads(progress) if progress is not None else None
+
+    async def get_progress(self, user_id: str, token: str) -> Optional[Dict[str, Any]]:
+        """
+        Функция, возвращающая ход удаления аккаунта
+
+        :param user_id: id пользователя
+        :param token: ключ, выданный при запуске удаления
+        :return: словарь с состоянием, этапом и количеством удалённых записей или None, если удаление
+            не запускалось или ключ не совпадает
+        """
+        progress = await self.__load(user_id)
+        expected_token = progress.pop("token", None) if progress is not None else None
+
+        if expected_token is None or not hmac.compare_digest(
+            expected_token.encode(), token.encode()
+        ):
+            return None
+        return progress
+
+    async def __save(self, user_id: str, progress: Dict[str, Any]) -> None:
+        # Ход выполняющегося удаления хранится без ограничения времени, чтобы он не истёк во время работы задачи
+        running = progress["status"] == "running"
+        progress["heartbeat"] = time.time()
+        await self.__backend.set(
+            self.progress_key(user_id),
+            json.dumps(progress).encode(),
+            ttl=None if running else ACCOUNT_DELETION_PROGRESS_TTL_SECONDS,
+        )
+
+    def __is_alive(self, progress: Dict[str, Any]) -> bool:
+        """
+        Функция, проверяющая, выполняется ли удаление с сохранённым состоянием running. Задачу этого процесса
+        проверяет вызывающая функция, задача другого воркера считается живой, пока она обновляет ход удаления
+
+        :param progress: сохранённый ход удаления
+        :return: True, если удаление выполняет другой живой процесс
+        """
+        if progress.get("owner") == OWNER:
+            return False
+        return time.time() - progress.get("heartbeat", 0) < self.__stale_after
+
+    async def start(
+        self, user_id: str, async_session_local: sessionmaker
+    ) -> Dict[str, Any]:
+        """
+        Функция, запускающая удаление аккаунта в фоновой задаче. Повторный запрос во время удаления
+        не запускает вторую задачу и возвращает текущий ход удаления. Удаление, задача которого
+        завершилась без сохранения результата, запускается заново с прежним ключом хода удаления
+
+        :param user_id: id пользователя
+        :param async_session_local: фабрика асинхронных сессий подключения к БД
+        :return: ход удаления с ключом token для запроса хода удаления
+        """
+        if user_id in self.__tasks:
+            progress = self.__progress[user_id]
+            # Ход удаления мог быть вытеснен из хранилища кэшей
+            if await self.__load(user_id) is None:
+                await self.__save(user_id, progress)
+            return progress
+
+        progress = await self.__load(user_id)
+
+        if progress is not None and progress["status"] == "running":
+            if self.__is_alive(progress):
+                return progress
+
+            logger.warning(
+                "Перезапуск прерванного удаления аккаунта: id пользователя = {}".format(
+                    user_id
+                )
+            )
+            token = progress["token"]
+        else:
+            token = secrets.token_urlsafe(32)
+
+        progress = {
+            "status": "running",
+            "stage": STAGES[0],
+            "deleted": {"likes": 0, "follows": 0, "tweets": 0, "images": 0},
+            "error": None,
+            "token": token,
+            "owner": OWNER,
+        }
+        await self.__save(user_id, progress)
+        logger.info("Запуск удаления аккаунта: id пользователя = {}".format(user_id))
+
+        task = asyncio.create_task(self.__run(user_id, async_session_local, progress))
+        self.__tasks[user_id] = task
+        self.__progress[user_id] = progress
+        task.add_done_callback(lambda _: self.__forget(user_id))
+        return progress
+
+    def __forget(self, user_id: str) -> None:
+        self.__tasks.pop(user_id, None)
+        self.__progress.pop(user_id, None)
+
+    async def __next_batch(self, user_id: str, progress: Dict[str, Any]) -> None:
+        await self.__save(user_id, progress)
+        await asyncio.sleep(self.__pause)
+
+    async def __delete_likes(
+        self,
+        db_async_session: AsyncSession,
+        user_id: str,
+        progress: Dict[str, Any],
+        archived: bool = False,
+    ) -> None:
+        like_model = ArchivedLike if archived else Like
+
+        while True:
+            async with db_async_session.begin():
+                tweet_ids = await like_model.delete_user_likes_batch(
+                    db_async_session, user_id, self.__batch_size
+                )
+                summary = (
+                    await Like.get_likes_summary(db_async_session, tweet_ids, archived)
+                    if tweet_ids
+                    else {}
+                )
+
+            if not tweet_ids:
+                return
+
+            await Like.publish_likes_event("like_deleted", user_id, summary)
+            progress["deleted"]["likes"] += len(tweet_ids)
+            await self.__next_batch(user_id, progress)
+
+    async def __delete_follows(
+        self, db_async_session: AsyncSession, user_id: str, progress: Dict[str, Any]
+    ) -> None:
+        while True:
+            async with db_async_session.begin():
+                follows = await User.delete_follows_batch(
+                    db_async_session, user_id, self.__batch_size
+                )
+
+            if not follows:
+                return
+
+            for follower_user_id, following_user_id in follows:
+                await broker.publish(
+                    "unfollow",
+                    follower_user_id=follower_user_id,
+                    following_user_id=following_user_id,
+                )
+            progress["deleted"]["follows"] += len(follows)
+            await self.__next_batch(user_id, progress)
+
+    async def __delete_timeline(
+        self, db_async_session: AsyncSession, user_id: str, progress: Dict[str, Any]
+    ) -> None:
+        while True:
+            async with db_async_session.begin():
+                deleted = await Timeline.delete_user_timeline_batch(
+                    db_async_session, user_id, self.__batch_size
+                )
+            if deleted < self.__batch_size:
+                return
+            await self.__next_batch(user_id, progress)
+
+    async def __delete_tweets(
+        self, db_async_session: AsyncSession, user_id: str, progress: Dict[str, Any]
+    ) -> None:
+        while True:
+            async with db_async_session.begin():
+                tweet_ids = await Tweet.get_author_tweet_ids(
+                    db_async_session, user_id, self.__batch_size
+                )
+
+            if not tweet_ids:
+                return
+
+            # Лайки популярных твитов и записи твитов в лентах подписчиков удаляются отдельными пакетами,
+            # чтобы удаление твитов не превращалось в одно каскадное удаление неограниченного числа строк
+            for delete_batch in (
+                Like.delete_tweets_likes_batch,
+                Timeline.delete_tweets_batch,
+            ):
+                while True:
+                    async with db_async_session.begin():
+                        deleted = await delete_batch(
+                            db_async_session, tweet_ids, self.__batch_size
+                        )
+                    if deleted < self.__batch_size:
+                        break
+                    await self.__next_batch(user_id, progress)
+
+            async with db_async_session.begin():
+                deleted_ids, image_paths = await Tweet.delete_many(
+                    db_async_session, author_id=user_id, tweet_ids=tweet_ids
+                )
+
+            await self.__finish_tweets_batch(
+                user_id, progress, deleted_ids, image_paths
+            )
+
+    async def __delete_archived_tweets(
+        self, db_async_session: AsyncSession, user_id: str, progress: Dict[str, Any]
+    ) -> None:
+        while True:
+            async with db_async_session.begin():
+                tweet_ids = await ArchivedTweet.get_author_tweet_ids(
+                    db_async_session, user_id, self.__batch_size
+                )
+
+            if not tweet_ids:
+                return
+
+            while True:
+                async with db_async_session.begin():
+                    deleted = await ArchivedLike.delete_tweets_likes_batch(
+                        db_async_session, tweet_ids, self.__batch_size
+                    )
+                if deleted < self.__batch_size:
+                    break
+                await self.__next_batch(user_id, progress)
+
+            async with db_async_session.begin():
+                deleted_ids, image_keys = await ArchivedTweet.delete_many(
+                    db_async_session, author_id=user_id, tweet_ids=tweet_ids
+                )
+
+            await self.__finish_tweets_batch(user_id, progress, deleted_ids, image_keys)
+
+    async def __finish_tweets_batch(
+        self,
+        user_id: str,
+        progress: Dict[str, Any],
+        deleted_ids: Set[int],
+        image_keys: List[str],
+    ) -> None:
+        for image_key in image_keys:
+            try:
+                await Image.delete_image_files(image_key)
+            except Exception as exc:
+                logger.warning(
+                    "Не удалось удалить файл изображения {}: {}".format(image_key, exc)
+                )
+
+        for tweet_id in deleted_ids:
+            await broker.publish("tweet_deleted", tweet_id=tweet_id, author_id=user_id)
+        progress["deleted"]["tweets"] += len(deleted_ids)
+        progress["deleted"]["images"] += len(image_keys)
+        await self.__next_batch(user_id, progress)
+
+    async def __run(
+        self,
+        user_id: str,
+        async_session_local: sessionmaker,
+        progress: Dict[str, Any],
+    ) -> None:
+        stages = {
+            "likes": self.__delete_likes,
+            "archived_likes": partial(self.__delete_likes, archived=True),
+            "follows": self.__delete_follows,
+            "timeline": self.__delete_timeline,
+            "tweets": self.__delete_tweets,
+            "archived_tweets": self.__delete_archived_tweets,
+        }
+
+        try:
+            async with async_session_local() as db_async_session:
+                for stage in STAGES:
+                    progress["stage"] = stage
+                    await self.__save(user_id, progress)
+
+                    if stage in stages:
+                        await stages[stage](db_async_session, user_id, progress)
+                    else:
+                        await User.delete_user(db_async_session, user_id)
+
+            progress["status"] = "completed"
+            logger.info(
+                "Аккаунт удалён: id пользователя = {}, удалено = {}".format(
+                    user_id, progress["deleted"]
+                )
+            )
+        except asyncio.CancelledError:
+            progress["status"] = "interrupted"
+            logger.warning(
+                "Удаление аккаунта прервано: id пользователя = {}".format(user_id)
+            )
+            raise
+        except Exception as exc:
+            progress["status"] = "failed"
+            progress["error"] = str(exc)
+            logger.exception(
+                "Ошибка удаления аккаунта: id пользователя = {}, {}".format(
+                    user_id, exc
+                )
+            )
+        finally:
+            await self.__save(user_id, progress)
+
+    async def shutdown(self) -> None:
+        """
+        Функция, прерывающая незавершённые удаления при остановке приложения. Прерванное удаление
+        можно запустить повторно: уже удалённые данные не восстанавливаются
+        """
+        tasks = list(self.__tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+account_deletion = AccountDeletion()
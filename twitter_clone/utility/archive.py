@@ -0,0 +1,66 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.orm import sessionmaker
+
+from config import (
+    TWEETS_ARCHIVE_AFTER_DAYS,
+    TWEETS_ARCHIVE_BATCH_SIZE,
+    TWEETS_ARCHIVE_INTERVAL_SECONDS,
+)
+from events import broker
+from logger import logger
+from models.archive import ArchivedTweet
+
+
+async def archive_old_tweets(
+    async_session_local: sessionmaker,
+    after_days: float = TWEETS_ARCHIVE_AFTER_DAYS,
+    batch_size: int = TWEETS_ARCHIVE_BATCH_SIZE,
+) -> int:
+    """
+    Функция, переносящая в архив все твиты старше after_days дней. Каждый пакет из batch_size твитов
+    переносится в отдельной транзакции
+
+    :param async_session_local: фабрика асинхронных сессий подключения к БД
+    :param after_days: возраст твитов в днях
+    :param batch_size: количество твитов в одной транзакции
+    :return: количество перенесённых твитов
+    """
+    created_before = datetime.now(timezone.utc) - timedelta(days=after_days)
+    archived_count = 0
+
+    async with async_session_local() as db_async_session:
+        while True:
+            async with db_async_session.begin():
+                archived = await ArchivedTweet.archive_tweets(
+                    db_async_session, created_before, batch_size
+                )
+
+            for tweet_id, author_id in archived:
+                await broker.publish(
+                    "tweet_archived", tweet_id=tweet_id, author_id=author_id
+                )
+            archived_count += len(archived)
+
+            if len(archived) < batch_size:
+                break
+
+    if archived_count:
+        logger.info("Перенесено в архив твитов: {}".format(archived_count))
+    return archived_count
+
+
+async def archive_tweets_periodically(async_session_local: sessionmaker) -> None:
+    """
+    Фоновая задача, периодически переносящая старые твиты в архив. Задача может работать
+    во всех воркерах одновременно: твиты, заблокированные другим воркером, пропускаются
+
+    :param async_session_local: фабрика асинхронных сессий подключения к БД
+    """
+    while True:
+        try:
+            await archive_old_tweets(async_session_local)
+        except Exception as exc:
+            logger.exception("Ошибка переноса твитов в архив: {}".format(exc))
+        await asyncio.sleep(TWEETS_ARCHIVE_INTERVAL_SECONDS)
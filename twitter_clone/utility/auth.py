@@ -0,0 +1,92 @@
+import time
+from collections import OrderedDict
+from typing import Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import (
+    AUTH_CACHE_MAX_KEYS,
+    AUTH_NEGATIVE_TTL_SECONDS,
+    AUTH_POSITIVE_TTL_SECONDS,
+)
+from events import Event
+from logger import logger
+from models.user import User
+
+
+class AuthCache:
+    """
+    Кэш проверки ключей api-key. Известные и неизвестные ключи хранятся с разным временем жизни,
+    при переполнении вытесняются давно не использованные. Добавление и удаление пользователей
+    обновляют кэш по событиям брокера, в том числе от других воркеров, а время жизни ограничивает
+    устаревание при пропущенных событиях
+    """
+
+    def __init__(
+        self,
+        max_keys: int = AUTH_CACHE_MAX_KEYS,
+        positive_ttl: float = AUTH_POSITIVE_TTL_SECONDS,
+        negative_ttl: float = AUTH_NEGATIVE_TTL_SECONDS,
+    ) -> None:
+        self.__max_keys = max_keys
+        self.__positive_ttl = positive_ttl
+        self.__negative_ttl = negative_ttl
+        self.__keys: OrderedDict[str, Tuple[bool, float]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.__keys)
+
+    def remember(self, api_key: str, exists: bool) -> None:
+        ttl = self.__positive_ttl if exists else self.__negative_ttl
+        self.__keys[api_key] = (exists, time.monotonic() + ttl)
+        self.__keys.move_to_end(api_key)
+
+        while len(self.__keys) > self.__max_keys:
+            self.__keys.popitem(last=False)
+
+    def forget(self, api_key: str) -> None:
+        self.__keys.pop(api_key, None)
+
+    def on_event(self, event: Event) -> None:
+        """
+        Обработчик событий брокера: новые пользователи перестают считаться неизвестными, удалённые - известными
+
+        :param event: событие брокера
+        """
+        if event.type in ("user_added", "user_deleted"):
+            self.forget(event.data["user_id"])
+
+    def is_cached_known(self, api_key: str) -> bool:
+        """
+        Функция, проверяющая ключ только по кэшу, без запроса к БД
+
+        :param api_key: значение заголовка api-key
+        :return: True, если ключ проверен и пользователь существует
+        """
+        cached = self.__keys.get(api_key)
+        return cached is not None and cached[0] and cached[1] > time.monotonic()
+
+    async def is_known(self, db_async_session: AsyncSession, api_key: str) -> bool:
+        """
+        Функция, проверяющая существование пользователя с id из api-key. Запрос к БД выполняется
+        только при отсутствии ключа в кэше или истечении его времени жизни
+
+        :param db_async_session: асинхронная сессия подключения к БД
+        :param api_key: значение заголовка api-key
+        :return: True если пользователь существует
+        """
+        cached = self.__keys.get(api_key)
+
+        if cached is not None and cached[1] > time.monotonic():
+            self.__keys.move_to_end(api_key)
+            return cached[0]
+
+        exists = await User.is_user_exist(db_async_session, api_key)
+        self.remember(api_key, exists)
+
+        if not exists:
+            logger.warning("Неизвестный api-key: {}".format(api_key))
+        return exists
+
+
+auth_cache = AuthCache()
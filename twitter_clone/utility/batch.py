@@ -0,0 +1,338 @@
+from itertools import groupby
+from typing import Callable, Dict, List, Tuple
+
+from fastapi import status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from events import broker
+from logger import logger
+from models.image import Image
+from models.like import Like
+from models.tweet import Tweet
+from models.user import User
+from schemas.batch import USER_ACTIONS, BatchOperation, BatchOperationResult
+
+
+def success(operation: BatchOperation, status_code: int) -> BatchOperationResult:
+    return BatchOperationResult(
+        action=operation.action, result=True, status_code=status_code
+    )
+
+
+def error(
+    operation: BatchOperation, status_code: int, error_message: str
+) -> BatchOperationResult:
+    return BatchOperationResult(
+        action=operation.action,
+        result=False,
+        status_code=status_code,
+        error_message=error_message,
+    )
+
+
+async def follow_group(
+    db_async_session: AsyncSession, user_id: str, operations: List[BatchOperation]
+) -> List[BatchOperationResult]:
+    """
+    Функция, выполняющая группу подряд идущих операций подписки одним запросом
+
+    :param db_async_session: асинхронная сессия подключения к БД с открытой транзакцией
+    :param user_id: id текущего пользователя
+    :param operations: список операций подписки
+    :return: список результатов операций
+    """
+    exist_ids, added_ids = await User.follow_many(
+        db_async_session,
+        follower_user_id=user_id,
+        following_user_ids=[operation.user_id for operation in operations],
+    )
+    results, seen = [], set()
+
+    for operation in operations:
+        if operation.user_id == user_id:
+            results.append(
+                error(
+                    operation,
+                    status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    "Пользователь не может подписаться сам на себя",
+                )
+            )
+        elif operation.user_id not in exist_ids:
+            results.append(
+                error(
+                    operation,
+                    status.HTTP_404_NOT_FOUND,
+                    f"Пользователя с id {operation.user_id} не существует",
+                )
+            )
+        elif operation.user_id in added_ids and operation.user_id not in seen:
+            results.append(success(operation, status.HTTP_201_CREATED))
+        else:
+            results.append(
+                error(
+                    operation,
+                    status.HTTP_409_CONFLICT,
+                    f"Запись о подписке пользователя с id {user_id} "
+                    f"на пользователя с {operation.user_id} уже существует в БД",
+                )
+            )
+        seen.add(operation.user_id)
+
+    return results
+
+
+async def unfollow_group(
+    db_async_session: AsyncSession, user_id: str, operations: List[BatchOperation]
+) -> List[BatchOperationResult]:
+    """
+    Функция, выполняющая группу подряд идущих операций отписки одним запросом
+
+    :param db_async_session: асинхронная сессия подключения к БД с открытой транзакцией
+    :param user_id: id текущего пользователя
+    :param operations: список операций отписки
+    :return: список результатов операций
+    """
+    deleted_ids = await User.unfollow_many(
+        db_async_session,
+        follower_user_id=user_id,
+        following_user_ids=[operation.user_id for operation in operations],
+    )
+    results, seen = [], set()
+
+    for operation in operations:
+        if operation.user_id in deleted_ids and operation.user_id not in seen:
+            results.append(success(operation, status.HTTP_200_OK))
+        else:
+            results.append(
+                error(
+                    operation,
+                    status.HTTP_404_NOT_FOUND,
+                    f"Запись об отписке пользователя с id {user_id} "
+                    f"от пользователя с {operation.user_id} не существует в БД",
+                )
+            )
+        seen.add(operation.user_id)
+
+    return results
+
+
+async def like_group(
+    db_async_session: AsyncSession, user_id: str, operations: List[BatchOperation]
+) -> List[BatchOperationResult]:
+    """
+    Функция, выполняющая группу подряд идущих операций добавления лайка одним запросом
+
+    :param db_async_session: асинхронная сессия подключения к БД с открытой транзакцией
+    :param user_id: id текущего пользователя
+    :param operations: список операций добавления лайка
+    :return: список результатов операций
+    """
+    exist_ids, added_ids = await Like.add_likes(
+        db_async_session,
+        user_id=user_id,
+        tweet_ids=[operation.tweet_id for operation in operations],
+    )
+    results, seen = [], set()
+
+    for operation in operations:
+        if operation.tweet_id not in exist_ids:
+            results.append(
+                error(
+                    operation,
+                    status.HTTP_404_NOT_FOUND,
+                    f"Твита с id {operation.tweet_id} не существует",
+                )
+            )
+        elif operation.tweet_id in added_ids and operation.tweet_id not in seen:
+            results.append(success(operation, status.HTTP_201_CREATED))
+        else:
+            results.append(
+                error(
+                    operation,
+                    status.HTTP_409_CONFLICT,
+                    f"Запись о добавлении лайка твиту с id {operation.tweet_id} "
+                    f"пользователем с id {user_id} уже существует",
+                )
+            )
+        seen.add(operation.tweet_id)
+
+    return results
+
+
+async def unlike_group(
+    db_async_session: AsyncSession, user_id: str, operations: List[BatchOperation]
+) -> List[BatchOperationResult]:
+    """
+    Функция, выполняющая группу подряд идущих операций удаления лайка одним запросом
+
+    :param db_async_session: асинхронная сессия подключения к БД с открытой транзакцией
+    :param user_id: id текущего пользователя
+    :param operations: список операций удаления лайка
+    :return: список результатов операций
+    """
+    deleted_ids = await Like.delete_likes(
+        db_async_session,
+        user_id=user_id,
+        tweet_ids=[operation.tweet_id for operation in operations],
+    )
+    results, seen = [], set()
+
+    for operation in operations:
+        if operation.tweet_id in deleted_ids and operation.tweet_id not in seen:
+            results.append(success(operation, status.HTTP_200_OK))
+        else:
+            results.append(
+                error(
+                    operation,
+                    status.HTTP_404_NOT_FOUND,
+                    f"Запись лайка твита с id {operation.tweet_id} "
+                    f"от пользователя с id {user_id} не существует",
+                )
+            )
+        seen.add(operation.tweet_id)
+
+    return results
+
+
+async def delete_group(
+    db_async_session: AsyncSession, user_id: str, operations: List[BatchOperation]
+) -> Tuple[List[BatchOperationResult], List[str]]:
+    """
+    Функция, выполняющая группу подряд идущих операций удаления твита одним запросом
+
+    :param db_async_session: асинхронная сессия подключения к БД с открытой транзакцией
+    :param user_id: id текущего пользователя
+    :param operations: список операций удаления твита
+    :return: список результатов операций и список путей изображений удалённых твитов
+    """
+    deleted_ids, image_paths = await Tweet.delete_many(
+        db_async_session,
+        author_id=user_id,
+        tweet_ids=[operation.tweet_id for operation in operations],
+    )
+    results, seen = [], set()
+
+    for operation in operations:
+        if operation.tweet_id in deleted_ids and operation.tweet_id not in seen:
+            results.append(success(operation, status.HTTP_200_OK))
+        else:
+            results.append(
+                error(
+                    operation,
+                    status.HTTP_404_NOT_FOUND,
+                    "Твит с id {} не существует".format(operation.tweet_id),
+                )
+            )
+        seen.add(operation.tweet_id)
+
+    return results, image_paths
+
+
+GROUP_HANDLERS: Dict[str, Callable] = {
+    "follow": follow_group,
+    "unfollow": unfollow_group,
+    "like": like_group,
+    "unlike": unlike_group,
+}
+
+
+async def run_batch(
+    db_async_session: AsyncSession, user_id: str, operations: List[BatchOperation]
+) -> List[BatchOperationResult]:
+    """
+    Функция, которая выполняет список операций текущего пользователя в одной транзакции.
+    Подряд идущие операции одного типа объединяются в группу и выполняются одним запросом,
+    порядок групп сохраняется, поэтому последовательность follow -> unfollow одного пользователя
+    отрабатывает так же, как и при отдельных запросах
+
+    :param db_async_session: асинхронная сессия подключения к БД
+    :param user_id: id текущего пользователя (существование проверяется зависимостью авторизации)
+    :param operations: список операций
+    :return: список результатов операций в порядке их передачи
+    """
+    logger.debug(
+        "Выполнение пакета операций: user_id = {}, количество = {}".format(
+            user_id, len(operations)
+        )
+    )
+    results: List[BatchOperationResult] = []
+    image_paths: List[str] = []
+
+    async with db_async_session.begin():
+        for action, group in groupby(operations, key=lambda x: x.action):
+            group_operations = list(group)
+
+            if action == "delete":
+                group_results, group_image_paths = await delete_group(
+                    db_async_session, user_id, group_operations
+                )
+                image_paths.extend(group_image_paths)
+            else:
+                group_results = await GROUP_HANDLERS[action](
+                    db_async_session, user_id, group_operations
+                )
+            results.extend(group_results)
+
+        liked_tweet_ids = [
+            operation.tweet_id
+            for operation, result in zip(operations, results)
+            if result.result and operation.action in ("like", "unlike")
+        ]
+        likes_summary = {}
+
+        if liked_tweet_ids and broker.has_subscribers:
+            likes_summary = await Like.get_likes_summary(
+                db_async_session, liked_tweet_ids
+            )
+
+    for image_path in image_paths:
+        await Image.delete_image_files(image_path)
+
+    await publish_batch_events(user_id, operations, results, likes_summary)
+    return results
+
+
+async def publish_batch_events(
+    user_id: str,
+    operations: List[BatchOperation],
+    results: List[BatchOperationResult],
+    likes_summary: Dict[int, Tuple[str, int]],
+) -> None:
+    """
+    Функция, публикующая события успешно выполненных операций пакета
+
+    :param user_id: id текущего пользователя
+    :param operations: список операций
+    :param results: список результатов операций
+    :param likes_summary: словарь {id твита: (id автора, количество лайков)}
+    """
+    for operation, result in zip(operations, results):
+        if not result.result:
+            continue
+
+        if operation.action in USER_ACTIONS:
+            await broker.publish(
+                operation.action,
+                follower_user_id=user_id,
+                following_user_id=operation.user_id,
+            )
+        elif operation.action == "delete":
+            await broker.publish(
+                "tweet_deleted", tweet_id=operation.tweet_id, author_id=user_id
+            )
+
+    for event_type, action in (("like_added", "like"), ("like_deleted", "unlike")):
+        tweet_ids = {
+            operation.tweet_id
+            for operation, result in zip(operations, results)
+            if result.result and operation.action == action
+        }
+        await Like.publish_likes_event(
+            event_type,
+            user_id,
+            {
+                tweet_id: summary
+                for tweet_id, summary in likes_summary.items()
+                if tweet_id in tweet_ids
+            },
+        )
@@ -1,6 +1,6 @@
 import asyncio
 from asyncio.exceptions import TimeoutError
-from random import choice, randint
+from random import choice, randint, shuffle
 from typing import Dict, List, Optional, Tuple
 from uuid import uuid4
 
@@ -91,7 +91,7 @@ async def add_tweet(
     :param db_async_session: асинхронная сессия подключения к БД
     :param client: клиент для HTTP-запроса
     :param author_ids: список id пользователей, из которых будет рандомно выбран автор твита
-    :param image_ids: список id изображений, которые будут рандомно привязаны к твиту
+    :param image_ids: список id свободных изображений, из которого забираются изображения для твита
     :param api_url: URL адрес API, который возвращает случайные обрезки текста
     :param api_params: параметры запроса к API, который возвращает случайные обрезки текста
     :return: id созданного твита
@@ -101,8 +101,11 @@ async def add_tweet(
         content = await get_text(client, api_url, api_params)
         random_image_ids = None
 
+        # Изображение может быть привязано только к одному твиту, поэтому оно забирается из списка
         if image_ids:
-            random_image_ids = [choice(image_ids) for _ in range(randint(1, 6))]
+            random_image_ids = [
+                image_ids.pop() for _ in range(min(randint(1, 6), len(image_ids)))
+            ]
 
         return await Tweet.add_tweet(
             db_async_session, choice(author_ids), content, random_image_ids
@@ -215,6 +218,7 @@ async def create_data(
 
     async_session = async_session_local()
     image_ids = await Image.get_all_image_ids(async_session)
+    shuffle(image_ids)
     image_added_count = len([image for image in images_result if image])
 
     logger.debug("Добавлено изображений: количество = {}".format(image_added_count))
@@ -0,0 +1,41 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from typing import Any, Callable, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+
+def encode_cursor(*values: Any) -> str:
+    """
+    Функция, кодирующая ключ последней записи страницы в непрозрачную строку курсора
+
+    :param values: значения ключа постраничной навигации
+    :return: строка курсора
+    """
+    return urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(
+    cursor: Optional[str], *converters: Callable[[Any], Any]
+) -> Optional[Tuple[Any, ...]]:
+    """
+    Функция, декодирующая строку курсора обратно в ключ постраничной навигации
+
+    :param cursor: строка курсора, полученная с предыдущей страницей
+    :param converters: функции приведения типов для каждого значения ключа
+    :return: кортеж значений ключа или None, если курсор не передан
+    """
+    if cursor is None:
+        return None
+
+    try:
+        values = json.loads(urlsafe_b64decode(cursor.encode()))
+        if len(values) != len(converters):
+            raise ValueError
+        return tuple(converter(value) for converter, value in zip(converters, values))
+    except (BinasciiError, ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Некорректный курсор постраничной навигации: {}".format(cursor),
+        )
@@ -0,0 +1,142 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import Pool
+
+from cache import CacheBackend, cache_backend
+from config import (
+    FEED_CACHE_ENABLED,
+    FEED_CACHE_STALE_POOL_USAGE,
+    FEED_CACHE_STALE_WHILE_REVALIDATE,
+    FEED_CACHE_TTL_SECONDS,
+)
+from database import AsyncSessionLocal, engine
+from logger import logger
+
+# Функция, вычисляющая JSON-представление страницы ленты в переданной сессии БД
+PayloadFactory = Callable[[AsyncSession], Awaitable[bytes]]
+
+
+class FeedCache:
+    """
+    Кэш готовых страниц ленты в хранилище кэшей. Запись хранится по id пользователя и параметрам запроса
+    (курсору страницы, порядку и формату) вместе с ETag ленты, по которому она вычислена. ETag содержит
+    версии пользователя и авторов его ленты, поэтому события твитов, лайков и подписок, затрагивающие
+    подписки пользователя, делают запись устаревшей без перебора ключей кэша.
+    В режиме stale-while-revalidate при занятом пуле соединений с БД устаревшая запись отдаётся сразу,
+    а страница пересчитывается в фоновой задаче
+    """
+
+    def __init__(
+        self,
+        backend: CacheBackend = cache_backend,
+        async_session_local: sessionmaker = AsyncSessionLocal,
+        pool: Pool = engine.pool,
+        enabled: bool = FEED_CACHE_ENABLED,
+        ttl: float = FEED_CACHE_TTL_SECONDS,
+        stale_while_revalidate: bool = FEED_CACHE_STALE_WHILE_REVALIDATE,
+        stale_pool_usage: float = FEED_CACHE_STALE_POOL_USAGE,
+    ) -> None:
+        self.__backend = backend
+        self.__async_session_local = async_session_local
+        self.__pool = pool
+        self.__enabled = enabled
+        self.__ttl = ttl
+        self.__stale_while_revalidate = stale_while_revalidate
+        self.__stale_pool_usage = stale_pool_usage
+        self.__refreshing: Dict[str, asyncio.Task] = {}
+
+    @staticmethod
+    def page_key(user_id: str, query: str) -> str:
+        return "feed:{}:{}".format(user_id, query)
+
+    @property
+    def is_db_under_pressure(self) -> bool:
+        return self.__pool.checkedout() >= self.__pool.size() * self.__stale_pool_usage
+
+    async def __load(self, key: str) -> Optional[Tuple[str, bytes]]:
+        entry = await self.__backend.get(key)
+
+        if entry is None:
+            return None
+
+        etag, payload = entry.split(b"\n", 1)
+        return etag.decode(), payload
+
+    async def __store(self, key: str, etag: str, payload: bytes) -> None:
+        await self.__backend.set(key, etag.encode() + b"\n" + payload, ttl=self.__ttl)
+
+    async def __refresh(self, key: str, etag: str, get_payload: PayloadFactory) -> None:
+        try:
+            async with self.__async_session_local() as db_async_session:
+                payload = await get_payload(db_async_session)
+            await self.__store(key, etag, payload)
+            logger.debug("Страница ленты обновлена в фоне: key = {}".format(key))
+        except Exception as exc:
+            logger.warning(
+                "Ошибка фонового обновления страницы ленты {}: {}".format(key, exc)
+            )
+
+    def __schedule_refresh(
+        self, key: str, etag: str, get_payload: PayloadFactory
+    ) -> None:
+        if key in self.__refreshing:
+            return
+
+        task = asyncio.create_task(self.__refresh(key, etag, get_payload))
+        self.__refreshing[key] = task
+        task.add_done_callback(lambda _: self.__refreshing.pop(key, None))
+
+    async def get(
+        self,
+        user_id: str,
+        query: str,
+        etag: str,
+        db_async_session: AsyncSession,
+        get_payload: PayloadFactory,
+    ) -> Tuple[bytes, str]:
+        """
+        Функция, возвращающая страницу ленты из кэша или вычисляющая и сохраняющая её
+
+        :param user_id: id пользователя
+        :param query: строка параметров запроса страницы
+        :param etag: текущий ETag ленты пользователя
+        :param db_async_session: асинхронная сессия подключения к БД, в которой вычисляется страница
+        :param get_payload: функция, вычисляющая страницу в переданной сессии
+        :return: JSON-представление страницы и ETag, по которому она вычислена
+        """
+        if not self.__enabled:
+            return await get_payload(db_async_session), etag
+
+        key = self.page_key(user_id, query)
+        cached = await self.__load(key)
+
+        if cached is not None:
+            cached_etag, payload = cached
+
+            if cached_etag == etag:
+                logger.debug("Страница ленты получена из кэша: key = {}".format(key))
+                return payload, etag
+
+            if self.__stale_while_revalidate and self.is_db_under_pressure:
+                logger.debug("Отдана устаревшая страница ленты: key = {}".format(key))
+                self.__schedule_refresh(key, etag, get_payload)
+                return payload, cached_etag
+
+        payload = await get_payload(db_async_session)
+        await self.__store(key, etag, payload)
+        return payload, etag
+
+    async def shutdown(self) -> None:
+        """
+        Функция, прерывающая фоновые обновления страниц при остановке приложения
+        """
+        tasks = list(self.__refreshing.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+feed_cache = FeedCache()
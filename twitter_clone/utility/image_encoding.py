@@ -0,0 +1,152 @@
+"""
+Перекодирование загруженных изображений в WebP или AVIF и уменьшение изображений до нужной ширины. Функции синхронные и загружают Pillow при первом
+вызове (AVIF - через пакет pillow-avif-plugin), приложение вызывает их в отдельном потоке, чтобы декодирование не блокировало цикл событий
+"""
+
+from functools import lru_cache
+from io import BytesIO
+from typing import Any, NamedTuple, Optional
+
+from logger import logger
+
+
+class EncodedImage(NamedTuple):
+    data: bytes
+    format: str
+    width: int
+    height: int
+
+
+@lru_cache(maxsize=None)
+def load_pillow() -> Any:
+    """
+    Функция, загружающая Pillow и регистрирующая в нём чтение и запись AVIF из пакета pillow-avif-plugin
+    (в Pillow 9 поддержки AVIF нет). Без пакета AVIF недоступен, остальные форматы работают
+
+    :return: модуль PIL.Image
+    """
+    from PIL import Image as PillowImage
+
+    try:
+        import pillow_avif  # noqa: F401
+    except ImportError:
+        logger.warning("Пакет pillow-avif-plugin не установлен, AVIF не поддерживается")
+
+    PillowImage.init()
+    return PillowImage
+
+
+@lru_cache(maxsize=None)
+def resolve_encode_format(image_format: str) -> Optional[str]:
+    """
+    Функция, возвращающая формат, в который можно перекодировать изображение в текущей сборке Pillow.
+    Если AVIF не поддерживается, используется WebP
+
+    :param image_format: запрошенный формат (webp или avif)
+    :return: формат Pillow или None, если сборка Pillow не умеет сохранять ни один из форматов
+    """
+    PillowImage = load_pillow()
+    encode_format = image_format.upper()
+
+    if encode_format == "AVIF" and "AVIF" not in PillowImage.SAVE:
+        logger.warning("Pillow не поддерживает сохранение AVIF, используется WebP")
+        encode_format = "WEBP"
+
+    if encode_format not in PillowImage.SAVE:
+        logger.warning("Pillow не поддерживает сохранение {}".format(encode_format))
+        return None
+    return encode_format
+
+
+def save_picture(
+    picture: Any, image_format: str, quality: int, icc_profile: Optional[bytes]
+) -> bytes:
+    """
+    Функция, сохраняющая изображение Pillow в указанном формате без метаданных EXIF. Изображения
+    с палитрой и другими режимами переводятся в RGB или RGBA, JPEG сохраняется без прозрачности
+
+    :param picture: изображение Pillow
+    :param image_format: формат Pillow результата
+    :param quality: качество сжатия от 1 до 100
+    :param icc_profile: цветовой профиль исходного изображения
+    :return: байтовое представление изображения
+    """
+    if image_format == "JPEG" or picture.mode not in ("RGB", "RGBA"):
+        has_alpha = (
+            picture.mode in ("RGBA", "LA", "PA") or "transparency" in picture.info
+        )
+        picture = picture.convert(
+            "RGBA" if has_alpha and image_format != "JPEG" else "RGB"
+        )
+
+    output = BytesIO()
+    picture.save(output, format=image_format, quality=quality, icc_profile=icc_profile)
+    return output.getvalue()
+
+
+def encode_image(
+    image: bytes, image_format: str, quality: int, max_edge: int
+) -> Optional[EncodedImage]:
+    """
+    Функция, перекодирующая изображение: поворот EXIF применяется к пикселям, метаданные EXIF не сохраняются
+    (цветовой профиль ICC сохраняется), длинная сторона уменьшается до max_edge пикселей
+
+    :param image: байтовое представление изображения
+    :param image_format: формат перекодирования (webp или avif)
+    :param quality: качество сжатия от 1 до 100
+    :param max_edge: максимальная длина длинной стороны в пикселях (0 - без ограничения)
+    :return: перекодированное изображение или None, если изображение нужно сохранить как есть
+        (анимация или формат, который не поддерживает сборка Pillow)
+    """
+    from PIL import ImageOps
+
+    PillowImage = load_pillow()
+    encode_format = resolve_encode_format(image_format)
+
+    if encode_format is None:
+        return None
+
+    with PillowImage.open(BytesIO(image)) as source:
+        # Перекодирование сохранило бы только первый кадр анимации
+        if getattr(source, "is_animated", False):
+            return None
+
+        icc_profile = source.info.get("icc_profile")
+        picture = ImageOps.exif_transpose(source)
+
+    if 0 < max_edge < max(picture.size):
+        picture.thumbnail((max_edge, max_edge), PillowImage.LANCZOS)
+
+    return EncodedImage(
+        save_picture(picture, encode_format, quality, icc_profile),
+        encode_format,
+        *picture.size,
+    )
+
+
+def resize_image(
+    image: bytes, width: Optional[int], image_format: str, quality: int
+) -> bytes:
+    """
+    Функция, уменьшающая изображение до указанной ширины с сохранением пропорций. Изображение
+    не увеличивается, поворот EXIF применяется к пикселям, метаданные EXIF не сохраняются
+
+    :param image: байтовое представление исходного изображения
+    :param width: ширина в пикселях (None - ширина исходного изображения)
+    :param image_format: формат Pillow результата
+    :param quality: качество сжатия от 1 до 100
+    :return: байтовое представление изображения
+    """
+    from PIL import ImageOps
+
+    PillowImage = load_pillow()
+
+    with PillowImage.open(BytesIO(image)) as source:
+        icc_profile = source.info.get("icc_profile")
+        picture = ImageOps.exif_transpose(source)
+
+    if width is not None and width < picture.width:
+        height = max(1, round(picture.height * width / picture.width))
+        picture = picture.resize((width, height), PillowImage.LANCZOS)
+
+    return save_picture(picture, image_format, quality, icc_profile)
@@ -0,0 +1,235 @@
+import asyncio
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+from pathlib import Path
+from typing import Awaitable, BinaryIO, Callable, Dict, List, Tuple
+
+import anyio
+from fastapi.responses import FileResponse
+from starlette.types import Receive, Scope, Send
+
+from config import MEDIA_CACHE_MAX_MB, WEB_CONCURRENCY
+from logger import logger
+
+MEDIA_CACHE_PATH = Path(Path(__file__).parent.parent, "media_cache")
+
+# Функция, создающая содержимое файла кэша при промахе
+Render = Callable[[], Awaitable[bytes]]
+
+
+class MediaCache:
+    """
+    Дисковый кэш изображений произвольной ширины. Файл создаётся при первом запросе и хранится в каталоге
+    изображения ({id изображения}/{ширина}.{расширение}), повторные запросы отдаются с диска. Порядок
+    обращений хранится в памяти: при превышении max_bytes удаляются давно не запрошенные файлы. Одновременные
+    промахи по одному ключу ждут одну блокировку, поэтому изображение создаётся один раз.
+    Каталог кэша общий для воркеров, а порядок обращений и объём каждый воркер считает сам, поэтому
+    MEDIA_CACHE_MAX_MB делится между WEB_CONCURRENCY воркерами, и общий объём каталога не превышает его
+    """
+
+    def __init__(
+        self,
+        path: Path = MEDIA_CACHE_PATH,
+        max_bytes: int = int(MEDIA_CACHE_MAX_MB * 1024 * 1024 / WEB_CONCURRENCY),
+    ) -> None:
+        self.__path = path
+        self.__max_bytes = max_bytes
+        self.__entries: OrderedDict[str, int] = OrderedDict()
+        self.__size = 0
+        self.__locks: Dict[str, asyncio.Lock] = {}
+        self.__loaded = False
+
+    @property
+    def size(self) -> int:
+        return self.__size
+
+    def __scan(self) -> List[Tuple[str, int]]:
+        """
+        Функция, читающая содержимое кэша с диска после перезапуска
+
+        :return: ключи и размеры файлов, от давно изменённых к недавно изменённым
+        """
+        files = []
+        for file_path in self.__path.glob("*/*"):
+            if file_path.suffix == ".tmp":
+                file_path.unlink(missing_ok=True)
+                continue
+            stat = file_path.stat()
+            key = file_path.relative_to(self.__path).as_posix()
+            files.append((stat.st_mtime, key, stat.st_size))
+        return [(key, size) for _, key, size in sorted(files)]
+
+    async def __load(self) -> None:
+        files = await asyncio.to_thread(self.__scan)
+
+        if self.__loaded:
+            return
+
+        self.__loaded = True
+        # Файлы с диска старше файлов, созданных во время чтения каталога
+        for key, size in reversed(files):
+            if key not in self.__entries:
+                self.__entries[key] = size
+                self.__entries.move_to_end(key, last=False)
+                self.__size += size
+
+        logger.debug(
+            "Загружен кэш изображений: файлов = {}, объём = {}".format(
+                len(self.__entries), self.__size
+            )
+        )
+
+    def __write(self, file_path: Path, data: bytes) -> None:
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        # Воркеры пишут во временные файлы с разными именами, готовый файл заменяется атомарно
+        tmp_path = file_path.with_name("{}.{}.tmp".format(file_path.name, os.getpid()))
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, file_path)
+
+    def __remove(self, keys: List[str]) -> None:
+        for key in keys:
+            Path(self.__path, key).unlink(missing_ok=True)
+
+    async def __evict(self) -> None:
+        evicted = []
+        # Последний добавленный файл не удаляется, даже если он больше max_bytes
+        while self.__size > self.__max_bytes and len(self.__entries) > 1:
+            key, size = self.__entries.popitem(last=False)
+            self.__size -= size
+            evicted.append(key)
+
+        if evicted:
+            await asyncio.to_thread(self.__remove, evicted)
+            logger.debug(
+                "Файлы удалены из кэша изображений: количество = {}".format(
+                    len(evicted)
+                )
+            )
+
+    def __hit(self, key: str) -> bool:
+        # Файл мог удалить другой воркер или удаление изображения
+        if key in self.__entries and Path(self.__path, key).exists():
+            self.__entries.move_to_end(key)
+            return True
+        return False
+
+    async def get(self, key: str, render: Render) -> Path:
+        """
+        Функция, возвращающая путь файла из кэша или создающая его
+
+        :param key: относительный путь файла в кэше
+        :param render: функция, создающая содержимое файла при промахе
+        :return: абсолютный путь файла
+        """
+        if not self.__loaded:
+            await self.__load()
+
+        file_path = Path(self.__path, key)
+
+        if self.__hit(key):
+            return file_path
+
+        lock = self.__locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            try:
+                if self.__hit(key):
+                    return file_path
+
+                data = await render()
+                await asyncio.to_thread(self.__write, file_path, data)
+                self.__size += len(data) - self.__entries.pop(key, 0)
+                self.__entries[key] = len(data)
+                logger.debug("Файл добавлен в кэш изображений: key = {}".format(key))
+                await self.__evict()
+            finally:
+                # Ожидающие запросы уже держат блокировку и найдут созданный файл
+                if self.__locks.get(key) is lock:
+                    del self.__locks[key]
+        return file_path
+
+    async def open(self, key: str, render: Render) -> BinaryIO:
+        """
+        Функция, открывающая файл из кэша или создающая его. Открытый файл остаётся доступным после удаления
+        из каталога, поэтому вытеснение по запросу другого изображения, другой воркер или удаление изображения
+        не прерывают отправку. Если файл удалён между получением пути и открытием, он создаётся заново
+
+        :param key: относительный путь файла в кэше
+        :param render: функция, создающая содержимое файла при промахе
+        :return: файл, открытый для чтения в двоичном режиме
+        """
+        for _ in range(2):
+            file_path = await self.get(key, render)
+            try:
+                return await asyncio.to_thread(file_path.open, "rb")
+            except FileNotFoundError:
+                logger.debug(
+                    "Файл удалён из кэша изображений до открытия: key = {}".format(key)
+                )
+        return await asyncio.to_thread(self.__write_temporary, await render())
+
+    @staticmethod
+    def __write_temporary(data: bytes) -> BinaryIO:
+        file = tempfile.TemporaryFile()
+        file.write(data)
+        file.seek(0)
+        return file
+
+    async def discard(self, image_id: str) -> None:
+        """
+        Функция, удаляющая из кэша все файлы изображения
+
+        :param image_id: id изображения
+        """
+        for key in [key for key in self.__entries if key.startswith(image_id + "/")]:
+            self.__size -= self.__entries.pop(key)
+        await asyncio.to_thread(
+            shutil.rmtree, Path(self.__path, image_id), ignore_errors=True
+        )
+
+
+class OpenedFileResponse(FileResponse):
+    """
+    Ответ с файлом, открытым до начала ответа. Размер и время изменения берутся у открытого файла,
+    файл читается частями и закрывается после отправки
+    """
+
+    def __init__(self, file: BinaryIO, **kwargs) -> None:
+        super().__init__(str(file.name), stat_result=os.fstat(file.fileno()), **kwargs)
+        self.file = file
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": self.status_code,
+                    "headers": self.raw_headers,
+                }
+            )
+            if scope["method"].upper() == "HEAD":
+                await send(
+                    {"type": "http.response.body", "body": b"", "more_body": False}
+                )
+            else:
+                file = anyio.wrap_file(self.file)
+                more_body = True
+                while more_body:
+                    chunk = await file.read(self.chunk_size)
+                    more_body = len(chunk) == self.chunk_size
+                    await send(
+                        {
+                            "type": "http.response.body",
+                            "body": chunk,
+                            "more_body": more_body,
+                        }
+                    )
+        finally:
+            self.file.close()
+
+        if self.background is not None:
+            await self.background()
+
+
+media_cache = MediaCache()
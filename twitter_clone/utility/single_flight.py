@@ -0,0 +1,59 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+from config import SINGLE_FLIGHT_WINDOW_SECONDS
+from logger import logger
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Объединение одинаковых одновременных запросов: пока вычисление по ключу не завершено,
+    все запросы с этим ключом ожидают его результат вместо повторного запуска. Готовый результат
+    ещё window секунд отдаётся запросам, пришедшим следом. Ключ должен включать ETag ресурса,
+    чтобы после изменения данных результат не переиспользовался
+    """
+
+    def __init__(self, window: float = SINGLE_FLIGHT_WINDOW_SECONDS) -> None:
+        self.__window = window
+        self.__calls: Dict[Hashable, asyncio.Future] = {}
+
+    def __forget(self, key: Hashable, future: asyncio.Future) -> None:
+        if self.__calls.get(key) is future:
+            del self.__calls[key]
+
+    def __on_done(self, key: Hashable, future: asyncio.Future) -> None:
+        if future.cancelled() or future.exception() is not None or self.__window <= 0:
+            self.__forget(key, future)
+        else:
+            asyncio.get_running_loop().call_later(
+                self.__window, self.__forget, key, future
+            )
+
+    def __len__(self) -> int:
+        return len(self.__calls)
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        """
+        Функция, возвращающая результат вычисления по ключу, запуская его только при отсутствии
+        выполняющегося или недавно завершённого вычисления с тем же ключом
+
+        :param key: ключ запроса
+        :param func: функция вычисления результата
+        :return: результат вычисления
+        """
+        future = self.__calls.get(key)
+
+        if future is None:
+            future = asyncio.ensure_future(func())
+            future.add_done_callback(lambda done: self.__on_done(key, done))
+            self.__calls[key] = future
+        else:
+            logger.debug("Запрос объединён с выполняющимся: key = {}".format(key))
+
+        # shield: отмена одного из ожидающих запросов не отменяет вычисление для остальных
+        return await asyncio.shield(future)
+
+
+single_flight = SingleFlight()
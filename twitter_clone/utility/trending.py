@@ -0,0 +1,245 @@
+import asyncio
+import heapq
+import time
+from math import exp, log
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.orm import sessionmaker
+
+from config import (
+    TRENDING_CAPACITY,
+    TRENDING_HALF_LIFE_HOURS,
+    TRENDING_REFRESH_SECONDS,
+    TRENDING_SEED_TWEETS,
+    TRENDING_SIZE,
+)
+from events import Event
+from logger import logger
+from models.like import Like
+from models.tweet import Tweet
+
+# Максимальный показатель экспоненты веса, после которого точка отсчёта сдвигается к текущему времени
+MAX_EXPONENT = 30.0
+
+
+class TrendingRanking:
+    """
+    Рейтинг популярных твитов с экспоненциальным затуханием веса лайков.
+    Вес лайка, поставленного в момент t, равен exp(decay * (t - origin)), поэтому накопленный счёт твита
+    не нужно пересчитывать со временем: для сравнения твитов между собой достаточно сумм весов,
+    а текущий счёт получается умножением на exp(-decay * (now - origin)).
+    Счета обновляются по событиям лайков, а отсортированный снимок топа пересчитывается фоновой задачей,
+    поэтому запрос топа из k твитов стоит O(k) и не обращается к БД
+    """
+
+    def __init__(
+        self,
+        half_life_seconds: float = TRENDING_HALF_LIFE_HOURS * 3600,
+        capacity: int = TRENDING_CAPACITY,
+    ) -> None:
+        self.__decay = log(2) / half_life_seconds
+        self.__capacity = capacity
+        self.__origin = time.time()
+        self.__scores: Dict[int, float] = {}
+        self.__likes_counts: Dict[int, int] = {}
+        self.__snapshot: List[Dict[str, Any]] = []
+
+    def __weight(self) -> float:
+        return exp(self.__decay * (time.time() - self.__origin))
+
+    def __current(self, score: float) -> float:
+        return score * exp(-self.__decay * (time.time() - self.__origin))
+
+    def add_like(
+        self, tweet_id: int, likes_count: Optional[int] = None, count: int = 1
+    ) -> None:
+        """
+        Функция, увеличивающая счёт твита на вес лайка в текущий момент
+
+        :param tweet_id: id твита
+        :param likes_count: текущее количество лайков твита
+        :param count: количество добавленных лайков
+        """
+        self.__scores[tweet_id] = self.__scores.get(tweet_id, 0.0) + (
+            self.__weight() * count
+        )
+        if likes_count is not None:
+            self.__likes_counts[tweet_id] = likes_count
+
+    def remove_like(self, tweet_id: int, likes_count: Optional[int] = None) -> None:
+        """
+        Функция, уменьшающая счёт твита на средний вклад одного лайка. Вес удаляемого лайка неизвестен,
+        а вес текущего момента больше веса любого из поставленных ранее лайков, поэтому вычитание
+        веса текущего момента обнуляло бы счёт твита, у которого остались лайки. Твит исключается
+        из рейтинга только после удаления последнего лайка
+
+        :param tweet_id: id твита
+        :param likes_count: текущее количество лайков твита
+        """
+        if tweet_id not in self.__scores:
+            return
+
+        if likes_count is not None:
+            previous_count = likes_count + 1
+        else:
+            previous_count = self.__likes_counts.get(tweet_id)
+            likes_count = previous_count - 1 if previous_count else None
+
+        if likes_count is not None and likes_count <= 0:
+            self.remove_tweet(tweet_id)
+            return
+
+        if previous_count:
+            self.__scores[tweet_id] -= self.__scores[tweet_id] / previous_count
+        if likes_count is not None:
+            self.__likes_counts[tweet_id] = likes_count
+
+    def remove_tweet(self, tweet_id: int) -> None:
+        """
+        Функция, удаляющая твит из рейтинга и из текущего снимка топа
+
+        :param tweet_id: id твита
+        """
+        self.__scores.pop(tweet_id, None)
+        self.__likes_counts.pop(tweet_id, None)
+        self.__snapshot = [
+            tweet for tweet in self.__snapshot if tweet["id"] != tweet_id
+        ]
+
+    def on_event(self, event: Event) -> None:
+        """
+        Обработчик событий брокера: лайки меняют счёт твитов, удалённые и архивные твиты исключаются из рейтинга
+
+        :param event: событие брокера
+        """
+        if event.type == "like_added":
+            self.add_like(event.data["tweet_id"], event.data["likes_count"])
+        elif event.type == "like_deleted":
+            self.remove_like(event.data["tweet_id"], event.data["likes_count"])
+        elif event.type in ("tweet_deleted", "tweet_archived"):
+            self.remove_tweet(event.data["tweet_id"])
+
+    def rebase(self) -> None:
+        """
+        Функция, сдвигающая точку отсчёта весов к текущему времени, чтобы экспонента не переполнялась,
+        и удаляющая твиты с наименьшим счётом сверх заданной ёмкости
+        """
+        now = time.time()
+
+        if self.__decay * (now - self.__origin) > MAX_EXPONENT:
+            factor = exp(-self.__decay * (now - self.__origin))
+            self.__scores = {
+                tweet_id: score * factor for tweet_id, score in self.__scores.items()
+            }
+            self.__origin = now
+
+        if len(self.__scores) > self.__capacity:
+            kept = heapq.nlargest(
+                self.__capacity, self.__scores.items(), key=lambda x: x[1]
+            )
+            self.__scores = dict(kept)
+            self.__likes_counts = {
+                tweet_id: count
+                for tweet_id, count in self.__likes_counts.items()
+                if tweet_id in self.__scores
+            }
+
+    def top_ids(self, k: int = TRENDING_SIZE) -> List[int]:
+        """
+        Функция, возвращающая id k твитов с наибольшим счётом, O(n log k)
+
+        :param k: количество твитов
+        :return: список id твитов по убыванию счёта
+        """
+        return [
+            tweet_id
+            for tweet_id, _ in heapq.nlargest(
+                k, self.__scores.items(), key=lambda x: x[1]
+            )
+        ]
+
+    def get_top(self, k: int) -> List[Dict[str, Any]]:
+        """
+        Функция, возвращающая первые k твитов последнего снимка топа, O(k)
+
+        :param k: количество твитов
+        :return: список твитов с текущими счетами
+        """
+        return self.__snapshot[:k]
+
+    async def refresh(self, async_session_local: sessionmaker) -> None:
+        """
+        Функция, пересчитывающая снимок топа: выбирает лучшие твиты по счёту и загружает их из БД по id
+
+        :param async_session_local: фабрика асинхронных сессий подключения к БД
+        """
+        self.rebase()
+        top_ids = self.top_ids()
+        async with async_session_local() as db_async_session:
+            tweets = {
+                tweet.id: tweet
+                for tweet in await Tweet.get_tweets_by_ids(db_async_session, top_ids)
+            }
+        self.__snapshot = [
+            {
+                "id": tweet_id,
+                "content": tweets[tweet_id].content,
+                "attachments": tweets[tweet_id].attachments,
+                "media": tweets[tweet_id].media,
+                "author": tweets[tweet_id].author,
+                "likes_count": self.__likes_counts.get(tweet_id, 0),
+                "score": self.__current(self.__scores[tweet_id]),
+            }
+            for tweet_id in top_ids
+            if tweet_id in tweets and tweet_id in self.__scores
+        ]
+        logger.debug(
+            "Обновлён снимок популярных твитов: количество = {}".format(
+                len(self.__snapshot)
+            )
+        )
+
+    async def seed(self, async_session_local: sessionmaker) -> None:
+        """
+        Функция первичного заполнения рейтинга при запуске приложения: лайки последних твитов учитываются
+        с весом текущего момента, так как время их добавления не хранится
+
+        :param async_session_local: фабрика асинхронных сессий подключения к БД
+        """
+        async with async_session_local() as db_async_session:
+            likes_counts = await Like.get_recent_likes_counts(
+                db_async_session, TRENDING_SEED_TWEETS
+            )
+
+        for tweet_id, likes_count in likes_counts.items():
+            self.add_like(tweet_id, likes_count, count=likes_count)
+
+        await self.refresh(async_session_local)
+
+
+async def refresh_trending_periodically(
+    ranking: TrendingRanking, async_session_local: sessionmaker
+) -> None:
+    """
+    Фоновая задача, периодически обновляющая снимок популярных твитов
+
+    :param ranking: рейтинг популярных твитов
+    :param async_session_local: фабрика асинхронных сессий подключения к БД
+    """
+    seeded = False
+
+    while True:
+        try:
+            if seeded:
+                await ranking.refresh(async_session_local)
+            else:
+                await ranking.seed(async_session_local)
+                seeded = True
+        except Exception as exc:
+            logger.exception(
+                "Ошибка обновления снимка популярных твитов: {}".format(exc)
+            )
+        await asyncio.sleep(TRENDING_REFRESH_SECONDS)
+
+
+trending_ranking = TrendingRanking()
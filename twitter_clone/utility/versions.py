@@ -0,0 +1,159 @@
+import json
+from typing import List, Optional
+from uuid import uuid4
+
+from fastapi import Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from cache import CacheBackend, cache_backend
+from config import CACHE_FOLLOWINGS_TTL_SECONDS
+from events import Event
+from logger import logger
+from models.user import User
+
+AUTHOR_EVENTS = (
+    "tweet_added",
+    "tweet_deleted",
+    "tweet_archived",
+    "like_added",
+    "like_deleted",
+)
+FOLLOW_EVENTS = ("follow", "unfollow")
+
+EPOCH_KEY = "versions:epoch"
+
+
+class VersionRegistry:
+    """
+    Реестр версий данных пользователей для условных GET-запросов.
+    Версия автора меняется при добавлении и удалении его твитов и лайков к ним,
+    версия пользователя - при изменении его подписок и подписчиков. Версии - счётчики в хранилище кэшей,
+    которые только растут, поэтому сумма версий авторов ленты меняется при любом изменении любого из них,
+    и все воркеры приложения выдают одинаковые ETag.
+    Эпоха хранилища в ETag исключает совпадение версий после его очистки
+    """
+
+    def __init__(self, backend: CacheBackend = cache_backend) -> None:
+        self.__backend = backend
+
+    @staticmethod
+    def user_key(user_id: str) -> str:
+        return "versions:user:{}".format(user_id)
+
+    @staticmethod
+    def author_key(author_id: str) -> str:
+        return "versions:author:{}".format(author_id)
+
+    @staticmethod
+    def followings_key(user_id: str) -> str:
+        return "followings:{}".format(user_id)
+
+    async def bump_user(self, user_id: str) -> None:
+        await self.__backend.incr(self.user_key(user_id))
+
+    async def bump_author(self, author_id: str) -> None:
+        await self.__backend.incr(self.author_key(author_id))
+
+    async def on_event(self, event: Event) -> None:
+        """
+        Обработчик событий брокера, обновляющий версии затронутых пользователей
+
+        :param event: событие брокера
+        """
+        if event.type in AUTHOR_EVENTS:
+            await self.bump_author(event.data["author_id"])
+        elif event.type in FOLLOW_EVENTS:
+            await self.bump_user(event.data["follower_user_id"])
+            await self.bump_user(event.data["following_user_id"])
+
+    async def __get_epoch(self, epoch: Optional[bytes]) -> str:
+        if epoch is not None:
+            return epoch.decode()
+
+        # Гонка воркеров здесь безопасна: проигравший лишь один раз выдаст ETag, который не совпадёт
+        new_epoch = uuid4().hex[:8]
+        await self.__backend.set(EPOCH_KEY, new_epoch.encode())
+        return new_epoch
+
+    async def __get_followings(
+        self,
+        db_async_session: AsyncSession,
+        user_id: str,
+        user_version: int,
+        cached: Optional[bytes],
+    ) -> List[str]:
+        if cached is not None:
+            cached = json.loads(cached)
+            if cached["version"] == user_version:
+                return cached["ids"]
+
+        followings = await User.get_following_ids(db_async_session, user_id)
+        await self.__backend.set(
+            self.followings_key(user_id),
+            json.dumps({"version": user_version, "ids": followings}).encode(),
+            ttl=CACHE_FOLLOWINGS_TTL_SECONDS,
+        )
+        return followings
+
+    async def get_feed_etag(self, db_async_session: AsyncSession, user_id: str) -> str:
+        """
+        Функция, возвращающая слабый ETag ленты пользователя. Список подписок кэшируется до изменения
+        версии пользователя, поэтому обычно ETag вычисляется за два обращения к хранилищу без запросов к БД
+
+        :param db_async_session: асинхронная сессия подключения к БД
+        :param user_id: id пользователя
+        :return: значение заголовка ETag
+        """
+        epoch, user_version, cached = await self.__backend.get_many(
+            [EPOCH_KEY, self.user_key(user_id), self.followings_key(user_id)]
+        )
+        epoch = await self.__get_epoch(epoch)
+        user_version = int(user_version or 0)
+        followings = await self.__get_followings(
+            db_async_session, user_id, user_version, cached
+        )
+        author_versions = await self.__backend.get_many(
+            [self.author_key(author_id) for author_id in [user_id, *followings]]
+        )
+        author_version = sum(int(version or 0) for version in author_versions)
+        return 'W/"feed-{}-{}-{}"'.format(epoch, user_version, author_version)
+
+    async def get_profile_etag(self, user_id: str) -> str:
+        """
+        Функция, возвращающая слабый ETag профиля пользователя
+
+        :param user_id: id пользователя
+        :return: значение заголовка ETag
+        """
+        epoch, user_version = await self.__backend.get_many(
+            [EPOCH_KEY, self.user_key(user_id)]
+        )
+        epoch = await self.__get_epoch(epoch)
+        return 'W/"user-{}-{}"'.format(epoch, int(user_version or 0))
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """
+    Функция, проверяющая совпадение ETag с одним из значений заголовка If-None-Match (слабое сравнение)
+
+    :param request: текущий запрос
+    :param etag: текущий ETag ресурса
+    :return: True если клиент уже получил актуальную версию ресурса
+    """
+    if_none_match = request.headers.get("if-none-match")
+
+    if not if_none_match:
+        return False
+
+    if if_none_match.strip() == "*":
+        return True
+
+    matched = etag.removeprefix("W/") in (
+        value.strip().removeprefix("W/") for value in if_none_match.split(",")
+    )
+    if matched:
+        logger.debug("Ресурс не изменился: ETag = {}".format(etag))
+    return matched
+
+
+version_registry = VersionRegistry()